@@ -21,8 +21,16 @@ import shutil
 import subprocess
 import undetected_chromedriver as uc
 from selenium.webdriver.common.by import By
+from multi_tab_scraper import (scrape_urls, TABS_PER_BROWSER, BROWSERS_PER_HOST, MAX_TABS_PER_BROWSER,
+                               MAX_BROWSERS_PER_HOST, MAX_BATCH_URLS)
+from rating_dom import extract_rating_text, TARGETED_EXTRACTION
+from html_text import html_to_text
+from block_detect import is_access_denied
+from structured_extract import extract_structured_ratings, fetch_page_source, STRUCTURED_PREFETCH
+from tracing import init_app, span
 
 app = Flask(__name__)
+init_app(app, 'final')
 
 def extract_rating_reviews(text):
     """Extract rating and reviews from text using regex patterns"""
@@ -442,6 +450,19 @@ def extract_ratings():
             elif not input_text.startswith('http'):
                 input_text = 'https://' + input_text
             
+            # Cheapest path first: structured rating data from a plain HTTP fetch, no browser
+            if STRUCTURED_PREFETCH:
+                with span('prefetch'):
+                    result = extract_structured_ratings(fetch_page_source(input_text))
+                if result:
+                    print(f"[SUCCESS] Extracted from {result['source']} without browser: {result}")
+                    return jsonify({
+                        'success': True,
+                        'rating': result['rating'],
+                        'rating_count': result['rating_count'],
+                        'review_count': result['review_count']
+                    })
+            
             # Clean up ChromeDriver cache before initialization to avoid file conflicts
             def cleanup_chromedriver_cache():
                 """Clean up ChromeDriver cache files that might cause conflicts"""
@@ -497,238 +518,238 @@ def extract_ratings():
                 return None
             
             # Clean up cache before first attempt
-            cleanup_chromedriver_cache()
+            with span('driver_init'):
+                cleanup_chromedriver_cache()
             
-            # Setup browser with proper error handling
-            driver = None
-            max_attempts = 3
-            chrome_version = get_chrome_version()
+                # Setup browser with proper error handling
+                driver = None
+                max_attempts = 3
+                chrome_version = get_chrome_version()
             
-            for attempt in range(max_attempts):
-                try:
-                    options = uc.ChromeOptions()
-                    options.add_argument("--start-maximized")
-                    options.add_argument("--no-sandbox")
-                    options.add_argument("--disable-dev-shm-usage")
-                    options.add_argument("--disable-blink-features=AutomationControlled")
-                    options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+                for attempt in range(max_attempts):
+                    try:
+                        options = uc.ChromeOptions()
+                        options.add_argument("--start-maximized")
+                        options.add_argument("--no-sandbox")
+                        options.add_argument("--disable-dev-shm-usage")
+                        options.add_argument("--disable-blink-features=AutomationControlled")
+                        options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
                     
-                    # Use detected Chrome version if available, otherwise let uc auto-detect
-                    driver_kwargs = {
-                        'options': options,
-                        'use_subprocess': True,
-                        'driver_executable_path': None
-                    }
+                        # Use detected Chrome version if available, otherwise let uc auto-detect
+                        driver_kwargs = {
+                            'options': options,
+                            'use_subprocess': True,
+                            'driver_executable_path': None
+                        }
                     
-                    # Specify version_main if we detected it, otherwise let uc handle it
-                    if chrome_version:
-                        driver_kwargs['version_main'] = chrome_version
-                        print(f"[INFO] Using ChromeDriver version {chrome_version} to match Chrome browser")
-                    else:
-                        driver_kwargs['version_main'] = None  # Auto-detect
-                        print(f"[INFO] Auto-detecting ChromeDriver version")
+                        # Specify version_main if we detected it, otherwise let uc handle it
+                        if chrome_version:
+                            driver_kwargs['version_main'] = chrome_version
+                            print(f"[INFO] Using ChromeDriver version {chrome_version} to match Chrome browser")
+                        else:
+                            driver_kwargs['version_main'] = None  # Auto-detect
+                            print(f"[INFO] Auto-detecting ChromeDriver version")
                     
-                    driver = uc.Chrome(**driver_kwargs)
-                    print(f"[INFO] ChromeDriver initialized successfully")
-                    break
+                        driver = uc.Chrome(**driver_kwargs)
+                        print(f"[INFO] ChromeDriver initialized successfully")
+                        break
                     
-                except Exception as driver_error:
-                    error_str = str(driver_error)
-                    print(f"[WARNING] Attempt {attempt + 1}/{max_attempts}: {error_str}")
+                    except Exception as driver_error:
+                        error_str = str(driver_error)
+                        print(f"[WARNING] Attempt {attempt + 1}/{max_attempts}: {error_str}")
                     
-                    # Handle file conflict error (WinError 183) - clean up and retry
-                    if "WinError 183" in error_str or "Cannot create a file when that file already exists" in error_str:
-                        print(f"[INFO] File conflict detected, cleaning up cache...")
-                        cleanup_chromedriver_cache()
-                        time.sleep(1)
+                        # Handle file conflict error (WinError 183) - clean up and retry
+                        if "WinError 183" in error_str or "Cannot create a file when that file already exists" in error_str:
+                            print(f"[INFO] File conflict detected, cleaning up cache...")
+                            cleanup_chromedriver_cache()
+                            time.sleep(1)
                     
-                    # Handle version mismatch - force cleanup and retry
-                    if "version" in error_str.lower() or "ChromeDriver only supports" in error_str or "session not created" in error_str.lower():
-                        print(f"[INFO] Version mismatch detected, cleaning up cache for fresh download...")
-                        cleanup_chromedriver_cache()
-                        time.sleep(1)
+                        # Handle version mismatch - force cleanup and retry
+                        if "version" in error_str.lower() or "ChromeDriver only supports" in error_str or "session not created" in error_str.lower():
+                            print(f"[INFO] Version mismatch detected, cleaning up cache for fresh download...")
+                            cleanup_chromedriver_cache()
+                            time.sleep(1)
                     
-                    if attempt < max_attempts - 1:
-                        time.sleep(2)  # Wait before retry
-                    else:
-                        # Last attempt failed, raise the error
-                        raise Exception(f"Failed to initialize ChromeDriver after {max_attempts} attempts: {error_str}")
+                        if attempt < max_attempts - 1:
+                            time.sleep(2)  # Wait before retry
+                        else:
+                            # Last attempt failed, raise the error
+                            raise Exception(f"Failed to initialize ChromeDriver after {max_attempts} attempts: {error_str}")
             
-            if driver is None:
-                raise Exception("Failed to initialize ChromeDriver")
+                if driver is None:
+                    raise Exception("Failed to initialize ChromeDriver")
             
             try:
                 # Set page load timeout
                 driver.set_page_load_timeout(60)  # 60 seconds max for page load
                 
                 print(f"[INFO] Navigating to: {input_text}")
-                try:
-                    driver.get(input_text)
-                    # Initial wait for potential redirects/JavaScript checks
-                    print(f"[INFO] Initial wait for page redirects/checks...")
-                    time.sleep(5)
-                except Exception as nav_error:
-                    # Page load timeout - try to get what we can
-                    nav_error_str = str(nav_error)
-                    if "timeout" in nav_error_str.lower() or "page load" in nav_error_str.lower():
-                        print(f"[WARNING] Page load timeout, trying to get content anyway...")
-                        # Continue - might still have content
-                    else:
-                        raise
+                with span('navigate'):
+                    try:
+                        driver.get(input_text)
+                        # Initial wait for potential redirects/JavaScript checks
+                        print(f"[INFO] Initial wait for page redirects/checks...")
+                        time.sleep(5)
+                    except Exception as nav_error:
+                        # Page load timeout - try to get what we can
+                        nav_error_str = str(nav_error)
+                        if "timeout" in nav_error_str.lower() or "page load" in nav_error_str.lower():
+                            print(f"[WARNING] Page load timeout, trying to get content anyway...")
+                            # Continue - might still have content
+                        else:
+                            raise
                 
                 # Wait for page to load with multiple attempts and explicit waits
                 print(f"[INFO] Checking page content and waiting for proper load...")
                 from selenium.webdriver.support.ui import WebDriverWait
                 from selenium.webdriver.support import expected_conditions as EC
                 
-                # Function to check if page is blocked/access denied
-                def is_access_denied(page_source, page_text):
-                    """Check if page shows access denied or blocking message"""
-                    if not page_source and not page_text:
-                        return True
-                    
-                    blocked_keywords = [
-                        'access denied', 'blocked', 'cloudflare', 
-                        'checking your browser', 'please wait', 
-                        'verify you are human', 'challenge',
-                        'temporarily unavailable', 'bot detected',
-                        'rate limited', '403 forbidden', 'forbidden',
-                        'unauthorized access', 'permission denied'
-                    ]
-                    
-                    combined_text = (page_source or '').lower() + ' ' + (page_text or '').lower()
-                    
-                    # Check for keywords
-                    for keyword in blocked_keywords:
-                        if keyword in combined_text:
-                            return True
-                    
-                    # Also check if page is too short and contains common blocking indicators
-                    if len(combined_text) < 200:
-                        if any(indicator in combined_text for indicator in ['cloudflare', 'checking', 'wait']):
-                            return True
-                    
-                    return False
-                
                 page_text = None
                 page_source = None
-                max_retries = 8  # Increased retries for access denied scenarios
-                access_denied_retries = 3  # Specific retries for access denied
+                targeted_result = None
+                with span('page_load'):
+                    max_retries = 8  # Increased retries for access denied scenarios
+                    access_denied_retries = 3  # Specific retries for access denied
                 
-                for attempt in range(max_retries):
-                    try:
-                        # Wait for body element with explicit wait
-                        wait = WebDriverWait(driver, 10)
-                        body_element = wait.until(EC.presence_of_element_located((By.TAG_NAME, 'body')))
+                    for attempt in range(max_retries):
+                        try:
+                            # Wait for body element with explicit wait
+                            wait = WebDriverWait(driver, 10)
+                            body_element = wait.until(EC.presence_of_element_located((By.TAG_NAME, 'body')))
                         
-                        # Get page content
-                        page_text = driver.find_element(By.TAG_NAME, 'body').text
-                        page_source = driver.page_source
+                            # Targeted mode: read only the rating/review nodes instead of the whole page
+                            if TARGETED_EXTRACTION:
+                                with span('rating_nodes'):
+                                    rating_text, _ = extract_rating_text(driver)
+                                if rating_text:
+                                    found = extract_rating_reviews(rating_text)
+                                    if found['rating'] or found['rating_count'] or found['review_count']:
+                                        targeted_result = found
+                                        page_text = rating_text
+                                        break
                         
-                        # Check if we're on an access denied page
-                        if is_access_denied(page_source, page_text):
-                            print(f"[WARNING] Attempt {attempt+1}: Access denied/blocked page detected")
+                            # Get page content
+                            page_text = driver.find_element(By.TAG_NAME, 'body').text
+                            page_source = driver.page_source
+                        
+                            # Check if we're on an access denied page
+                            if is_access_denied(page_source, page_text):
+                                print(f"[WARNING] Attempt {attempt+1}: Access denied/blocked page detected")
                             
-                            # If this is early in attempts, wait and refresh
-                            if attempt < access_denied_retries:
-                                print(f"[INFO] Waiting for page to redirect/reload (attempt {attempt+1}/{access_denied_retries})...")
-                                time.sleep(8)  # Wait longer for redirect
+                                # If this is early in attempts, wait and refresh
+                                if attempt < access_denied_retries:
+                                    print(f"[INFO] Waiting for page to redirect/reload (attempt {attempt+1}/{access_denied_retries})...")
+                                    time.sleep(8)  # Wait longer for redirect
                                 
-                                # Try refreshing the page
-                                print(f"[INFO] Attempting to refresh page...")
-                                try:
-                                    driver.refresh()
-                                    time.sleep(5)  # Wait after refresh
+                                    # Try refreshing the page
+                                    print(f"[INFO] Attempting to refresh page...")
+                                    try:
+                                        driver.refresh()
+                                        time.sleep(5)  # Wait after refresh
                                     
-                                    # Check again after refresh
-                                    page_text = driver.find_element(By.TAG_NAME, 'body').text
-                                    page_source = driver.page_source
+                                        # Check again after refresh
+                                        page_text = driver.find_element(By.TAG_NAME, 'body').text
+                                        page_source = driver.page_source
                                     
-                                    if not is_access_denied(page_source, page_text):
-                                        print(f"[INFO] Page loaded successfully after refresh!")
-                                        break
-                                    else:
-                                        print(f"[INFO] Still blocked after refresh, will retry...")
-                                except Exception as refresh_error:
-                                    print(f"[WARNING] Refresh failed: {refresh_error}")
-                            else:
-                                print(f"[INFO] Access denied persisted after {access_denied_retries} attempts")
-                            continue
+                                        if not is_access_denied(page_source, page_text):
+                                            print(f"[INFO] Page loaded successfully after refresh!")
+                                            break
+                                        else:
+                                            print(f"[INFO] Still blocked after refresh, will retry...")
+                                    except Exception as refresh_error:
+                                        print(f"[WARNING] Refresh failed: {refresh_error}")
+                                else:
+                                    print(f"[INFO] Access denied persisted after {access_denied_retries} attempts")
+                                continue
                         
-                        # Check if we have sufficient content
-                        if len(page_text) > 100:  # Got some content
-                            print(f"[INFO] Page loaded successfully! Length: {len(page_text)} characters")
-                            break
-                        else:
-                            print(f"[INFO] Attempt {attempt+1}: Page text too short ({len(page_text)} chars), waiting more...")
-                            time.sleep(5)  # Wait longer for dynamic content
+                            # Check if we have sufficient content
+                            if len(page_text) > 100:  # Got some content
+                                print(f"[INFO] Page loaded successfully! Length: {len(page_text)} characters")
+                                break
+                            else:
+                                print(f"[INFO] Attempt {attempt+1}: Page text too short ({len(page_text)} chars), waiting more...")
+                                time.sleep(5)  # Wait longer for dynamic content
                             
-                    except Exception as wait_error:
-                        error_str = str(wait_error)
-                        print(f"[INFO] Attempt {attempt+1}: {error_str}")
-                        if attempt < max_retries - 1:
-                            # If error, try refreshing once
-                            if attempt == max_retries // 2:  # Try refresh at midpoint
-                                try:
-                                    print(f"[INFO] Attempting page refresh due to error...")
-                                    driver.refresh()
-                                    time.sleep(5)
-                                except:
-                                    pass
-                            time.sleep(5)
-                        else:
-                            # Last attempt - try to get whatever we can
-                            try:
-                                page_text = driver.find_element(By.TAG_NAME, 'body').text
-                                page_source = driver.page_source
-                            except Exception as e:
+                        except Exception as wait_error:
+                            error_str = str(wait_error)
+                            print(f"[INFO] Attempt {attempt+1}: {error_str}")
+                            if attempt < max_retries - 1:
+                                # If error, try refreshing once
+                                if attempt == max_retries // 2:  # Try refresh at midpoint
+                                    try:
+                                        print(f"[INFO] Attempting page refresh due to error...")
+                                        driver.refresh()
+                                        time.sleep(5)
+                                    except:
+                                        pass
+                                time.sleep(5)
+                            else:
+                                # Last attempt - try to get whatever we can
                                 try:
-                                    page_source = driver.page_source  # Fallback to page source
-                                    page_text = ""  # Will use page_source for extraction
-                                except:
-                                    raise Exception(f"Could not retrieve page content: {str(wait_error)}")
+                                    page_text = driver.find_element(By.TAG_NAME, 'body').text
+                                    page_source = driver.page_source
+                                except Exception as e:
+                                    try:
+                                        page_source = driver.page_source  # Fallback to page source
+                                        page_text = ""  # Will use page_source for extraction
+                                    except:
+                                        raise Exception(f"Could not retrieve page content: {str(wait_error)}")
                 
-                # Final check if we still have access denied
-                if page_source:
-                    final_page_text = page_text or ""
-                    if is_access_denied(page_source, final_page_text):
-                        print(f"[WARNING] Final page still shows access denied, but attempting extraction anyway...")
-                        # Continue anyway - might have some useful data
+                if targeted_result:
+                    result = targeted_result
+                    print(f"[INFO] Extracted from rating nodes ({len(page_text)} characters)")
+                else:
+                    # Final check if we still have access denied
+                    if page_source:
+                        final_page_text = page_text or ""
+                        if is_access_denied(page_source, final_page_text):
+                            print(f"[WARNING] Final page still shows access denied, but attempting extraction anyway...")
+                            # Continue anyway - might have some useful data
                 
-                if not page_text or len(page_text) < 50:
-                    # Try using page_source if page_text is insufficient
-                    if page_source and len(page_source) > 500:
-                        print(f"[INFO] Using page source for extraction (text too short)")
-                        # Extract text from HTML as fallback
-                        from bs4 import BeautifulSoup
-                        try:
-                            soup = BeautifulSoup(page_source, 'html.parser')
-                            page_text = soup.get_text()
-                        except:
-                            page_text = page_source
+                    if not page_text or len(page_text) < 50:
+                        # Try using page_source if page_text is insufficient
+                        if page_source and len(page_source) > 500:
+                            print(f"[INFO] Using page source for extraction (text too short)")
+                            # Extract text from HTML as fallback
+                            try:
+                                with span('html_to_text'):
+                                    page_text = html_to_text(page_source)
+                            except:
+                                page_text = page_source
                     
-                    if (not page_text or len(page_text) < 50) and (not page_source or len(page_source) < 500):
-                        raise Exception("Could not load page content - page may be blocking automation or taking too long to load")
+                        if (not page_text or len(page_text) < 50) and (not page_source or len(page_source) < 500):
+                            raise Exception("Could not load page content - page may be blocking automation or taking too long to load")
                 
-                print(f"[INFO] Final page text length: {len(page_text)} characters")
+                    print(f"[INFO] Final page text length: {len(page_text)} characters")
                 
-                # Extract using regex patterns
-                result = extract_rating_reviews(page_text)
+                    # Structured JSON-LD / app-state data first, then regex patterns on the text
+                    with span('structured'):
+                        result = extract_structured_ratings(page_source)
+                    if result:
+                        print(f"[INFO] Extracted from {result['source']}")
+                    else:
+                        with span('regex'):
+                            result = extract_rating_reviews(page_text)
                 
-                # Debug: if no data found, try to see what's in the page
-                if not result['rating'] and not result['rating_count']:
-                    print(f"[DEBUG] Sample page text: {page_text[:500]}")
+                    # Debug: if no data found, try to see what's in the page
+                    if not result['rating'] and not result['rating_count']:
+                        print(f"[DEBUG] Sample page text: {page_text[:500]}")
                 
             finally:
                 try:
                     if driver:
-                        driver.quit()
+                        with span('driver_quit'):
+                            driver.quit()
                 except Exception as quit_error:
                     print(f"[WARNING] Error closing driver: {quit_error}")
         else:
             # Extract from text directly
             print(f"[INFO] Processing as text...")
-            result = extract_rating_reviews(input_text)
+            with span('structured'):
+                result = extract_structured_ratings(input_text)
+            if not result:
+                with span('regex'):
+                    result = extract_rating_reviews(input_text)
         
         if result['rating'] or result['rating_count'] or result['review_count']:
             print(f"[SUCCESS] Extracted: {result}")
@@ -767,6 +788,72 @@ def extract_ratings():
             'error': user_error
         })
 
+@app.route('/extract_batch', methods=['POST'])
+def extract_ratings_batch():
+    """Extract ratings and reviews from a list of URLs using multi-tab scraping"""
+    try:
+        data = request.json
+        urls = []
+        for url in data.get('urls', []):
+            url = url.strip()
+            if not url:
+                continue
+            if not url.startswith('http'):
+                url = 'https://' + url
+            if url not in urls:
+                urls.append(url)
+
+        if not urls:
+            return jsonify({'success': False, 'error': 'At least one URL is required'})
+        if len(urls) > MAX_BATCH_URLS:
+            return jsonify({'success': False, 'error': f'At most {MAX_BATCH_URLS} URLs per batch'}), 400
+
+        try:
+            tabs_per_browser = int(data.get('tabs_per_browser', TABS_PER_BROWSER))
+            browsers_per_host = int(data.get('browsers_per_host', BROWSERS_PER_HOST))
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'tabs_per_browser and browsers_per_host must be integers'}), 400
+        if tabs_per_browser < 1 or browsers_per_host < 1:
+            return jsonify({'success': False, 'error': 'tabs_per_browser and browsers_per_host must be at least 1'}), 400
+        if tabs_per_browser > MAX_TABS_PER_BROWSER or browsers_per_host > MAX_BROWSERS_PER_HOST:
+            return jsonify({'success': False, 'error': f'tabs_per_browser must be at most {MAX_TABS_PER_BROWSER} '
+                                                       f'and browsers_per_host at most {MAX_BROWSERS_PER_HOST}'}), 400
+
+        print(f"\n[INFO] Batch processing {len(urls)} URL(s)...")
+        with span('scrape'):
+            pages = scrape_urls(urls, tabs_per_browser=tabs_per_browser, browsers_per_host=browsers_per_host)
+
+        results = []
+        for url in urls:
+            page = pages.get(url, {'page_text': None, 'error': 'Not scraped'})
+            if not page['page_text']:
+                results.append({'url': url, 'success': False, 'error': page['error'] or 'Could not load page content'})
+                continue
+
+            with span('regex'):
+                result = extract_rating_reviews(page['page_text'])
+            if result['rating'] or result['rating_count'] or result['review_count']:
+                results.append({
+                    'url': url,
+                    'success': True,
+                    'rating': result['rating'],
+                    'rating_count': result['rating_count'],
+                    'review_count': result['review_count']
+                })
+            else:
+                results.append({'url': url, 'success': False, 'error': 'No rating or review data found'})
+
+        print(f"[SUCCESS] Batch done: {sum(1 for r in results if r['success'])}/{len(results)} extracted")
+        return jsonify({'success': True, 'results': results})
+
+    except Exception as e:
+        error_msg = str(e)
+        print(f"[ERROR] {error_msg}")
+        return jsonify({
+            'success': False,
+            'error': f'Failed to extract batch: {error_msg[:200]}'
+        })
+
 if __name__ == '__main__':
     print("="*80)
     print("Rating & Reviews Extractor")
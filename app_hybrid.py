@@ -24,10 +24,19 @@ import shutil
 import subprocess
 import undetected_chromedriver as uc
 from selenium.webdriver.common.by import By
+from rating_dom import extract_rating_text, TARGETED_EXTRACTION
+from tracing import init_app, span
+import model_registry
+from inference_worker import INFERENCE_WORKER
 
 # Import AI model (will use if available, otherwise fallback to regex)
+# INFERENCE_WORKER=1: the model lives in the host's inference_worker.py process
 try:
-    from inference import generate_reviews_json
+    if INFERENCE_WORKER:
+        from inference_worker import client as inference_client
+        generate_reviews_json = inference_client.generate_reviews_json
+    else:
+        from inference import generate_reviews_json
     AI_MODEL_AVAILABLE = True
     print("[INFO] AI Model enabled")
 except ImportError as e:
@@ -35,6 +44,9 @@ except ImportError as e:
     AI_MODEL_AVAILABLE = False
 
 app = Flask(__name__)
+init_app(app, 'hybrid')
+if AI_MODEL_AVAILABLE:
+    model_registry.init_app(app, inference_client.swap_adapter if INFERENCE_WORKER else None)  # POST /admin/adapter
 
 def extract_with_ai(text):
     """Extract using AI model"""
@@ -52,6 +64,7 @@ def extract_with_ai(text):
                 'method': 'AI'
             }
     except Exception as e:
+        # Including ModelBusy: the page is already scraped, so answer with regex rather than 503
         print(f"[WARNING] AI extraction failed: {e}")
     
     return None
@@ -467,81 +480,91 @@ def extract_ratings():
             return None
         
         # Clean up cache before first attempt
-        cleanup_chromedriver_cache()
+        with span('driver_init'):
+            cleanup_chromedriver_cache()
         
-        # Setup browser with proper error handling
-        driver = None
-        max_attempts = 3
-        chrome_version = get_chrome_version()
+            # Setup browser with proper error handling
+            driver = None
+            max_attempts = 3
+            chrome_version = get_chrome_version()
         
-        for attempt in range(max_attempts):
-            try:
-                options = uc.ChromeOptions()
-                options.add_argument("--start-maximized")
-                options.add_argument("--no-sandbox")
-                options.add_argument("--disable-dev-shm-usage")
-                options.add_argument("--disable-blink-features=AutomationControlled")
-                options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+            for attempt in range(max_attempts):
+                try:
+                    options = uc.ChromeOptions()
+                    options.add_argument("--start-maximized")
+                    options.add_argument("--no-sandbox")
+                    options.add_argument("--disable-dev-shm-usage")
+                    options.add_argument("--disable-blink-features=AutomationControlled")
+                    options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
                 
-                # Use detected Chrome version if available, otherwise let uc auto-detect
-                driver_kwargs = {
-                    'options': options,
-                    'use_subprocess': True,
-                    'driver_executable_path': None
-                }
+                    # Use detected Chrome version if available, otherwise let uc auto-detect
+                    driver_kwargs = {
+                        'options': options,
+                        'use_subprocess': True,
+                        'driver_executable_path': None
+                    }
                 
-                # Specify version_main if we detected it, otherwise let uc handle it
-                if chrome_version:
-                    driver_kwargs['version_main'] = chrome_version
-                    print(f"[INFO] Using ChromeDriver version {chrome_version} to match Chrome browser")
-                else:
-                    driver_kwargs['version_main'] = None  # Auto-detect
-                    print(f"[INFO] Auto-detecting ChromeDriver version")
+                    # Specify version_main if we detected it, otherwise let uc handle it
+                    if chrome_version:
+                        driver_kwargs['version_main'] = chrome_version
+                        print(f"[INFO] Using ChromeDriver version {chrome_version} to match Chrome browser")
+                    else:
+                        driver_kwargs['version_main'] = None  # Auto-detect
+                        print(f"[INFO] Auto-detecting ChromeDriver version")
                 
-                driver = uc.Chrome(**driver_kwargs)
-                print(f"[INFO] ChromeDriver initialized successfully")
-                break
+                    driver = uc.Chrome(**driver_kwargs)
+                    print(f"[INFO] ChromeDriver initialized successfully")
+                    break
                 
-            except Exception as driver_error:
-                error_str = str(driver_error)
-                print(f"[WARNING] Attempt {attempt + 1}/{max_attempts}: {error_str}")
+                except Exception as driver_error:
+                    error_str = str(driver_error)
+                    print(f"[WARNING] Attempt {attempt + 1}/{max_attempts}: {error_str}")
                 
-                # Handle file conflict error (WinError 183) - clean up and retry
-                if "WinError 183" in error_str or "Cannot create a file when that file already exists" in error_str:
-                    print(f"[INFO] File conflict detected, cleaning up cache...")
-                    cleanup_chromedriver_cache()
-                    time.sleep(1)
+                    # Handle file conflict error (WinError 183) - clean up and retry
+                    if "WinError 183" in error_str or "Cannot create a file when that file already exists" in error_str:
+                        print(f"[INFO] File conflict detected, cleaning up cache...")
+                        cleanup_chromedriver_cache()
+                        time.sleep(1)
                 
-                # Handle version mismatch - force cleanup and retry
-                if "version" in error_str.lower() or "ChromeDriver only supports" in error_str or "session not created" in error_str.lower():
-                    print(f"[INFO] Version mismatch detected, cleaning up cache for fresh download...")
-                    cleanup_chromedriver_cache()
-                    time.sleep(1)
+                    # Handle version mismatch - force cleanup and retry
+                    if "version" in error_str.lower() or "ChromeDriver only supports" in error_str or "session not created" in error_str.lower():
+                        print(f"[INFO] Version mismatch detected, cleaning up cache for fresh download...")
+                        cleanup_chromedriver_cache()
+                        time.sleep(1)
                 
-                if attempt < max_attempts - 1:
-                    time.sleep(2)  # Wait before retry
-                else:
-                    # Last attempt failed, raise the error
-                    raise Exception(f"Failed to initialize ChromeDriver after {max_attempts} attempts: {error_str}")
+                    if attempt < max_attempts - 1:
+                        time.sleep(2)  # Wait before retry
+                    else:
+                        # Last attempt failed, raise the error
+                        raise Exception(f"Failed to initialize ChromeDriver after {max_attempts} attempts: {error_str}")
         
-        if driver is None:
-            raise Exception("Failed to initialize ChromeDriver")
+            if driver is None:
+                raise Exception("Failed to initialize ChromeDriver")
         
         try:
             print(f"[INFO] Navigating to: {input_text}")
-            driver.get(input_text)
-            time.sleep(8)
+            with span('navigate'):
+                driver.get(input_text)
+                time.sleep(8)
             
-            # Get page content
-            page_text = driver.find_element(By.TAG_NAME, 'body').text
+            # Get page content - only the rating/review nodes when the page has them
+            page_text = None
+            if TARGETED_EXTRACTION:
+                with span('rating_nodes'):
+                    page_text, _ = extract_rating_text(driver)
+            if not page_text:
+                with span('body_text'):
+                    page_text = driver.find_element(By.TAG_NAME, 'body').text
             print(f"[INFO] Page text length: {len(page_text)} characters")
             
             # Try AI extraction first, fallback to regex
-            result = extract_with_ai(page_text)
+            with span('inference'):
+                result = extract_with_ai(page_text)
             
             if not result:
                 print("[INFO] AI not available, using regex...")
-                result = extract_with_regex(page_text)
+                with span('regex'):
+                    result = extract_with_regex(page_text)
             
             if result.get('rating') or result.get('rating_count') or result.get('review_count'):
                 print(f"[SUCCESS] Extracted: {result}")
@@ -560,7 +583,8 @@ def extract_ratings():
                 
         finally:
             try:
-                driver.quit()
+                with span('driver_quit'):
+                    driver.quit()
             except:
                 pass
                 
@@ -19,9 +19,29 @@ if sys.platform == 'win32':
 # os.environ['HF_TOKEN'] = 'your_token_here'
 
 from flask import Flask, request, jsonify
-from inference import generate_reviews_json
+from inference_worker import INFERENCE_WORKER
+from micro_batcher import MicroBatcher, MAX_BATCH_SIZE, MAX_WAIT_MS
+from tracing import init_app, span
+import model_registry
+import model_manager
+from model_manager import ModelBusy, busy_response, INFERENCE_TIMEOUT
+
+# INFERENCE_WORKER=1: the model lives in the host's inference_worker.py process,
+# not in each web worker
+if INFERENCE_WORKER:
+    from inference_worker import client as inference_client
+    generate_reviews_json_batch = inference_client.generate_reviews_json_batch
+else:
+    from inference import generate_reviews_json_batch
 
 app = Flask(__name__)
+init_app(app, 'model')
+model_registry.init_app(app, inference_client.swap_adapter if INFERENCE_WORKER else None)  # POST /admin/adapter
+model_manager.init_app(app)  # 503 when the model is busy
+
+# Concurrent /extract calls are grouped into one padded generate() call;
+# the batcher's worker thread is the only thread that uses the model
+batcher = MicroBatcher(generate_reviews_json_batch, MAX_BATCH_SIZE, MAX_WAIT_MS)
 
 @app.route('/')
 def index():
@@ -329,7 +349,8 @@ def extract_ratings():
         print(f"[DEBUG] Input text: {input_text[:200]}...")
         
         # Use LLM model to extract
-        result = generate_reviews_json(input_text)
+        with span('inference'):
+            result = batcher.submit(input_text, timeout=INFERENCE_TIMEOUT or None)
         
         print(f"[DEBUG] Model result: {result}")
         
@@ -351,6 +372,11 @@ def extract_ratings():
                 'error': error_msg
             })
             
+    except ModelBusy:
+        raise
+    except TimeoutError as e:
+        print(f"[WARNING] {e}")
+        return busy_response(e)
     except Exception as e:
         error_msg = str(e)
         print(f"[ERROR] {error_msg}")
@@ -364,8 +390,11 @@ if __name__ == '__main__':
     print("="*80)
     print("Meesho Rating & Reviews Extractor (LLM Model)")
     print("="*80)
+    print(f"Micro-batching: up to {MAX_BATCH_SIZE} requests, {MAX_WAIT_MS:g} ms max wait")
+    if INFERENCE_WORKER:
+        print(f"Model served by the inference worker ({inference_client.address})")
     print("Starting Flask server on http://localhost:5002")
     print("Open your browser and go to http://localhost:5002")
     print("="*80)
-    app.run(debug=True, host='0.0.0.0', port=5002)
+    app.run(debug=True, host='0.0.0.0', port=5002, threaded=True)
 
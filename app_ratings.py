@@ -21,8 +21,11 @@ import time
 import re
 import undetected_chromedriver as uc
 from selenium.webdriver.common.by import By
+from rating_dom import extract_rating_text, TARGETED_EXTRACTION
+from tracing import init_app, span
 
 app = Flask(__name__)
+init_app(app, 'ratings')
 
 @app.route('/')
 def index():
@@ -318,19 +321,27 @@ def extract_ratings():
         options.add_argument("--disable-blink-features=AutomationControlled")
         options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
         
-        driver = uc.Chrome(options=options)
+        with span('driver_init'):
+            driver = uc.Chrome(options=options)
         
         try:
             print(f"[INFO] Navigating to URL...")
-            driver.get(url)
+            with span('navigate'):
+                driver.get(url)
             
-            # Wait longer for dynamic content
-            print(f"[INFO] Waiting for page to load...")
-            time.sleep(12)  # Increased wait time
+                # Wait longer for dynamic content
+                print(f"[INFO] Waiting for page to load...")
+                time.sleep(12)  # Increased wait time
             
-            # Get page text
+            # Get page text - only the rating/review nodes when the page has them
             print(f"[INFO] Extracting page content...")
-            page_text = driver.find_element(By.TAG_NAME, 'body').text
+            page_text = None
+            if TARGETED_EXTRACTION:
+                with span('rating_nodes'):
+                    page_text, _ = extract_rating_text(driver)
+            if not page_text:
+                with span('body_text'):
+                    page_text = driver.find_element(By.TAG_NAME, 'body').text
             
             print(f"[INFO] Page text length: {len(page_text)} characters")
             
@@ -348,49 +359,50 @@ def extract_ratings():
             }
             
             # Extract rating - multiple patterns
-            rating_patterns = [
-                r'(\d+\.\d+)\s*\*',  # 4.2*
-                r'(\d+\.\d+)',  # Just number
-                r'Rating:\s*(\d+\.\d+)',  # Rating: 4.2
-            ]
-            
-            for pattern in rating_patterns:
-                rating_match = re.search(pattern, page_text)
-                if rating_match:
-                    rating_num = rating_match.group(1)
-                    try:
-                        rating_value = float(rating_num)
-                        if 0 <= rating_value <= 5:
-                            result['rating'] = f"{rating_num}★"
-                            print(f"[OK] Rating: {result['rating']}")
+            with span('regex'):
+                rating_patterns = [
+                    r'(\d+\.\d+)\s*\*',  # 4.2*
+                    r'(\d+\.\d+)',  # Just number
+                    r'Rating:\s*(\d+\.\d+)',  # Rating: 4.2
+                ]
+            
+                for pattern in rating_patterns:
+                    rating_match = re.search(pattern, page_text)
+                    if rating_match:
+                        rating_num = rating_match.group(1)
+                        try:
+                            rating_value = float(rating_num)
+                            if 0 <= rating_value <= 5:
+                                result['rating'] = f"{rating_num}★"
+                                print(f"[OK] Rating: {result['rating']}")
+                                break
+                        except:
+                            pass
+            
+                # Extract ratings count - multiple patterns
+                ratings_patterns = [
+                    r'([\d,]+)\s+[Rr]atings?',
+                    r'([\d,]+\s*[Rr]atings?)',
+                ]
+            
+                for pattern in ratings_patterns:
+                    ratings_match = re.search(pattern, page_text)
+                    if ratings_match:
+                        ratings_full = ratings_match.group(1)
+                        # Extract numbers
+                        numbers = re.findall(r'[\d,]+', ratings_full)
+                        if numbers:
+                            ratings_num = numbers[0].replace(',', '')
+                            result['ratings_count'] = f"{ratings_num} Ratings"
+                            print(f"[OK] Ratings count: {result['ratings_count']}")
                             break
-                    except:
-                        pass
-            
-            # Extract ratings count - multiple patterns
-            ratings_patterns = [
-                r'([\d,]+)\s+[Rr]atings?',
-                r'([\d,]+\s*[Rr]atings?)',
-            ]
-            
-            for pattern in ratings_patterns:
-                ratings_match = re.search(pattern, page_text)
-                if ratings_match:
-                    ratings_full = ratings_match.group(1)
-                    # Extract numbers
-                    numbers = re.findall(r'[\d,]+', ratings_full)
-                    if numbers:
-                        ratings_num = numbers[0].replace(',', '')
-                        result['ratings_count'] = f"{ratings_num} Ratings"
-                        print(f"[OK] Ratings count: {result['ratings_count']}")
-                        break
-            
-            # Extract reviews count
-            reviews_match = re.search(r'([\d,]+)\s+[Rr]eviews?', page_text)
-            if reviews_match:
-                reviews_num = reviews_match.group(1).replace(',', '')
-                result['reviews_count'] = f"{reviews_num} Reviews"
-                print(f"[OK] Reviews count: {result['reviews_count']}")
+            
+                # Extract reviews count
+                reviews_match = re.search(r'([\d,]+)\s+[Rr]eviews?', page_text)
+                if reviews_match:
+                    reviews_num = reviews_match.group(1).replace(',', '')
+                    result['reviews_count'] = f"{reviews_num} Reviews"
+                    print(f"[OK] Reviews count: {result['reviews_count']}")
             
             # Check if we got any data
             if result['rating'] or result['ratings_count'] or result['reviews_count']:
@@ -403,7 +415,8 @@ def extract_ratings():
             return jsonify(result)
             
         finally:
-            driver.quit()
+            with span('driver_quit'):
+                driver.quit()
             
     except Exception as e:
         error_msg = str(e)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: static batching vs continuous batching (continuous_batching.py)
+Static: generate() on left-padded batches of batch_size prompts, each batch
+        runs until its longest sequence is done
+Continuous: ContinuousBatcher.generate_all over all prompts at once
+
+Both decode greedily. Without a model path a tiny random Llama is used, so
+only the relative cost of the decode loops is meaningful; with a path the
+prompts are reviews prompts built from the saved pages (data/pages/*.txt).
+
+Usage: python bench_continuous_batching.py [model_path] [n_prompts] [batch_size] [max_new_tokens]
+"""
+
+import sys
+import glob
+import time
+import types
+
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer, LlamaConfig, LlamaForCausalLM
+
+from prompts import build_reviews_prompt
+from continuous_batching import ContinuousBatcher
+
+
+def tiny_model():
+    torch.manual_seed(0)
+    config = LlamaConfig(vocab_size=256, hidden_size=64, intermediate_size=128, num_hidden_layers=2,
+                         num_attention_heads=4, num_key_value_heads=2, max_position_embeddings=1024,
+                         eos_token_id=2, pad_token_id=0)
+    return LlamaForCausalLM(config).eval(), types.SimpleNamespace(eos_token_id=2, pad_token_id=0)
+
+
+def random_prompts(n):
+    generator = torch.Generator().manual_seed(1)
+    lengths = torch.randint(10, 200, (n,), generator=generator).tolist()
+    return [torch.randint(3, 256, (length,), generator=generator).tolist() for length in lengths]
+
+
+def page_prompts(tokenizer, n):
+    snippets = []
+    for path in sorted(glob.glob("data/pages/*.txt")):
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        snippets += [text[i:i + 400] for i in range(0, len(text), 400)]
+    if not snippets:
+        snippets = ['Rating: 4.2 ★ 20,596 Ratings & 9,777 Reviews']
+    return [tokenizer(build_reviews_prompt(snippets[i % len(snippets)]))['input_ids'] for i in range(n)]
+
+
+def trim(ids, eos_token_id):
+    return ids[:ids.index(eos_token_id) + 1] if eos_token_id in ids else ids
+
+
+def static_batching(model, prompt_ids, batch_size, max_new_tokens, eos_token_id, pad_token_id):
+    generated = []
+    for i in range(0, len(prompt_ids), batch_size):
+        batch = prompt_ids[i:i + batch_size]
+        longest = max(map(len, batch))
+        input_ids = torch.tensor([[pad_token_id] * (longest - len(ids)) + ids for ids in batch], device=model.device)
+        mask = torch.tensor([[0] * (longest - len(ids)) + [1] * len(ids) for ids in batch], device=model.device)
+        with torch.no_grad():
+            output = model.generate(input_ids, attention_mask=mask, max_new_tokens=max_new_tokens, do_sample=False,
+                                    pad_token_id=pad_token_id, eos_token_id=eos_token_id)
+        generated += [trim(row[longest:].tolist(), eos_token_id) for row in output]
+    return generated
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else None
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    batch_size = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    max_new_tokens = int(sys.argv[4]) if len(sys.argv) > 4 else 64
+
+    if path:
+        tokenizer = AutoTokenizer.from_pretrained(path)
+        model = AutoModelForCausalLM.from_pretrained(path).eval()
+        prompt_ids = page_prompts(tokenizer, n)
+    else:
+        model, tokenizer = tiny_model()
+        prompt_ids = random_prompts(n)
+    eos_token_id = tokenizer.eos_token_id
+    pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else eos_token_id
+
+    static_batching(model, prompt_ids[:1], 1, 2, eos_token_id, pad_token_id)  # warm up outside the timing
+    start = time.perf_counter()
+    static = static_batching(model, prompt_ids, batch_size, max_new_tokens, eos_token_id, pad_token_id)
+    static_s = time.perf_counter() - start
+
+    batcher = ContinuousBatcher(model, tokenizer, max_batch_size=batch_size)
+    start = time.perf_counter()
+    continuous = batcher.generate_all(prompt_ids, max_new_tokens)
+    continuous_s = time.perf_counter() - start
+
+    tokens = sum(map(len, continuous))
+    print("=" * 80)
+    print(f"Prompts: {n} (avg {sum(map(len, prompt_ids)) / n:.0f} tokens), batch {batch_size}, "
+          f"max_new_tokens {max_new_tokens}, {tokens} tokens generated")
+    print("=" * 80)
+    print(f"{'static batching (generate())':<40} {static_s:>8.2f}s {sum(map(len, static)) / static_s:>10,.1f} tokens/s")
+    print(f"{'continuous batching':<40} {continuous_s:>8.2f}s {tokens / continuous_s:>10,.1f} tokens/s")
+    print(f"  working cache rebuilt from blocks {batcher.gathers}x in {batcher.decode_steps} decode steps, "
+          f"{batcher.preemptions} preemption(s)")
+    print("-" * 80)
+    print(f"Speedup vs static: {static_s / continuous_s:.2f}x, "
+          f"same tokens: {sum(a == b for a, b in zip(static, continuous))}/{n}")
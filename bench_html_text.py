@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: lxml HTML-to-text (html_text.py) vs the old BeautifulSoup fallback
+Runs over the saved pages in data/pages/*.html
+
+Usage: python bench_html_text.py [pages_dir] [repeats]
+"""
+
+import sys
+import glob
+import time
+
+from bs4 import BeautifulSoup
+from html_text import html_to_text, LXML_AVAILABLE
+
+
+def bs4_fallback(page_source):
+    """The fallback app_final.py used before html_text.py"""
+    return BeautifulSoup(page_source, 'html.parser').get_text()
+
+
+def time_it(fn, page_source, repeats):
+    """Best-of-N wall time in milliseconds"""
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(page_source)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+if __name__ == "__main__":
+    pages_dir = sys.argv[1] if len(sys.argv) > 1 else "data/pages"
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    paths = sorted(glob.glob(f"{pages_dir}/*.html"))
+    if not paths:
+        print(f"ERROR: No .html pages found in {pages_dir}")
+        sys.exit(1)
+    if not LXML_AVAILABLE:
+        print("WARNING: lxml not installed - html_text is using its BeautifulSoup fallback")
+
+    print("=" * 80)
+    print(f"{'Page':<40} {'Size KB':>8} {'bs4 ms':>9} {'lxml ms':>9} {'Speedup':>8}")
+    print("=" * 80)
+
+    total_bs4 = total_lxml = 0.0
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            page_source = f.read()
+        bs4_ms = time_it(bs4_fallback, page_source, repeats)
+        lxml_ms = time_it(html_to_text, page_source, repeats)
+        total_bs4 += bs4_ms
+        total_lxml += lxml_ms
+        name = path.replace('\\', '/').split('/')[-1]
+        print(f"{name:<40} {len(page_source) / 1024:>8.1f} {bs4_ms:>9.2f} {lxml_ms:>9.2f} {bs4_ms / lxml_ms:>7.1f}x")
+
+    print("-" * 80)
+    print(f"{'TOTAL':<40} {'':>8} {total_bs4:>9.2f} {total_lxml:>9.2f} {total_bs4 / total_lxml:>7.1f}x")
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: JSON extraction from model output before and after json_scan.py
+Old: greedy regex (\\{.*\\}) with re.S over the decoded prompt + completion,
+     then again from the "### Output:" marker
+New: parse_json_output (balanced-brace scanner) over the completion only
+
+Prompts are built from the saved pages (data/pages/*.txt), the completion is
+a typical reviews answer followed by the kind of text a model emits when it
+does not stop cleanly. Also counts how often each picks the wrong object.
+
+Usage: python bench_json_scan.py [input_chars] [repeats]
+"""
+
+import re
+import sys
+import glob
+import json
+import time
+
+from prompts import build_reviews_prompt
+from inference import parse_json_output
+
+ANSWER = {"Rating": 4.2, "Rating Count": 20596, "Review Count": 9777}
+COMPLETIONS = [
+    json.dumps(ANSWER),
+    json.dumps(ANSWER) + '\n\n### Input:\n{"Rating": null}',
+    json.dumps(ANSWER) + ' }',
+]
+
+
+def regex_parse(decoded):
+    """What inference.parse_json_output did before json_scan.py"""
+    m = re.search(r'(\{.*\})', decoded, re.S)
+    if not m:
+        candidate = decoded.split("### Output:")[-1].strip()
+        m = re.search(r'(\{.*\})', candidate, re.S)
+    if not m:
+        return {"error": "no json found", "raw": decoded}
+    try:
+        return {"json": json.loads(m.group(1))}
+    except json.JSONDecodeError as e:
+        return {"error": "json parse error", "raw": m.group(1), "exception": str(e)}
+
+
+def load_texts(input_chars):
+    texts = []
+    for path in sorted(glob.glob("data/pages/*.txt")):
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        texts += [text[i:i + input_chars] for i in range(0, len(text), input_chars)]
+    # product text with braces in it, e.g. a variant list or a scraped script
+    texts.append('Size: {S, M, L} Rating: 4.2 ★ 20,596 Ratings & 9,777 Reviews {"sku": 1}')
+    return texts
+
+
+def time_it(fn, args, repeats):
+    """Best-of-N wall time per call in microseconds"""
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for a in args:
+            fn(a)
+        elapsed = (time.perf_counter() - start) * 1e6 / len(args)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+if __name__ == "__main__":
+    input_chars = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    texts = load_texts(input_chars)
+    if len(texts) < 2:
+        print("WARNING: No .txt pages found in data/pages, using the built-in text only")
+    full = [build_reviews_prompt(t) + c for t in texts for c in COMPLETIONS]
+    completions = [c for _ in texts for c in COMPLETIONS]
+
+    old_wrong = sum(regex_parse(d).get('json') != ANSWER for d in full)
+    new_wrong = sum(parse_json_output(c).get('json') != ANSWER for c in completions)
+    old_us = time_it(regex_parse, full, repeats)
+    new_us = time_it(parse_json_output, completions, repeats)
+
+    print("=" * 70)
+    print(f"{len(full)} outputs, prompt + completion avg {sum(map(len, full)) / len(full):.0f} chars, "
+          f"completion avg {sum(map(len, completions)) / len(completions):.0f} chars")
+    print("=" * 70)
+    print(f"{'':<34} {'us/call':>10} {'wrong object':>14}")
+    print(f"{'regex over prompt + completion':<34} {old_us:>10.1f} {old_wrong:>14}")
+    print(f"{'scanner over completion':<34} {new_us:>10.1f} {new_wrong:>14}")
+    print(f"Speedup: {old_us / new_us:.1f}x")
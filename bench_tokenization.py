@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: prompt tokenization before and after the shared fast tokenizer
+Old: slow SentencePiece tokenizer (use_fast=False), one full prompt per call
+New: fast tokenizer, cached instruction prefix, batched (inference.encode_prompts)
+
+Usage: python bench_tokenization.py [tokenizer_path] [n_prompts] [batch_size]
+"""
+
+import sys
+import glob
+import time
+
+from transformers import AutoTokenizer
+
+import inference
+from inference import encode_prompts, build_reviews_prompt, REVIEWS_INSTRUCTION
+
+
+def load_texts(n):
+    """n rating-snippet sized texts from the saved pages"""
+    snippets = []
+    for path in sorted(glob.glob("data/pages/*.txt")):
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        snippets += [text[i:i + 400] for i in range(0, len(text), 400)]
+    return [f"{snippets[i % len(snippets)]} #{i}" for i in range(n)]
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else inference.MODEL
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    batch_size = int(sys.argv[3]) if len(sys.argv) > 3 else 64
+    texts = load_texts(n)
+
+    slow = AutoTokenizer.from_pretrained(path, use_fast=False)
+    fast = AutoTokenizer.from_pretrained(path, use_fast=True)
+    fast.pad_token = fast.eos_token
+
+    start = time.perf_counter()
+    for text in texts:
+        slow(build_reviews_prompt(text), return_tensors="pt")
+    old_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for text in texts:
+        fast(build_reviews_prompt(text), return_tensors="pt")
+    fast_s = time.perf_counter() - start
+
+    encode_prompts(fast, REVIEWS_INSTRUCTION, texts[:1])  # build the prefix cache outside the timing
+    start = time.perf_counter()
+    for i in range(0, n, batch_size):
+        encode_prompts(fast, REVIEWS_INSTRUCTION, texts[i:i + batch_size])
+    new_s = time.perf_counter() - start
+
+    print("=" * 80)
+    print(f"Prompts: {n:,} (slow: {type(slow).__name__}, fast: {type(fast).__name__}, batch {batch_size})")
+    print("=" * 80)
+    print(f"{'slow, per prompt':<40} {old_s:>8.2f}s {n / old_s:>10,.0f} prompts/s")
+    print(f"{'fast, per prompt':<40} {fast_s:>8.2f}s {n / fast_s:>10,.0f} prompts/s")
+    print(f"{'fast, prefix cache, batched':<40} {new_s:>8.2f}s {n / new_s:>10,.0f} prompts/s")
+    print("-" * 80)
+    print(f"Speedup vs slow per-prompt: {old_s / new_s:.1f}x")
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Extraction benchmark suite
+Times each extraction stage over the saved page corpus in data/pages
+(*.txt page texts and *.html page sources) and reports throughput,
+p50/p95/p99 latency and peak RSS as JSON.
+
+Each target runs in its own process so peak RSS is per target.
+
+Usage:
+    python benchmark.py                                  # all CPU targets
+    python benchmark.py --targets regex,html_to_text     # a subset
+    python benchmark.py --targets llm --rounds 1         # LLM path (loads the model)
+    python benchmark.py --targets student --rounds 20    # distilled student, CPU latency in ms
+    python benchmark.py --targets student,onnx --rounds 20    # same model, PyTorch vs ONNX Runtime
+    python benchmark.py --output bench.json
+    python benchmark.py --compare baseline.json          # exit 1 on regression
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import platform
+import argparse
+import multiprocessing
+from queue import Empty
+
+from perf_utils import percentile, peak_rss_mb
+
+CORPUS_DIR = "data/pages"
+DEFAULT_TARGETS = ['regex', 'regex_pandas', 'structured', 'html_to_text', 'html_bs4', 'block_detect']
+ALL_TARGETS = DEFAULT_TARGETS + ['llm', 'student', 'onnx']
+RESULT_POLL_S = 5  # how often run_isolated checks that the child is still alive
+
+
+def load_corpus(corpus_dir):
+    """Return (texts, pages) - lists of (name, content)"""
+    def read(pattern):
+        items = []
+        for path in sorted(glob.glob(os.path.join(corpus_dir, pattern))):
+            with open(path, 'r', encoding='utf-8') as f:
+                items.append((os.path.basename(path), f.read()))
+        return items
+    return read('*.txt'), read('*.html')
+
+
+def build_target(name, texts, pages):
+    """Return (function, inputs) for a benchmark target"""
+    if name == 'regex':
+        from extract_simple import extract_rating_reviews
+        return (lambda text: extract_rating_reviews(text, verbose=False)), [t for _, t in texts]
+
+    if name == 'regex_pandas':
+        # One call extracts the whole corpus as a column
+        import pandas as pd
+        from pandas_extract import extract_rating_reviews_series
+        column = pd.Series([t for _, t in texts] * 100)
+        return extract_rating_reviews_series, [column]
+
+    if name == 'structured':
+        from structured_extract import extract_structured_ratings
+        return extract_structured_ratings, [p for _, p in pages]
+
+    if name == 'html_to_text':
+        from html_text import html_to_text
+        return html_to_text, [p for _, p in pages]
+
+    if name == 'html_bs4':
+        # The page_source fallback app_final.py used before html_text.py
+        from bs4 import BeautifulSoup
+        return (lambda page: BeautifulSoup(page, 'html.parser').get_text()), [p for _, p in pages]
+
+    if name == 'block_detect':
+        from block_detect import is_access_denied
+        by_name = dict(texts)
+        pairs = [(page, by_name.get(name[:-5] + '.txt', '')) for name, page in pages]
+        return (lambda pair: is_access_denied(*pair)), pairs
+
+    if name == 'llm':
+        from inference import generate_reviews_json
+        from rating_dom import MAX_NODE_TEXT
+        # The model sees rating-node sized snippets, not whole pages
+        return generate_reviews_json, [t[:MAX_NODE_TEXT * 4] for _, t in texts]
+
+    if name == 'student':
+        from student_model import generate_student_json_batch
+        from rating_dom import MAX_NODE_TEXT
+        return (lambda text: generate_student_json_batch([text])), [t[:MAX_NODE_TEXT * 4] for _, t in texts]
+
+    if name == 'onnx':
+        from onnx_backend import generate_onnx_json_batch
+        from rating_dom import MAX_NODE_TEXT
+        return (lambda text: generate_onnx_json_batch([text])), [t[:MAX_NODE_TEXT * 4] for _, t in texts]
+
+    raise ValueError(f"Unknown target: {name}")
+
+
+def run_target(name, corpus_dir, rounds, warmup):
+    """Time one target, return its result dict"""
+    texts, pages = load_corpus(corpus_dir)
+    fn, inputs = build_target(name, texts, pages)
+
+    for item in inputs[:warmup]:
+        fn(item)
+
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for item in inputs:
+            t0 = time.perf_counter()
+            fn(item)
+            latencies.append((time.perf_counter() - t0) * 1000)
+    total_s = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'calls': len(latencies),
+        'inputs_per_round': len(inputs),
+        'total_s': round(total_s, 4),
+        'throughput_per_s': round(len(latencies) / total_s, 2) if total_s else None,
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies), 4),
+            'p50': round(percentile(latencies, 50), 4),
+            'p95': round(percentile(latencies, 95), 4),
+            'p99': round(percentile(latencies, 99), 4),
+        },
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def _child(name, corpus_dir, rounds, warmup, queue):
+    try:
+        queue.put(run_target(name, corpus_dir, rounds, warmup))
+    except Exception as e:
+        queue.put({'error': f"{type(e).__name__}: {e}"})
+
+
+def run_isolated(name, corpus_dir, rounds, warmup):
+    """Run a target in a fresh process so its peak RSS is its own"""
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    process = ctx.Process(target=_child, args=(name, corpus_dir, rounds, warmup, queue))
+    process.start()
+    # No overall timeout (the LLM target can run for a long time), but a child
+    # that dies without reporting, e.g. OOM-killed, must not hang the suite
+    while True:
+        try:
+            result = queue.get(timeout=RESULT_POLL_S)
+            break
+        except Empty:
+            if process.is_alive():
+                continue
+            try:
+                result = queue.get(timeout=1)
+            except Empty:
+                result = {'error': f"process exited with code {process.exitcode} without a result"}
+                print(f"[ERROR] {name}: {result['error']}", file=sys.stderr)
+            break
+    process.join()
+    return result
+
+
+def compare(results, baseline, tolerance):
+    """List regressions vs a baseline report: lower throughput or higher p95 beyond tolerance"""
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get('results', {}).get(name)
+        if not before or 'error' in before or 'error' in current:
+            continue
+        if current['throughput_per_s'] < before['throughput_per_s'] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {before['throughput_per_s']} -> {current['throughput_per_s']}/s")
+        if current['latency_ms']['p95'] > before['latency_ms']['p95'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {before['latency_ms']['p95']} -> {current['latency_ms']['p95']} ms")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the extraction stages over the saved page corpus")
+    parser.add_argument('--corpus', default=CORPUS_DIR, help=f"corpus directory (default: {CORPUS_DIR})")
+    parser.add_argument('--targets', default=','.join(DEFAULT_TARGETS),
+                        help=f"comma-separated targets from: {', '.join(ALL_TARGETS)}")
+    parser.add_argument('--rounds', type=int, default=200, help="passes over the corpus per target (default: 200)")
+    parser.add_argument('--warmup', type=int, default=2, help="untimed calls before timing (default: 2)")
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    parser.add_argument('--compare', help="baseline JSON report to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.15, help="allowed relative regression (default: 0.15)")
+    args = parser.parse_args(argv)
+
+    texts, pages = load_corpus(args.corpus)
+    if not texts and not pages:
+        print(f"ERROR: No .txt or .html files in {args.corpus}", file=sys.stderr)
+        return 1
+
+    results = {}
+    for name in [t.strip() for t in args.targets.split(',') if t.strip()]:
+        print(f"[INFO] Benchmarking {name}...", file=sys.stderr)
+        results[name] = run_isolated(name, args.corpus, args.rounds, args.warmup)
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'corpus': {'dir': args.corpus, 'texts': len(texts), 'pages': len(pages)},
+            'rounds': args.rounds,
+        },
+        'results': results,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+        print(f"[INFO] Report written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"[REGRESSION] {line}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
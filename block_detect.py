@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Access-denied / bot-block page detection used by the scrapers
+"""
+
+BLOCKED_KEYWORDS = [
+    'access denied', 'blocked', 'cloudflare', 
+    'checking your browser', 'please wait', 
+    'verify you are human', 'challenge',
+    'temporarily unavailable', 'bot detected',
+    'rate limited', '403 forbidden', 'forbidden',
+    'unauthorized access', 'permission denied'
+]
+
+def is_access_denied(page_source, page_text):
+    """Check if page shows access denied or blocking message"""
+    if not page_source and not page_text:
+        return True
+    
+    combined_text = (page_source or '').lower() + ' ' + (page_text or '').lower()
+    
+    # Check for keywords
+    for keyword in BLOCKED_KEYWORDS:
+        if keyword in combined_text:
+            return True
+    
+    # Also check if page is too short and contains common blocking indicators
+    if len(combined_text) < 200:
+        if any(indicator in combined_text for indicator in ['cloudflare', 'checking', 'wait']):
+            return True
+    
+    return False
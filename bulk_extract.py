@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Bulk ratings/reviews extraction over stored page texts
+Streams a JSONL or CSV file, runs extract_rating_reviews (extract_simple.py)
+over a process pool in chunks and writes results as it goes.
+
+Usage:
+    python bulk_extract.py pages.jsonl results.jsonl --text-field text --id-field id
+    python bulk_extract.py pages.csv results.jsonl --workers 8 --chunk-size 2000
+    python bulk_extract.py pages.jsonl results.jsonl --resume
+"""
+
+import os
+import io
+import csv
+import json
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from extract_simple import extract_rating_reviews
+
+REPORT_EVERY = 5.0  # seconds between progress lines
+OUTPUT_FIELDS = ['id', 'rating', 'rating_count', 'review_count']
+
+
+def read_records(path, text_field, id_field):
+    """Yield (id, text) from a JSONL or CSV file without loading it into memory"""
+    if path.lower().endswith('.csv'):
+        csv.field_size_limit(2 ** 31 - 1)  # page texts are far above the 128 KB default
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            for row_number, row in enumerate(csv.DictReader(f)):
+                yield row.get(id_field) or row_number, row.get(text_field) or ''
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            row_number = 0
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                yield record.get(id_field, row_number), record.get(text_field) or ''
+                row_number += 1
+
+
+def read_chunks(records, chunk_size):
+    """Group records into (chunk_index, [records]) lists"""
+    chunk = []
+    chunk_index = 0
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield chunk_index, chunk
+            chunk = []
+            chunk_index += 1
+    if chunk:
+        yield chunk_index, chunk
+
+
+def process_chunk(chunk):
+    """Worker: run the regex extractor over one chunk of (id, text) records"""
+    results = []
+    for record_id, text in chunk:
+        results.append({'id': record_id, **extract_rating_reviews(text, verbose=False)})
+    return results
+
+
+def format_results(results, output_format):
+    """Serialize a chunk of results to bytes for the output file"""
+    if output_format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=OUTPUT_FIELDS, lineterminator='\n')
+        writer.writerows(results)
+        return buffer.getvalue().encode('utf-8')
+    return ''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in results).encode('utf-8')
+
+
+class Checkpoint:
+    """Tracks finished chunks and the output size that goes with them
+
+    done_through: every chunk below this index is written
+    done_extra:   chunks above done_through written out of order (unordered mode)
+    """
+
+    def __init__(self, path, chunk_size):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.done_through = 0
+        self.done_extra = set()
+        self.output_bytes = 0
+        self.records = 0
+
+    def load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data['chunk_size'] != self.chunk_size:
+            raise ValueError(f"Checkpoint was written with --chunk-size {data['chunk_size']}, got {self.chunk_size}")
+        self.done_through = data['done_through']
+        self.done_extra = set(data['done_extra'])
+        self.output_bytes = data['output_bytes']
+        self.records = data['records']
+
+    def is_done(self, chunk_index):
+        return chunk_index < self.done_through or chunk_index in self.done_extra
+
+    def mark_done(self, chunk_index, n_records, output_bytes):
+        self.done_extra.add(chunk_index)
+        while self.done_through in self.done_extra:
+            self.done_extra.remove(self.done_through)
+            self.done_through += 1
+        self.records += n_records
+        self.output_bytes = output_bytes
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'chunk_size': self.chunk_size,
+                'done_through': self.done_through,
+                'done_extra': sorted(self.done_extra),
+                'output_bytes': self.output_bytes,
+                'records': self.records,
+            }, f)
+        os.replace(tmp_path, self.path)
+
+
+def run(args):
+    output_format = 'csv' if args.output.lower().endswith('.csv') else 'jsonl'
+    checkpoint = Checkpoint(args.checkpoint or args.output + '.ckpt', args.chunk_size)
+
+    if args.resume and os.path.exists(checkpoint.path):
+        checkpoint.load()
+        # truncate() would pad a missing or short output with NUL bytes in place of the checkpointed records
+        output_size = os.path.getsize(args.output) if os.path.exists(args.output) else None
+        if output_size is None or output_size < checkpoint.output_bytes:
+            raise ValueError(f"Checkpoint covers {checkpoint.output_bytes} bytes of {args.output}, but the file "
+                             f"{'is missing' if output_size is None else f'has {output_size}'}; "
+                             f"run without --resume to start over")
+        print(f"[INFO] Resuming after {checkpoint.records} records ({checkpoint.done_through} chunks)")
+        out = open(args.output, 'r+b')
+        out.truncate(checkpoint.output_bytes)  # drop anything written after the last checkpoint
+        out.seek(checkpoint.output_bytes)
+    else:
+        out = open(args.output, 'wb')
+        if output_format == 'csv':
+            out.write((','.join(OUTPUT_FIELDS) + '\n').encode('utf-8'))
+        checkpoint.output_bytes = out.tell()
+
+    chunks = (c for c in read_chunks(read_records(args.input, args.text_field, args.id_field), args.chunk_size)
+              if not checkpoint.is_done(c[0]))
+
+    start = time.time()
+    last_report = start
+    processed = 0
+    max_in_flight = args.workers * 2  # bounded so the reader does not run ahead of the pool
+
+    def write_done(chunk_index, future):
+        nonlocal processed, last_report
+        results = future.result()
+        out.write(format_results(results, output_format))
+        out.flush()
+        checkpoint.mark_done(chunk_index, len(results), out.tell())
+        checkpoint.save()
+        processed += len(results)
+
+        now = time.time()
+        if now - last_report >= REPORT_EVERY:
+            print(f"[INFO] {checkpoint.records} records done, {processed / (now - start):.0f} records/s")
+            last_report = now
+
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            in_flight = deque()
+            for chunk_index, chunk in chunks:
+                in_flight.append((chunk_index, executor.submit(process_chunk, chunk)))
+                while len(in_flight) >= max_in_flight:
+                    if args.unordered:
+                        done, _ = wait([f for _, f in in_flight], return_when=FIRST_COMPLETED)
+                        for item in [i for i in in_flight if i[1] in done]:
+                            in_flight.remove(item)
+                            write_done(*item)
+                    else:
+                        write_done(*in_flight.popleft())
+            while in_flight:
+                write_done(*in_flight.popleft())
+    finally:
+        out.close()
+
+    elapsed = time.time() - start
+    print("=" * 80)
+    print(f"Processed {processed} records in {elapsed:.1f}s ({processed / elapsed if elapsed else 0:.0f} records/s)")
+    print(f"Total records in output: {checkpoint.records}")
+    print(f"Output: {args.output}")
+    print("=" * 80)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk rating/review extraction over JSONL or CSV page texts")
+    parser.add_argument('input', help="input .jsonl or .csv file")
+    parser.add_argument('output', help="output .jsonl or .csv file")
+    parser.add_argument('--text-field', default='text', help="field holding the page text (default: text)")
+    parser.add_argument('--id-field', default='id', help="field holding the record id (default: id, falls back to row number)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="worker processes (default: CPU count)")
+    parser.add_argument('--chunk-size', type=int, default=1000, help="records per task (default: 1000)")
+    parser.add_argument('--unordered', action='store_true', help="write chunks as they finish instead of in input order")
+    parser.add_argument('--checkpoint', help="checkpoint file (default: <output>.ckpt)")
+    parser.add_argument('--resume', action='store_true', help="continue from the last checkpoint")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    run(parse_args())
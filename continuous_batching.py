@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Continuous batching decode loop with a block-allocated (paged) KV cache
+Sequences join the running batch as soon as there is room and leave it the
+step they finish, so a long attribute generation does not hold short
+reviews queries until it is done (static batching waits for the longest).
+
+KV memory is a fixed pool of blocks of BLOCK_SIZE tokens. Each sequence
+owns a list of blocks that grows as it decodes and goes back to the pool
+when it finishes. If the pool runs out mid-decode the most recently
+admitted sequence is preempted: its blocks are freed and it is re-queued
+with its tokens so far, to be prefilled again when blocks are free.
+
+Decoding runs on a left-padded working cache for the active batch. While
+the batch membership stays the same it is the cache the previous forward
+pass returned, so a step only appends the new token's keys/values, as in
+generate(). When a sequence joins, finishes or is preempted the working
+cache is rebuilt from the blocks, which copies every active sequence's
+history once (layers x batch x context). The new token's keys/values are
+also written to the blocks every step, so the KV data is held twice while a
+batch is running. Decoding is greedy, like generate() in inference.py;
+bench_continuous_batching.py compares it with static batching.
+
+The pool size is CB_NUM_BLOCKS if set. Otherwise it is CB_KV_MEMORY_FRACTION
+of the free GPU memory when the batcher is created, divided by the bytes of
+one block (2 x layers x kv_heads x BLOCK_SIZE x head_dim x dtype size), or
+CPU_NUM_BLOCKS on CPU.
+
+Usage:
+    batcher = ContinuousBatcher(model, tokenizer)
+    text = batcher.submit(prompt, max_new_tokens=128)     # from any thread; the generated text
+    token_lists = batcher.generate_all([ids1, ids2], 128)  # synchronous, no thread
+"""
+
+import os
+import time
+import queue
+import threading
+from collections import deque
+
+import torch
+from transformers import DynamicCache
+
+from inference_stats import FirstTokenTimer
+
+MAX_BATCH_SIZE = int(os.environ.get("CB_MAX_BATCH_SIZE", "16"))
+BLOCK_SIZE = int(os.environ.get("CB_BLOCK_SIZE", "16"))  # tokens per KV block
+NUM_BLOCKS = int(os.environ["CB_NUM_BLOCKS"]) if os.environ.get("CB_NUM_BLOCKS") else None  # None: sized from free memory
+KV_MEMORY_FRACTION = float(os.environ.get("CB_KV_MEMORY_FRACTION", "0.5"))  # of free GPU memory
+CPU_NUM_BLOCKS = 256
+MAX_PREFILLS_PER_STEP = 4  # new sequences admitted between two decode steps
+
+
+def kv_block_bytes(config, dtype, block_size=BLOCK_SIZE):
+    """Bytes of one KV block (keys and values, all layers) for a model config"""
+    kv_heads = getattr(config, 'num_key_value_heads', None) or config.num_attention_heads
+    head_dim = getattr(config, 'head_dim', None) or config.hidden_size // config.num_attention_heads
+    element_size = torch.empty((), dtype=dtype).element_size()
+    return 2 * config.num_hidden_layers * kv_heads * block_size * head_dim * element_size
+
+
+def default_num_blocks(model, block_size=BLOCK_SIZE, fraction=KV_MEMORY_FRACTION):
+    """CB_NUM_BLOCKS, else a fraction of free GPU memory in blocks (CPU_NUM_BLOCKS on CPU)"""
+    if NUM_BLOCKS is not None:
+        return NUM_BLOCKS
+    block_bytes = kv_block_bytes(model.config, model.dtype, block_size)
+    if model.device.type == 'cuda':
+        free, _ = torch.cuda.mem_get_info(model.device)
+        num_blocks = max(1, int(free * fraction) // block_bytes)
+    else:
+        num_blocks = CPU_NUM_BLOCKS
+    print(f"[INFO] Continuous batching KV pool: {num_blocks} blocks of {block_size} tokens "
+          f"({num_blocks * block_bytes / (1024 * 1024):.0f} MB)")
+    return num_blocks
+
+
+class BlockAllocator:
+    """Free list over a fixed number of KV blocks"""
+
+    def __init__(self, num_blocks):
+        self.num_blocks = num_blocks
+        self._free = deque(range(num_blocks))
+
+    @property
+    def free_blocks(self):
+        return len(self._free)
+
+    def allocate(self, n):
+        if n > len(self._free):
+            raise MemoryError(f"Need {n} KV blocks, {len(self._free)} free")
+        return [self._free.popleft() for _ in range(n)]
+
+    def free(self, blocks):
+        self._free.extend(blocks)
+
+
+class Sequence:
+    """One request moving through the decode loop"""
+
+    def __init__(self, prompt_ids, max_new_tokens, stats_kind=None):
+        self.prompt_ids = list(prompt_ids)
+        self.generated = []
+        self.max_new_tokens = max_new_tokens
+        self.blocks = []
+        self.cached = 0  # tokens whose keys/values are in the blocks
+        self.stats_kind = stats_kind
+        self.timer = FirstTokenTimer()
+        self.timer.start_time = time.perf_counter()
+        self.timer.device = None
+        self.done = threading.Event()
+        self.error = None
+
+    @property
+    def tokens(self):
+        return self.prompt_ids + self.generated
+
+
+def _layer_kv(cache, layer):
+    """(keys, values) of one layer for the cache formats transformers has used"""
+    if hasattr(cache, 'layers'):
+        return cache.layers[layer].keys, cache.layers[layer].values
+    if hasattr(cache, 'key_cache'):
+        return cache.key_cache[layer], cache.value_cache[layer]
+    return cache[layer][0], cache[layer][1]
+
+
+class PagedKVCache:
+    """Keys/values for all layers stored in fixed-size blocks
+
+    Pool layout: [layers, blocks, kv_heads, block_size, head_dim]. Created on
+    the first prefill so the shapes come from the model's own cache.
+    """
+
+    def __init__(self, num_blocks, block_size=BLOCK_SIZE):
+        self.block_size = block_size
+        self.allocator = BlockAllocator(num_blocks)
+        self.keys = None
+        self.values = None
+
+    def blocks_for(self, n_tokens):
+        return -(-n_tokens // self.block_size)
+
+    def _ensure_pool(self, keys):
+        if self.keys is None:
+            layers, (_, heads, _, head_dim) = len(keys), keys[0].shape
+            shape = (layers, self.allocator.num_blocks, heads, self.block_size, head_dim)
+            self.keys = torch.zeros(shape, dtype=keys[0].dtype, device=keys[0].device)
+            self.values = torch.zeros_like(self.keys)
+
+    def write_prefill(self, seq, cache, n_layers, n_tokens):
+        """Copy a batch-1 prefill cache into the sequence's blocks"""
+        kvs = [_layer_kv(cache, layer) for layer in range(n_layers)]
+        self._ensure_pool([k for k, _ in kvs])
+        padded = len(seq.blocks) * self.block_size
+        for layer, (k, v) in enumerate(kvs):
+            for target, source in ((self.keys, k), (self.values, v)):
+                # [1, heads, n, dim] -> [blocks, heads, block_size, dim]
+                chunk = source[0, :, :n_tokens]
+                if n_tokens < padded:
+                    chunk = torch.nn.functional.pad(chunk, (0, 0, 0, padded - n_tokens))
+                chunk = chunk.reshape(chunk.shape[0], len(seq.blocks), self.block_size, -1).transpose(0, 1)
+                target[layer, seq.blocks] = chunk
+        seq.cached = n_tokens
+
+    def gather(self, seqs):
+        """Left-padded DynamicCache and attention mask (incl. the next token) for a decode step"""
+        longest = max(s.cached for s in seqs)
+        layers, _, heads, _, head_dim = self.keys.shape
+        batch_k = self.keys.new_zeros((layers, len(seqs), heads, longest, head_dim))
+        batch_v = torch.zeros_like(batch_k)
+        mask = torch.zeros((len(seqs), longest + 1), dtype=torch.long, device=self.keys.device)
+        for i, seq in enumerate(seqs):
+            for target, pool in ((batch_k, self.keys), (batch_v, self.values)):
+                blocks = pool[:, seq.blocks].permute(0, 2, 1, 3, 4).reshape(layers, heads, -1, head_dim)
+                target[:, i, :, longest - seq.cached:] = blocks[:, :, :seq.cached]
+            mask[i, longest - seq.cached:] = 1
+        cache = DynamicCache()
+        for layer in range(layers):
+            cache.update(batch_k[layer], batch_v[layer], layer)
+        return cache, mask, longest
+
+    def write_step(self, seqs, cache, position):
+        """Write the keys/values of the token just decoded (cache index `position`) into the blocks"""
+        block_ids = torch.tensor([s.blocks[s.cached // self.block_size] for s in seqs], device=self.keys.device)
+        offsets = torch.tensor([s.cached % self.block_size for s in seqs], device=self.keys.device)
+        for layer in range(self.keys.shape[0]):
+            k, v = _layer_kv(cache, layer)
+            self.keys[layer, block_ids, :, offsets] = k[:, :, position]
+            self.values[layer, block_ids, :, offsets] = v[:, :, position]
+        for seq in seqs:
+            seq.cached += 1
+
+
+class ContinuousBatcher:
+    """Greedy continuous-batching decode loop over one model"""
+
+    def __init__(self, model, tokenizer, max_batch_size=MAX_BATCH_SIZE, num_blocks=None,
+                 block_size=BLOCK_SIZE, stats=None):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.eos_token_id = tokenizer.eos_token_id
+        self.max_batch_size = max_batch_size
+        if num_blocks is None:
+            num_blocks = default_num_blocks(model, block_size)
+        self.kv = PagedKVCache(num_blocks, block_size)
+        self.n_layers = model.config.num_hidden_layers
+        self.stats = stats
+        self.waiting = deque()
+        self.active = []
+        self.preemptions = 0
+        self.decode_steps = 0
+        self.gathers = 0  # working cache rebuilt from the blocks (batch membership changed)
+        self._working = None  # (seqs, cache, mask) of the last decode step
+        self._incoming = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    # -- public API --
+
+    def submit(self, prompt, max_new_tokens=128, kind=None):
+        """Generate for one prompt and return the decoded continuation; blocks the calling thread, safe to call concurrently"""
+        prompt_ids = self.tokenizer(prompt)['input_ids']
+        seq = Sequence(prompt_ids, max_new_tokens, kind)
+        seq.timer.device = self.model.device
+        self._start_worker()
+        self._incoming.put(seq)
+        seq.done.wait()
+        if seq.error is not None:
+            raise seq.error
+        return self.tokenizer.decode(seq.generated, skip_special_tokens=True)
+
+    def generate_all(self, prompt_id_lists, max_new_tokens=128):
+        """Run a list of prompts to completion in the calling thread; returns generated ids per prompt
+
+        Raises the error of a sequence that could not finish (MemoryError when
+        it outgrows the whole block pool) instead of returning its partial tokens.
+        """
+        seqs = [Sequence(ids, max_new_tokens) for ids in prompt_id_lists]
+        self.waiting.extend(seqs)
+        while self.waiting or self.active:
+            self.step()
+        for seq in seqs:
+            if seq.error is not None:
+                raise seq.error
+        return [s.generated for s in seqs]
+
+    # -- scheduling --
+
+    def _start_worker(self):
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="continuous-batcher", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            if not self.waiting and not self.active:
+                self.waiting.append(self._incoming.get())
+            while True:
+                try:
+                    self.waiting.append(self._incoming.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.step()
+            except Exception as e:
+                print(f"[ERROR] Continuous batching step failed: {e}")
+                for seq in self.active + list(self.waiting):
+                    self._retire(seq, error=e)
+                self.active = []
+                self.waiting.clear()
+                self._working = None
+
+    def step(self):
+        """Admit waiting sequences (prefill), then decode one token for every active sequence"""
+        self._admit()
+        if self.active:
+            self._decode()
+
+    def _admit(self):
+        admitted = 0
+        while self.waiting and len(self.active) < self.max_batch_size and admitted < MAX_PREFILLS_PER_STEP:
+            seq = self.waiting[0]
+            # Prompt blocks plus room for the next token
+            needed = self.kv.blocks_for(len(seq.tokens) + 1)
+            if needed > self.kv.allocator.num_blocks:
+                self.waiting.popleft()
+                self._retire(seq, error=MemoryError(f"Sequence needs {needed} KV blocks, pool has {self.kv.allocator.num_blocks}"))
+                continue
+            if needed > self.kv.allocator.free_blocks:
+                break
+            self.waiting.popleft()
+            seq.blocks = self.kv.allocator.allocate(needed)
+            self._prefill(seq)
+            admitted += 1
+
+    def _prefill(self, seq):
+        tokens = seq.tokens
+        input_ids = torch.tensor([tokens], device=self.model.device)
+        with torch.no_grad():
+            out = self.model(input_ids=input_ids, use_cache=True)
+        self.kv.write_prefill(seq, out.past_key_values, self.n_layers, len(tokens))
+        if seq.timer.first_token_time is None:
+            seq.timer.first_token_time = time.perf_counter()
+        self._append(seq, int(out.logits[0, -1].argmax()))
+        if not seq.done.is_set():
+            self.active.append(seq)
+
+    def _decode(self):
+        # Every sequence needs a slot for the token it is about to feed in
+        for seq in list(self.active):
+            while seq in self.active and seq.cached >= len(seq.blocks) * self.kv.block_size:
+                if self.kv.allocator.free_blocks:
+                    seq.blocks += self.kv.allocator.allocate(1)
+                else:
+                    self._preempt()
+        if not self.active:
+            self._working = None
+            return
+
+        seqs = list(self.active)
+        if self._working is not None and self._working[0] == seqs:
+            # Same batch as the last step: its output cache already holds every
+            # token but the one fed in now
+            _, cache, mask = self._working
+            mask = torch.cat([mask, mask.new_ones((len(seqs), 1))], dim=1)
+        else:
+            self._working = None  # let the old batch's cache go before building the new one
+            cache, mask, _ = self.kv.gather(seqs)
+            self.gathers += 1
+        position = mask.shape[1] - 1
+        input_ids = torch.tensor([[s.generated[-1]] for s in seqs], device=self.model.device)
+        position_ids = torch.tensor([[s.cached] for s in seqs], device=self.model.device)
+        with torch.no_grad():
+            out = self.model(input_ids=input_ids, attention_mask=mask, position_ids=position_ids,
+                             past_key_values=cache, use_cache=True)
+        self.kv.write_step(seqs, out.past_key_values, position)
+        self._working = (seqs, out.past_key_values, mask)
+        self.decode_steps += 1
+        next_tokens = out.logits[:, -1].argmax(dim=-1).tolist()
+        for seq, token in zip(seqs, next_tokens):
+            self._append(seq, token)
+
+    def _preempt(self):
+        """Free the most recently admitted sequence's blocks and re-queue it for a later prefill"""
+        victim = self.active.pop()
+        self.preemptions += 1
+        self.kv.allocator.free(victim.blocks)
+        victim.blocks = []
+        victim.cached = 0
+        self.waiting.appendleft(victim)
+
+    def _append(self, seq, token):
+        seq.generated.append(token)
+        if token == self.eos_token_id or len(seq.generated) >= seq.max_new_tokens:
+            self._retire(seq)
+
+    def _retire(self, seq, error=None):
+        if seq in self.active:
+            self.active.remove(seq)
+        self.kv.allocator.free(seq.blocks)
+        seq.blocks = []
+        seq.error = error
+        if self.stats is not None and seq.stats_kind and error is None:
+            self.stats.finish(seq.timer, seq.stats_kind, len(seq.prompt_ids), len(seq.generated))
+        seq.done.set()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Distill the reviews/ratings extractor into a small seq2seq student
+1. label: a teacher (the regex extractor or the LoRA reviews model) labels a
+   corpus of inputs, written in the training-data schema
+2. train: a small encoder-decoder (t5-small by default) learns input -> JSON
+
+The student is served by student_model.py (REVIEWS_BACKEND=student).
+
+Usage:
+    python distill.py label "data/synthetic/train-*.jsonl" data/distill/train.jsonl --teacher regex
+    python distill.py label data/inputs.jsonl data/distill/train.jsonl --teacher llm --batch-size 16
+    python distill.py train data/distill/train.jsonl --val "data/synthetic/val-*.jsonl" --student t5-small
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+
+from student_model import STUDENT_DIR, STUDENT_MAX_INPUT, STUDENT_MAX_OUTPUT
+
+REPORT_EVERY = 5.0  # seconds between progress lines
+
+
+def read_inputs(pattern, text_field):
+    """Yield input texts from JSONL files (one record per line)"""
+    for path in sorted(glob.glob(pattern)):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line).get(text_field) or ''
+
+
+def build_teacher(name):
+    """Return a function: list of texts -> list of output dicts (None where the teacher failed)"""
+    if name == 'regex':
+        from extract_simple import extract_rating_reviews
+
+        def regex_teacher(texts):
+            results = []
+            for text in texts:
+                found = extract_rating_reviews(text, verbose=False)
+                results.append({'Rating': found['rating'], 'Rating_Count': found['rating_count'],
+                                'Review_Count': found['review_count']})
+            return results
+        return regex_teacher
+
+    if name == 'llm':
+        from inference import generate_reviews_json_batch
+        return lambda texts: [r.get('json') for r in generate_reviews_json_batch(texts)]
+
+    raise ValueError(f"Unknown teacher: {name}")
+
+
+def label(args):
+    from prompts import REVIEWS_INSTRUCTION
+    teacher = build_teacher(args.teacher)
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+
+    written = skipped = 0
+    start = last_report = time.time()
+    batch = []
+    with open(args.output, 'w', encoding='utf-8') as out:
+        def flush():
+            nonlocal written, skipped
+            for text, result in zip(batch, teacher(batch)):
+                if not isinstance(result, dict):
+                    skipped += 1
+                    continue
+                out.write(json.dumps({'instruction': REVIEWS_INSTRUCTION, 'input': text,
+                                      'output': json.dumps(result, ensure_ascii=False)}, ensure_ascii=False) + '\n')
+                written += 1
+            batch.clear()
+
+        for text in read_inputs(args.inputs, args.text_field):
+            batch.append(text)
+            if len(batch) >= args.batch_size:
+                flush()
+                if time.time() - last_report >= REPORT_EVERY:
+                    last_report = time.time()
+                    print(f"[INFO] {written:,} labeled ({written / (last_report - start):,.0f}/s)")
+            if args.limit and written + skipped + len(batch) >= args.limit:
+                break
+        if batch:
+            flush()
+    print(f"[OK] {written:,} examples labeled by {args.teacher} -> {args.output} "
+          f"({skipped} skipped, {time.time() - start:.1f}s)")
+
+
+def add_missing_characters(tokenizer, texts):
+    """Add tokens for characters the tokenizer maps to <unk> (t5-small has no '{', '}' or '★')"""
+    if tokenizer.unk_token_id is None:
+        return []
+    chars = sorted(set(''.join(texts)) - set(' \n\t'))
+    missing = [c for c in chars if tokenizer.unk_token_id in tokenizer(c, add_special_tokens=False)['input_ids']]
+    tokenizer.add_tokens(missing)
+    return missing
+
+
+def train(args):
+    import torch
+    from datasets import load_dataset
+    from transformers import (AutoTokenizer, AutoConfig, AutoModelForSeq2SeqLM, DataCollatorForSeq2Seq,
+                              Seq2SeqTrainer, Seq2SeqTrainingArguments)
+
+    tokenizer = AutoTokenizer.from_pretrained(args.student)
+    if args.from_scratch:
+        # Architecture only: useful for a very small student or when no pretrained weights are available
+        model = AutoModelForSeq2SeqLM.from_config(AutoConfig.from_pretrained(args.student))
+    else:
+        model = AutoModelForSeq2SeqLM.from_pretrained(args.student)
+    if tokenizer.pad_token is None:
+        tokenizer.add_special_tokens({'pad_token': '<pad>'})
+        model.resize_token_embeddings(len(tokenizer))
+        model.config.pad_token_id = tokenizer.pad_token_id
+    if model.config.decoder_start_token_id is None:
+        model.config.decoder_start_token_id = tokenizer.pad_token_id
+
+    data_files = {'train': sorted(glob.glob(args.train))}
+    if args.val:
+        data_files['validation'] = sorted(glob.glob(args.val))
+    dataset = load_dataset('json', data_files=data_files)
+
+    sample = dataset['train'].select(range(min(5000, len(dataset['train']))))
+    missing = add_missing_characters(tokenizer, list(sample['output']) + list(sample['input']))
+    if missing:
+        print(f"[INFO] Added {len(missing)} characters missing from the student vocabulary: {''.join(missing)}")
+        model.resize_token_embeddings(len(tokenizer))
+
+    def format_example(ex):
+        # The student only ever does this one task, so it sees the input without the instruction
+        tokenized = tokenizer(ex['input'], truncation=True, max_length=STUDENT_MAX_INPUT)
+        labels = tokenizer(text_target=ex['output'], truncation=True, max_length=STUDENT_MAX_OUTPUT)['input_ids']
+        if labels[-1] != tokenizer.eos_token_id:
+            labels.append(tokenizer.eos_token_id)  # the student must learn to stop
+        tokenized['labels'] = labels
+        return tokenized
+
+    tokenized = dataset.map(format_example, remove_columns=dataset['train'].column_names)
+    print(f"[INFO] Student {args.student}: {sum(p.numel() for p in model.parameters()) / 1e6:.1f}M parameters, "
+          f"{len(tokenized['train']):,} training examples")
+
+    training_args = Seq2SeqTrainingArguments(
+        output_dir=args.output,
+        per_device_train_batch_size=args.batch_size,
+        per_device_eval_batch_size=args.batch_size,
+        num_train_epochs=args.epochs,
+        learning_rate=args.lr,
+        eval_strategy='epoch' if args.val else 'no',
+        save_strategy='epoch',
+        save_total_limit=2,
+        logging_steps=50,
+        lr_scheduler_type='linear',
+        bf16=torch.cuda.is_available() and torch.cuda.is_bf16_supported(),
+        report_to='none',
+        seed=42,
+    )
+    trainer = Seq2SeqTrainer(
+        model=model,
+        args=training_args,
+        train_dataset=tokenized['train'],
+        eval_dataset=tokenized.get('validation'),
+        data_collator=DataCollatorForSeq2Seq(tokenizer, model=model),
+        processing_class=tokenizer,  # saved with every checkpoint, so each one can be served
+    )
+    trainer.train()
+    trainer.save_model(args.output)
+    print(f"[OK] Student saved to {args.output} - serve it with REVIEWS_BACKEND=student STUDENT_DIR={args.output}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Distill the reviews/ratings extractor into a small student model")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    lab = sub.add_parser('label', help="label a corpus with a teacher")
+    lab.add_argument('inputs', help="JSONL file or glob with the input texts")
+    lab.add_argument('output', help="labeled JSONL (training-data schema)")
+    lab.add_argument('--teacher', choices=['regex', 'llm'], default='regex')
+    lab.add_argument('--text-field', default='input')
+    lab.add_argument('--batch-size', type=int, default=64)
+    lab.add_argument('--limit', type=int, help="label at most N inputs")
+
+    tr = sub.add_parser('train', help="train the student on labeled data")
+    tr.add_argument('train', help="labeled JSONL file or glob")
+    tr.add_argument('--val', help="validation JSONL file or glob")
+    tr.add_argument('--student', default='t5-small', help="seq2seq model name or path (default: t5-small)")
+    tr.add_argument('--from-scratch', action='store_true', help="use only the student's config, not its weights")
+    tr.add_argument('--output', default=STUDENT_DIR)
+    tr.add_argument('--epochs', type=float, default=3)
+    tr.add_argument('--batch-size', type=int, default=32)
+    tr.add_argument('--lr', type=float, default=5e-4)
+
+    args = parser.parse_args(argv)
+    if args.command == 'label':
+        label(args)
+    else:
+        train(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Accuracy + throughput evaluation of the reviews/ratings extractors
+Runs each extractor over a JSONL gold set (the instruction/input/output schema
+of data/reviews_ratings_*.jsonl) in batches and reports, in one run, exact
+match per field and for all fields together, records per second and
+p50/p95/p99 batch latency as JSON.
+
+Usage:
+    python evaluate_extractors.py                                           # regex extractors on the val set
+    python evaluate_extractors.py --gold "data/synthetic/val-*.jsonl" --extractors regex,llm,hybrid --batch-size 16
+    python evaluate_extractors.py --min-accuracy 0.98 --output eval.json   # also picks the fastest that qualifies
+"""
+
+import sys
+import glob
+import json
+import time
+import argparse
+
+from perf_utils import percentile, peak_rss_mb
+
+GOLD_FILE = "data/reviews_ratings_val.jsonl"
+FIELDS = ['Rating', 'Rating_Count', 'Review_Count']
+DEFAULT_EXTRACTORS = ['regex', 'regex_pandas']
+ALL_EXTRACTORS = DEFAULT_EXTRACTORS + ['llm', 'hybrid', 'student', 'onnx']
+
+
+def load_gold(pattern, limit=None):
+    """(input text, expected output dict) for every record in the matching JSONL files"""
+    records = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                expected = record['output']
+                records.append((record['input'], json.loads(expected) if isinstance(expected, str) else expected))
+                if limit and len(records) >= limit:
+                    return records
+    return records
+
+
+def _from_regex(found):
+    return {'Rating': found['rating'], 'Rating_Count': found['rating_count'], 'Review_Count': found['review_count']}
+
+
+def build_extractor(name):
+    """Return a function: list of texts -> list of {Rating, Rating_Count, Review_Count} (None on failure)"""
+    if name == 'regex':
+        from extract_simple import extract_rating_reviews
+        return lambda texts: [_from_regex(extract_rating_reviews(t, verbose=False)) for t in texts]
+
+    if name == 'regex_pandas':
+        import pandas as pd
+        from pandas_extract import extract_rating_reviews_series
+        return lambda texts: [_from_regex(row) for row in
+                              extract_rating_reviews_series(pd.Series(texts)).to_dict('records')]
+
+    if name == 'llm':
+        from inference import generate_reviews_json_batch
+        return lambda texts: [r.get('json') for r in generate_reviews_json_batch(texts)]
+
+    if name == 'hybrid':
+        # app_hybrid.py: the model's answer, the regex result when the model fails
+        from inference import generate_reviews_json_batch
+        from extract_simple import extract_rating_reviews
+        return lambda texts: [r['json'] if 'json' in r else _from_regex(extract_rating_reviews(t, verbose=False))
+                              for t, r in zip(texts, generate_reviews_json_batch(texts))]
+
+    if name == 'student':
+        from student_model import generate_student_json_batch
+        return lambda texts: [r.get('json') for r in generate_student_json_batch(texts)]
+
+    if name == 'onnx':
+        from onnx_backend import generate_onnx_json_batch
+        return lambda texts: [r.get('json') for r in generate_onnx_json_batch(texts)]
+
+    raise ValueError(f"Unknown extractor: {name}")
+
+
+def score(predictions, records):
+    """Exact match per field and for all fields, plus how many predictions failed outright"""
+    correct = {field: 0 for field in FIELDS}
+    all_correct = failed = 0
+    for predicted, (_, expected) in zip(predictions, records):
+        if not isinstance(predicted, dict):
+            failed += 1
+            continue
+        matches = [predicted.get(field) == expected.get(field) for field in FIELDS]
+        for field, match in zip(FIELDS, matches):
+            correct[field] += match
+        all_correct += all(matches)
+    n = len(records)
+    return {
+        'exact_match': {field: round(correct[field] / n, 4) for field in FIELDS},
+        'all_fields': round(all_correct / n, 4),
+        'failed': failed,
+    }
+
+
+def evaluate(name, records, batch_size, warmup=1):
+    """Run one extractor over the gold records, return its accuracy and timing"""
+    extract = build_extractor(name)
+    texts = [text for text, _ in records]
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+
+    for batch in batches[:warmup]:  # model loading, regex compilation
+        extract(batch)
+
+    predictions, latencies = [], []
+    start = time.perf_counter()
+    for batch in batches:
+        t0 = time.perf_counter()
+        predictions += extract(batch)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    total_s = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        **score(predictions, records),
+        'records': len(records),
+        'batch_size': batch_size,
+        'total_s': round(total_s, 4),
+        'records_per_s': round(len(records) / total_s, 2) if total_s else None,
+        'batch_latency_ms': {
+            'p50': round(percentile(latencies, 50), 4),
+            'p95': round(percentile(latencies, 95), 4),
+            'p99': round(percentile(latencies, 99), 4),
+        },
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def fastest_qualifying(results, min_accuracy):
+    """Name of the highest-throughput extractor with all_fields >= min_accuracy, or None"""
+    qualifying = [(r['records_per_s'], name) for name, r in results.items()
+                  if 'error' not in r and r['all_fields'] >= min_accuracy]
+    return max(qualifying)[1] if qualifying else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate extractor accuracy and throughput on a gold set")
+    parser.add_argument('--gold', default=GOLD_FILE, help=f"JSONL file or glob (default: {GOLD_FILE})")
+    parser.add_argument('--extractors', default=','.join(DEFAULT_EXTRACTORS),
+                        help=f"comma-separated extractors from: {', '.join(ALL_EXTRACTORS)}")
+    parser.add_argument('--batch-size', type=int, default=32, help="records per extractor call (default: 32)")
+    parser.add_argument('--limit', type=int, help="evaluate only the first N gold records")
+    parser.add_argument('--min-accuracy', type=float, help="all-fields exact match needed to recommend an extractor")
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    records = load_gold(args.gold, args.limit)
+    if not records:
+        print(f"ERROR: No gold records in {args.gold}", file=sys.stderr)
+        return 1
+
+    results = {}
+    for name in [e.strip() for e in args.extractors.split(',') if e.strip()]:
+        print(f"[INFO] Evaluating {name} on {len(records)} records...", file=sys.stderr)
+        try:
+            results[name] = evaluate(name, records, args.batch_size)
+        except Exception as e:
+            results[name] = {'error': f"{type(e).__name__}: {e}"}
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'gold': args.gold,
+            'records': len(records),
+        },
+        'results': results,
+    }
+    if args.min_accuracy is not None:
+        report['recommended'] = fastest_qualifying(results, args.min_accuracy)
+        report['meta']['min_accuracy'] = args.min_accuracy
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+        print(f"[INFO] Report written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+    for name, r in results.items():
+        if 'error' in r:
+            print(f"[ERROR] {name}: {r['error']}", file=sys.stderr)
+        else:
+            print(f"[RESULT] {name:<14} all fields {r['all_fields']:.2%}  {r['records_per_s']:>12,.1f} records/s  "
+                  f"p95 {r['batch_latency_ms']['p95']:.2f} ms/batch", file=sys.stderr)
+    if args.min_accuracy is not None:
+        print(f"[RESULT] Fastest with >= {args.min_accuracy:.0%}: {report['recommended'] or 'none'}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
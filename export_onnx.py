@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Export the reviews/ratings extractor to ONNX for CPU serving (onnx_backend.py)
+Sources:
+  reviews     the base model with the reviews LoRA adapter merged into its
+              weights (paths from the model registry when one exists)
+  <path>      any local causal LM or seq2seq checkpoint, e.g. the distilled
+              student (distill.py)
+
+A causal LM becomes model.onnx; a seq2seq model becomes encoder.onnx (the
+encoder and the first decoder step) and decoder.onnx. Each decoder graph
+takes the key/value cache of the previous steps as inputs
+(past_key_<i>/past_value_<i>, empty for the prompt of a causal LM) and
+returns the extended cache (present_key_<i>/present_value_<i>). The seq2seq
+decoder also takes the cross-attention keys/values encoder.onnx computed
+(cross_key_<i>/cross_value_<i>). The tokenizer and onnx_config.json are
+written alongside.
+
+Usage:
+    python export_onnx.py reviews                                     # merged LoRA model -> ONNX_DIR
+    python export_onnx.py output-student-reviews-ratings --quantize int8
+    REVIEWS_BACKEND=onnx python app_hybrid.py
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+import torch
+
+from onnx_backend import ONNX_DIR, ONNX_CONFIG, OnnxGenerator, kv_names
+
+OPSET = 17
+SAMPLE_TEXTS = ['Rating: 4.2 ★ 20,596 Ratings & 9,777 Reviews',
+                'Customer reviews 3.9 out of 5 stars 88 global ratings']
+
+
+class CausalLMWithPast(torch.nn.Module):
+    """Causal LM forward with the cache flattened into tensors, for tracing"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask, position_ids, *past):
+        from transformers import DynamicCache
+        cache = DynamicCache(config=self.model.config)
+        for i in range(len(past) // 2):
+            cache.update(past[2 * i], past[2 * i + 1], i)
+        out = self.model(input_ids=input_ids, attention_mask=attention_mask, position_ids=position_ids,
+                         past_key_values=cache, use_cache=True)
+        return (out.logits, *[t for layer in out.past_key_values.layers for t in (layer.keys, layer.values)])
+
+
+class Seq2SeqEncoderWithFirstStep(torch.nn.Module):
+    """Encoder plus the first decoder step (from the decoder start token)
+
+    Also returns the cross-attention keys/values the step computed from the
+    encoder states, so later steps reuse them instead of projecting the
+    encoder states again.
+    """
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        from transformers import DynamicCache, EncoderDecoderCache
+        decoder_input_ids = torch.full_like(input_ids[:, :1], self.model.config.decoder_start_token_id)
+        cache = EncoderDecoderCache(DynamicCache(config=self.model.config), DynamicCache(config=self.model.config))
+        out = self.model(input_ids=input_ids, attention_mask=attention_mask, decoder_input_ids=decoder_input_ids,
+                         past_key_values=cache, use_cache=True)
+        cache = out.past_key_values
+        return (out.logits,
+                *[t for layer in cache.self_attention_cache.layers for t in (layer.keys, layer.values)],
+                *[t for layer in cache.cross_attention_cache.layers for t in (layer.keys, layer.values)])
+
+
+class Seq2SeqDecoderWithPast(torch.nn.Module):
+    """Decoder step with the self-attention cache and cross-attention keys/values flattened into tensors"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, decoder_input_ids, encoder_attention_mask, *past_and_cross):
+        from transformers import DynamicCache, EncoderDecoderCache
+        num_layers = len(past_and_cross) // 4
+        caches = []
+        for offset in (0, 2 * num_layers):
+            cache = DynamicCache(config=self.model.config)
+            for i in range(num_layers):
+                cache.update(past_and_cross[offset + 2 * i], past_and_cross[offset + 2 * i + 1], i)
+            caches.append(cache)
+        cache = EncoderDecoderCache(*caches)
+        # Cross-attention reads the cached keys/values; the encoder states only give the shape
+        cross_key = past_and_cross[2 * num_layers]
+        encoder_hidden_states = cross_key.new_zeros(cross_key.shape[0], cross_key.shape[2], self.model.config.d_model)
+        out = self.model(encoder_outputs=(encoder_hidden_states,), attention_mask=encoder_attention_mask,
+                         decoder_input_ids=decoder_input_ids, past_key_values=cache, use_cache=True)
+        layers = out.past_key_values.self_attention_cache.layers
+        return (out.logits, *[t for layer in layers for t in (layer.keys, layer.values)])
+
+
+def load_source(source):
+    """(model, tokenizer, is_seq2seq) in float32 with eager attention, which traces to plain ONNX ops"""
+    from transformers import AutoConfig, AutoTokenizer, AutoModelForCausalLM, AutoModelForSeq2SeqLM
+
+    if source == 'reviews':
+        import inference
+        from peft import PeftModel
+        tokenizer = inference.load_tokenizer()
+        base_path = inference.model_registry.base_path() if inference.model_registry else inference.MODEL
+        model = AutoModelForCausalLM.from_pretrained(base_path, dtype=torch.float32, attn_implementation='eager',
+                                                     local_files_only=bool(inference.model_registry))
+        adapter = inference.adapter_path('reviews', inference.ADAPTER_REVIEWS)
+        if adapter is None:
+            print(f"[WARNING] Reviews adapter {inference.ADAPTER_REVIEWS} not found. Exporting the base model only.")
+        else:
+            print(f"[INFO] Merging reviews adapter {adapter} into the base weights")
+            model = PeftModel.from_pretrained(model, adapter).merge_and_unload()
+        return model.eval(), tokenizer, False
+
+    config = AutoConfig.from_pretrained(source)
+    tokenizer = AutoTokenizer.from_pretrained(source)
+    if config.is_encoder_decoder:
+        model = AutoModelForSeq2SeqLM.from_pretrained(source, dtype=torch.float32, attn_implementation='eager')
+    else:
+        model = AutoModelForCausalLM.from_pretrained(source, dtype=torch.float32, attn_implementation='eager')
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        tokenizer.padding_side = 'left'
+    return model.eval(), tokenizer, bool(config.is_encoder_decoder)
+
+
+def cache_shape(config):
+    """(layers, key/value heads, head dim) of the decoder's self-attention cache"""
+    if config.is_encoder_decoder:
+        layers = getattr(config, 'num_decoder_layers', None) or config.num_layers
+        return layers, config.num_heads, config.d_kv
+    heads = getattr(config, 'num_key_value_heads', None) or config.num_attention_heads
+    head_dim = getattr(config, 'head_dim', None) or config.hidden_size // config.num_attention_heads
+    return config.num_hidden_layers, heads, head_dim
+
+
+def cache_axes(num_layers):
+    axes = {name: {0: 'batch', 2: 'past_length'} for name in kv_names('past', num_layers)}
+    axes.update({name: {0: 'batch', 2: 'total_length'} for name in kv_names('present', num_layers)})
+    return axes
+
+
+def export_causal(model, output_dir, opset):
+    num_layers, heads, head_dim = cache_shape(model.config)
+    wrapper = CausalLMWithPast(model).eval()
+    # Trace with a non-empty cache so no shape is specialized to the prompt step
+    batch, past_length, length = 2, 3, 4
+    input_ids = torch.randint(0, model.config.vocab_size, (batch, length))
+    attention_mask = torch.ones(batch, past_length + length, dtype=torch.long)
+    position_ids = torch.arange(past_length, past_length + length).expand(batch, -1)
+    past = [torch.zeros(batch, heads, past_length, head_dim) for _ in range(2 * num_layers)]
+
+    dynamic_axes = {'input_ids': {0: 'batch', 1: 'length'}, 'attention_mask': {0: 'batch', 1: 'total_length'},
+                    'position_ids': {0: 'batch', 1: 'length'}, 'logits': {0: 'batch', 1: 'length'},
+                    **cache_axes(num_layers)}
+    path = os.path.join(output_dir, 'model.onnx')
+    with torch.no_grad():
+        torch.onnx.export(wrapper, (input_ids, attention_mask, position_ids, *past), path,
+                          input_names=['input_ids', 'attention_mask', 'position_ids'] + kv_names('past', num_layers),
+                          output_names=['logits'] + kv_names('present', num_layers),
+                          dynamic_axes=dynamic_axes, opset_version=opset, dynamo=False)
+    return [path]
+
+
+def export_seq2seq(model, output_dir, opset):
+    num_layers, heads, head_dim = cache_shape(model.config)
+    batch, length, past_length = 2, 8, 3
+    input_ids = torch.randint(0, model.config.vocab_size, (batch, length))
+    attention_mask = torch.ones(batch, length, dtype=torch.long)
+    encoder_axes = {'input_ids': {0: 'batch', 1: 'length'}, 'attention_mask': {0: 'batch', 1: 'length'},
+                    'logits': {0: 'batch'}}
+    encoder_axes.update({name: {0: 'batch'} for name in kv_names('present', num_layers)})
+    encoder_axes.update({name: {0: 'batch', 2: 'length'} for name in kv_names('cross', num_layers)})
+
+    encoder_path = os.path.join(output_dir, 'encoder.onnx')
+    with torch.no_grad():
+        torch.onnx.export(Seq2SeqEncoderWithFirstStep(model).eval(), (input_ids, attention_mask), encoder_path,
+                          input_names=['input_ids', 'attention_mask'],
+                          output_names=['logits'] + kv_names('present', num_layers) + kv_names('cross', num_layers),
+                          dynamic_axes=encoder_axes, opset_version=opset, dynamo=False)
+
+    decoder_path = os.path.join(output_dir, 'decoder.onnx')
+    decoder_input_ids = torch.zeros(batch, 1, dtype=torch.long)
+    past = [torch.zeros(batch, heads, past_length, head_dim) for _ in range(2 * num_layers)]
+    cross = [torch.zeros(batch, heads, length, head_dim) for _ in range(2 * num_layers)]
+    dynamic_axes = {'decoder_input_ids': {0: 'batch', 1: 'decoder_length'},
+                    'encoder_attention_mask': {0: 'batch', 1: 'length'},
+                    'logits': {0: 'batch', 1: 'decoder_length'}, **cache_axes(num_layers)}
+    dynamic_axes.update({name: {0: 'batch', 2: 'length'} for name in kv_names('cross', num_layers)})
+    with torch.no_grad():
+        torch.onnx.export(Seq2SeqDecoderWithPast(model).eval(), (decoder_input_ids, attention_mask, *past, *cross),
+                          decoder_path,
+                          input_names=['decoder_input_ids', 'encoder_attention_mask']
+                                      + kv_names('past', num_layers) + kv_names('cross', num_layers),
+                          output_names=['logits'] + kv_names('present', num_layers),
+                          dynamic_axes=dynamic_axes, opset_version=opset, dynamo=False)
+    return [encoder_path, decoder_path]
+
+
+def quantize_int8(paths):
+    """Dynamic int8 quantization of the MatMul weights, in place"""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    output_dir = os.path.dirname(paths[0])
+    # Graphs over the 2 GB protobuf limit keep their weights in external data files
+    large = sum(os.path.getsize(os.path.join(output_dir, f)) for f in os.listdir(output_dir)) > 2 ** 31
+    for path in paths:
+        quantized = path + '.int8'
+        quantize_dynamic(path, quantized, weight_type=QuantType.QInt8, use_external_data_format=large)
+        os.replace(quantized, path)
+        print(f"[INFO] Quantized {path} to int8 ({os.path.getsize(path) / 1e6:.1f} MB)")
+
+
+def check_export(model, tokenizer, is_seq2seq, output_dir, max_new_tokens=32):
+    """Greedy tokens from the ONNX graphs vs generate() in PyTorch on SAMPLE_TEXTS; number of mismatching rows"""
+    from prompts import REVIEWS_INSTRUCTION, encode_prompts
+
+    if is_seq2seq:
+        inputs = tokenizer(SAMPLE_TEXTS, return_tensors='pt', padding=True)
+        prompt_length = 1  # generate() output starts with the decoder start token
+    else:
+        inputs = encode_prompts(tokenizer, REVIEWS_INSTRUCTION, SAMPLE_TEXTS)
+        prompt_length = inputs['input_ids'].shape[1]
+    with torch.no_grad():
+        expected = model.generate(**inputs, max_new_tokens=max_new_tokens, do_sample=False, num_beams=1,
+                                  pad_token_id=tokenizer.pad_token_id)[:, prompt_length:].numpy()
+
+    generator = OnnxGenerator(output_dir)
+    generated = generator.generate(inputs['input_ids'].numpy(), inputs['attention_mask'].numpy(), max_new_tokens)
+    mismatches = 0
+    for want, got in zip(expected, generated):
+        steps = min(len(want), len(got))
+        if not np.array_equal(want[:steps], got[:steps]):
+            mismatches += 1
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the reviews extractor or a student model to ONNX")
+    parser.add_argument('source', nargs='?', default='reviews',
+                        help="'reviews' (base + merged reviews adapter) or a local checkpoint directory")
+    parser.add_argument('--output', default=ONNX_DIR, help=f"export directory (default: {ONNX_DIR})")
+    parser.add_argument('--opset', type=int, default=OPSET)
+    parser.add_argument('--quantize', choices=['none', 'int8'], default='none',
+                        help="int8: dynamic weight quantization, smaller and usually faster on CPU")
+    parser.add_argument('--no-check', action='store_true', help="skip comparing ONNX and PyTorch greedy output")
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    print(f"[INFO] Loading {args.source}...")
+    model, tokenizer, is_seq2seq = load_source(args.source)
+    os.makedirs(args.output, exist_ok=True)
+
+    print(f"[INFO] Exporting {'encoder/decoder' if is_seq2seq else 'decoder'} graphs to {args.output} (opset {args.opset})")
+    paths = export_seq2seq(model, args.output, args.opset) if is_seq2seq else export_causal(model, args.output, args.opset)
+    if args.quantize == 'int8':
+        quantize_int8(paths)
+
+    num_layers, heads, head_dim = cache_shape(model.config)
+    config = {
+        'architecture': 'seq2seq' if is_seq2seq else 'causal',
+        'source': args.source,
+        'num_layers': num_layers,
+        'num_kv_heads': heads,
+        'head_dim': head_dim,
+        'eos_token_id': tokenizer.eos_token_id,
+        'pad_token_id': tokenizer.pad_token_id,
+        'quantize': args.quantize,
+        'opset': args.opset,
+        'exported': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    if is_seq2seq:
+        from student_model import STUDENT_MAX_INPUT, STUDENT_MAX_OUTPUT
+        config.update({'decoder_start_token_id': model.config.decoder_start_token_id,
+                       'max_input_length': STUDENT_MAX_INPUT, 'max_output_length': STUDENT_MAX_OUTPUT})
+    with open(os.path.join(args.output, ONNX_CONFIG), 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=2)
+    tokenizer.save_pretrained(args.output)
+
+    if not args.no_check:
+        mismatches = check_export(model, tokenizer, is_seq2seq, args.output)
+        if mismatches and args.quantize == 'none':
+            print(f"[ERROR] ONNX greedy output differs from PyTorch on {mismatches}/{len(SAMPLE_TEXTS)} samples")
+            return 1
+        level = "WARNING" if mismatches else "OK"
+        print(f"[{level}] ONNX greedy output matches PyTorch on "
+              f"{len(SAMPLE_TEXTS) - mismatches}/{len(SAMPLE_TEXTS)} samples")
+
+    print(f"[OK] Exported to {args.output} in {time.time() - start:.1f}s - "
+          f"serve it with REVIEWS_BACKEND=onnx ONNX_DIR={args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
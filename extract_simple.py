@@ -15,7 +15,7 @@ if sys.platform == 'win32':
 
 import re
 
-def extract_rating_reviews(text):
+def extract_rating_reviews(text, verbose=True):
     """Extract rating and reviews from text using regex patterns"""
     
     result = {
@@ -24,7 +24,8 @@ def extract_rating_reviews(text):
         'review_count': None
     }
     
-    print(f"[INFO] Extracting from text: {text[:100]}...")
+    if verbose:
+        print(f"[INFO] Extracting from text: {text[:100]}...")
     
     # Extract rating pattern (e.g., 4.2★, 4.2, 4.2*, etc.)
     rating_patterns = [
@@ -42,7 +43,8 @@ def extract_rating_reviews(text):
                 rating_value = float(rating_num)
                 if 0 <= rating_value <= 5:
                     result['rating'] = f"{rating_num}★"
-                    print(f"[OK] Rating: {result['rating']}")
+                    if verbose:
+                        print(f"[OK] Rating: {result['rating']}")
                     break
             except:
                 pass
@@ -59,7 +61,8 @@ def extract_rating_reviews(text):
         if match:
             ratings_num = match.group(1).replace(',', '').replace('.', '')
             result['rating_count'] = f"{ratings_num} Ratings"
-            print(f"[OK] Rating Count: {result['rating_count']}")
+            if verbose:
+                print(f"[OK] Rating Count: {result['rating_count']}")
             break
     
     # Extract reviews count
@@ -74,7 +77,8 @@ def extract_rating_reviews(text):
         if match:
             reviews_num = match.group(1).replace(',', '').replace('.', '')
             result['review_count'] = f"{reviews_num} Reviews"
-            print(f"[OK] Review Count: {result['review_count']}")
+            if verbose:
+                print(f"[OK] Review Count: {result['review_count']}")
             break
     
     return result
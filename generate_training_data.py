@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Synthetic training data for the reviews/ratings model
+Writes examples in the instruction/input/output schema of
+data/reviews_ratings_train.jsonl, as sharded JSONL generated in parallel.
+
+Inputs vary between the structured "Rating: ... Rating Count: ..." form and
+page-text snippets: comma-grouped counts (20,596 and 1,01,234), missing
+fields, decoy decimals (prices, sizes, seller ratings) and lines of real
+page text from data/pages as noise.
+
+Usage:
+    python generate_training_data.py data/synthetic --examples 200000 --shards 16 --workers 8
+    TRAIN_FILE="data/synthetic/train-*.jsonl" VAL_FILE="data/synthetic/val-*.jsonl" python train_reviews_ratings.py
+"""
+
+import os
+import re
+import glob
+import json
+import time
+import random
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from prompts import REVIEWS_INSTRUCTION
+
+# Page lines that look like a rating or count would contradict the label
+LABEL_LIKE = re.compile(r'\d\s*(★|\*|ratings?\b|reviews?\b)|^\s*\d\.\d\s*$|^\s*★\s*$', re.IGNORECASE)
+
+PRODUCT_WORDS = ['Casual', 'Trendy', 'Stylish', 'Cotton', 'Polyester Blend', 'Printed', 'Solid', 'Ribbed',
+                 'Women', 'Men', 'Kids', 'Kurti', 'Top', 'Bedsheet', 'Saree', 'T-Shirt', 'Jeans', 'Dupatta']
+DECOYS = [
+    lambda r: f"₹{r.randint(99, 2999)}.{r.randint(0, 99):02d}",
+    lambda r: f"Length : {r.randint(1, 4)}.{r.randint(0, 9)} m",
+    lambda r: f"Net Weight : {r.randint(0, 4)}.{r.randint(1, 9)} kg",
+    lambda r: f"Size : {r.randint(1, 4)}.{r.randint(1, 9)} inches",
+    lambda r: f"Version {r.randint(1, 4)}.{r.randint(0, 9)}",
+    lambda r: f"{r.randint(5, 80)}% off",
+    lambda r: f"₹{r.randint(99, 2999)}",
+]
+
+
+def load_noise_lines(pages_dir):
+    """Lines of saved page text that carry no rating/count"""
+    lines = set()
+    for path in sorted(glob.glob(os.path.join(pages_dir, '*.txt'))):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line and not LABEL_LIKE.search(line):
+                    lines.add(line)
+    return sorted(lines)
+
+
+def group_digits(n, r):
+    """n as 20596, 20,596 or Indian 1,01,234 grouping"""
+    style = r.random()
+    if style < 0.3 or n < 1000:
+        return str(n)
+    if style < 0.65:
+        return f"{n:,}"
+    head, tail = str(n)[:-3], str(n)[-3:]
+    groups = []
+    while len(head) > 2:
+        groups.insert(0, head[-2:])
+        head = head[:-2]
+    return ','.join([head] + groups + [tail])
+
+
+def sample_truth(r):
+    """Rating / counts with some fields missing, and the expected JSON"""
+    rating = f"{r.choice([r.uniform(1.0, 5.0), r.uniform(3.5, 4.9)]):.1f}"
+    rating_count = int(10 ** r.uniform(0.5, 6.2))
+    review_count = max(0, int(rating_count * r.uniform(0.2, 0.7)))
+    missing = r.random()
+    if missing < 0.08:
+        rating = None
+    elif missing < 0.16:
+        review_count = None
+    elif missing < 0.21:
+        rating_count = None
+    elif missing < 0.24:
+        rating = rating_count = review_count = None
+    output = {
+        'Rating': f"{rating}★" if rating else None,
+        'Rating_Count': f"{rating_count} Ratings" if rating_count is not None else None,
+        'Review_Count': f"{review_count} Reviews" if review_count is not None else None,
+    }
+    return rating, rating_count, review_count, output
+
+
+def structured_input(r, rating, rating_count, review_count):
+    """The crawler-style input: Rating: "4.2★" Rating Count: "20,596 Ratings" ..."""
+    quote = r.choice(['"', '', '"'])
+    star = r.choice(['★', '★', '*', ' ★', ''])
+    parts = []
+    if rating:
+        parts.append(f"Rating: {quote}{rating}{star}{quote}")
+    if rating_count is not None:
+        parts.append(f"Rating Count: {quote}{group_digits(rating_count, r)} {r.choice(['Ratings', 'ratings', 'Ratings'])}{quote}")
+    if review_count is not None:
+        parts.append(f"Review Count: {quote}{group_digits(review_count, r)} {r.choice(['Reviews', 'reviews', 'Reviews'])}{quote}")
+    return ' '.join(parts)
+
+
+def page_input(r, rating, rating_count, review_count, noise):
+    """A page-text snippet: product title, prices, decoys, the rating block and unrelated lines"""
+    lines = [' '.join(r.sample(PRODUCT_WORDS, r.randint(3, 6)))]
+    lines += [decoy(r) for decoy in r.sample(DECOYS, r.randint(1, 3))]
+    if rating:
+        lines += r.choice([[rating, '★'], [f"{rating}★"], [f"{rating} ★"], [f"{rating} out of 5"]])
+    counts = []
+    if rating_count is not None:
+        counts.append(f"{group_digits(rating_count, r)} Ratings")
+    if review_count is not None:
+        counts.append(f"{group_digits(review_count, r)} Reviews")
+    if len(counts) == 2 and r.random() < 0.7:
+        lines.append(r.choice([', ', ' and ', ' & ']).join(counts))
+    else:
+        lines += counts
+    if noise:
+        lines += r.sample(noise, min(len(noise), r.randint(0, 6)))
+    if rating and r.random() < 0.15:
+        # Seller block after the product's rating, as on real pages: its rating is not the product's
+        lines += ["Sold By", f"{r.choice(PRODUCT_WORDS)} Fashion", f"{r.uniform(2.5, 4.9):.1f}", "★",
+                  f"{group_digits(int(10 ** r.uniform(2, 5)), r)} Ratings"]
+    separator = r.choice(['\n', '\n', ' '])
+    return separator.join(lines)
+
+
+def make_example(r, noise):
+    rating, rating_count, review_count, output = sample_truth(r)
+    if r.random() < 0.4:
+        text = structured_input(r, rating, rating_count, review_count)
+    else:
+        text = page_input(r, rating, rating_count, review_count, noise)
+    return {'instruction': REVIEWS_INSTRUCTION, 'input': text, 'output': json.dumps(output, ensure_ascii=False)}
+
+
+def write_shard(args):
+    """Worker: generate one shard into train-/val- files, return (train, val) counts"""
+    shard, num_shards, n_examples, val_fraction, seed, out_dir, noise = args
+    r = random.Random(seed * 1000003 + shard)
+    counts = [0, 0]
+    name = f"{shard:05d}-of-{num_shards:05d}.jsonl"
+    with open(os.path.join(out_dir, f"train-{name}"), 'w', encoding='utf-8') as train_f, \
+         open(os.path.join(out_dir, f"val-{name}"), 'w', encoding='utf-8') as val_f:
+        for _ in range(n_examples):
+            line = json.dumps(make_example(r, noise), ensure_ascii=False) + '\n'
+            is_val = r.random() < val_fraction
+            (val_f if is_val else train_f).write(line)
+            counts[is_val] += 1
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic reviews/ratings training data")
+    parser.add_argument('out_dir', help="directory for train-*.jsonl / val-*.jsonl shards")
+    parser.add_argument('--examples', type=int, default=200000, help="total examples (default: 200000)")
+    parser.add_argument('--shards', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--val-fraction', type=float, default=0.02)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--pages', default='data/pages', help="saved page texts used as noise (default: data/pages)")
+    args = parser.parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    noise = load_noise_lines(args.pages)
+    per_shard = [args.examples // args.shards + (i < args.examples % args.shards) for i in range(args.shards)]
+    jobs = [(i, args.shards, n, args.val_fraction, args.seed, args.out_dir, noise) for i, n in enumerate(per_shard)]
+
+    print(f"[INFO] {args.examples:,} examples -> {args.shards} shards in {args.out_dir} "
+          f"({args.workers} workers, {len(noise)} noise lines)")
+    start = time.time()
+    train = val = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for t, v in pool.map(write_shard, jobs):
+            train += t
+            val += v
+    elapsed = time.time() - start
+    print(f"[OK] {train:,} train + {val:,} val examples in {elapsed:.1f}s ({args.examples / elapsed:,.0f} examples/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,7 @@ import time
 import re
 import undetected_chromedriver as uc
 from selenium.webdriver.common.by import By
+from rating_dom import extract_rating_text, TARGETED_EXTRACTION
 
 def get_rating_from_page(url):
     """Get rating and review info from Meesho page"""
@@ -24,8 +25,12 @@ def get_rating_from_page(url):
         
         print("\nSearching for rating information...")
         
-        # Try to find any element with rating-like text
-        page_text = driver.find_element(By.TAG_NAME, 'body').text
+        # Try to find any element with rating-like text - only the rating/review nodes when the page has them
+        page_text = None
+        if TARGETED_EXTRACTION:
+            page_text, _ = extract_rating_text(driver)
+        if not page_text:
+            page_text = driver.find_element(By.TAG_NAME, 'body').text
         
         # Look for rating pattern in page text
         rating_pattern = r'(\d+\.\d+)'
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fast HTML-to-text conversion built on lxml
+Used as the page_source fallback when body.text is too short.
+Streams the document through lxml's parser target interface, so no tree is
+built, and drops script/style content that BeautifulSoup's get_text() keeps.
+"""
+
+try:
+    from lxml import etree
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+CHUNK_SIZE = 64 * 1024  # characters/bytes fed to the parser at a time
+
+# Tags whose content is never visible text
+SKIP_TAGS = {'script', 'style', 'noscript', 'template', 'svg', 'head'}
+
+# Tags that start a new line (inline ones too), so numbers in neighbouring
+# elements do not run together, e.g. "4.2" and "20596 Ratings"
+BREAK_TAGS = {
+    'p', 'div', 'br', 'li', 'ul', 'ol', 'tr', 'td', 'th', 'table', 'section', 'article',
+    'header', 'footer', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'span', 'a', 'button', 'label',
+}
+
+
+class _TextCollector:
+    """lxml parser target that keeps text outside SKIP_TAGS"""
+
+    def __init__(self):
+        self.parts = []
+        self.skip_depth = 0
+
+    def start(self, tag, attrib):
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag in BREAK_TAGS and not self.skip_depth:
+            self.parts.append('\n')
+
+    def end(self, tag):
+        if tag in SKIP_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag in BREAK_TAGS and not self.skip_depth:
+            self.parts.append('\n')
+
+    def data(self, data):
+        if not self.skip_depth:
+            self.parts.append(data)
+
+    def comment(self, text):
+        pass
+
+    def close(self):
+        return ''.join(self.parts)
+
+
+def _bs4_html_to_text(html):
+    """Fallback when lxml is not installed"""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    for node in soup(list(SKIP_TAGS)):
+        node.decompose()
+    return soup.get_text('\n')
+
+
+def html_to_text(html, chunk_size=CHUNK_SIZE):
+    """Convert an HTML string (or bytes) to visible text"""
+    # lxml raises "no element found" when nothing but whitespace was fed
+    if not html or not html.strip():
+        return ''
+    if not LXML_AVAILABLE:
+        return _bs4_html_to_text(html)
+
+    parser = etree.HTMLParser(target=_TextCollector(), encoding='utf-8' if isinstance(html, bytes) else None)
+    for i in range(0, len(html), chunk_size):
+        parser.feed(html[i:i + chunk_size])
+    return parser.close()
+
+
+def html_file_to_text(path, chunk_size=CHUNK_SIZE):
+    """Convert a saved HTML file to visible text without reading it into memory at once"""
+    if not LXML_AVAILABLE:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            return _bs4_html_to_text(f.read())
+
+    parser = etree.HTMLParser(target=_TextCollector(), encoding='utf-8')
+    empty = True
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            empty = empty and not chunk.strip()
+            parser.feed(chunk)
+    return '' if empty else parser.close()
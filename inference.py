@@ -1,189 +1,381 @@
 # inference.py
-import json, re
-from transformers import AutoTokenizer, AutoModelForCausalLM
+import json
+from transformers import AutoTokenizer, AutoModelForCausalLM, StoppingCriteriaList
 from peft import PeftModel, PeftConfig
 import torch
 import os
+import threading
+from inference_stats import InferenceStats
+from json_scan import JsonObjectScanner
+import prompts
+from prompts import (ATTRIBUTES_INSTRUCTION, REVIEWS_INSTRUCTION, OUTPUT_MARKER, prompt_prefix, build_prompt,
+                     build_reviews_prompt, prefix_cache, cached_prefix_ids)
+from continuous_batching import ContinuousBatcher, MAX_BATCH_SIZE as CB_MAX_BATCH_SIZE
+from speculative import NgramDrafter, speculative_generate, render_reviews_candidate, candidate_token_ids, verify_candidate
+from model_registry import ModelRegistry, ReadWriteLock, MODEL_REGISTRY
+from model_manager import ModelManager, ModelBusy, INFERENCE_CONCURRENCY
 
 MODEL = "meta-llama/Llama-2-7b-chat-hf"   # LLaMA-2 Model
 ADAPTER = "output-llama-lora-comprehensive"  # comprehensive attributes adapter
 ADAPTER_REVIEWS = "output-llama-lora-reviews-ratings"  # reviews and ratings adapter
 
-# Global variables for model loading
-tokenizer = None
-model = None
-model_loaded = False
+# Pinned local checkpoints (model_registry.py). When the registry file exists,
+# MODEL/ADAPTER paths come from it and nothing is resolved through the HF hub.
+model_registry = ModelRegistry.load()
+# Generation holds the read side; swap_adapter holds the write side
+adapter_lock = ReadWriteLock()
 
-# Global variables for reviews/ratings model
-reviews_tokenizer = None
-reviews_model = None
-reviews_model_loaded = False
+# One fast (Rust) tokenizer shared by both models - they use the same base MODEL
+shared_tokenizer = None
+tokenizer_lock = threading.Lock()
 
-def load_model():
-    """Load the model and tokenizer only once"""
-    global tokenizer, model, model_loaded
-    
-    if not model_loaded:
-        try:
-            print("Loading tokenizer and model...")
-            tokenizer = AutoTokenizer.from_pretrained(MODEL, use_fast=False)
-            tokenizer.pad_token = tokenizer.eos_token
-
-            # Check if adapter exists
-            if not os.path.exists(ADAPTER):
-                print(f"WARNING: Adapter {ADAPTER} not found. Using base model only.")
-                model = AutoModelForCausalLM.from_pretrained(
-                    MODEL, 
-                    device_map="auto", 
-                    dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
-                    trust_remote_code=True
-                )
+# Token counts, prefill/decode timing, cache hits and memory for every call
+inference_stats = InferenceStats()
+
+json_decoder = json.JSONDecoder()
+
+# Set CONTINUOUS_BATCHING=1 to run concurrent calls through one decode loop per
+# model (continuous_batching.py) instead of a separate generate() per call
+CONTINUOUS_BATCHING = os.environ.get("CONTINUOUS_BATCHING", "0") == "1"
+batchers = {}
+batchers_lock = threading.Lock()
+
+# Set SPECULATIVE_DECODING=1 to verify drafted tokens (regex answer, prompt
+# n-grams) in batches instead of decoding one token per forward pass
+SPECULATIVE_DECODING = os.environ.get("SPECULATIVE_DECODING", "0") == "1"
+
+# Set REGEX_VERIFY=1 to score the regex answer with one forward pass and only
+# generate when the model rejects it (reviews prompts)
+REGEX_VERIFY = os.environ.get("REGEX_VERIFY", "0") == "1"
+
+# REVIEWS_BACKEND=student serves reviews/ratings from the distilled seq2seq
+# student (student_model.py, trained by distill.py) instead of the LoRA model;
+# REVIEWS_BACKEND=onnx from an export_onnx.py export on ONNX Runtime (onnx_backend.py)
+REVIEWS_BACKEND = os.environ.get("REVIEWS_BACKEND", "llm")
+
+def load_tokenizer():
+    """Load the shared fast tokenizer once"""
+    global shared_tokenizer
+    with tokenizer_lock:
+        if shared_tokenizer is None:
+            print("Loading tokenizer...")
+            if model_registry:
+                shared_tokenizer = AutoTokenizer.from_pretrained(model_registry.base_path(), use_fast=True, local_files_only=True)
             else:
-                # Load base model and wrap with PEFT adapter
-                base = AutoModelForCausalLM.from_pretrained(
-                    MODEL, 
-                    device_map="auto", 
-                    dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
-                    trust_remote_code=True
-                )
-                model = PeftModel.from_pretrained(base, ADAPTER)
-            
-            model_loaded = True
-            print("Model loaded successfully!")
-            
-        except Exception as e:
-            print(f"Error loading model: {e}")
-            model_loaded = False
-            raise e
+                shared_tokenizer = AutoTokenizer.from_pretrained(MODEL, use_fast=True)
+            shared_tokenizer.pad_token = shared_tokenizer.eos_token
+            shared_tokenizer.padding_side = "left"  # batched generation appends after the prompt
+    return shared_tokenizer
+
+def load_base_model():
+    """The base causal LM, from the pinned local safetensors (memory-mapped) when a registry exists"""
+    dtype = torch.float16 if torch.cuda.is_available() else torch.float32
+    if model_registry:
+        return AutoModelForCausalLM.from_pretrained(
+            model_registry.base_path(),
+            device_map="auto",
+            dtype=dtype,
+            local_files_only=True,
+            use_safetensors=True
+        )
+    return AutoModelForCausalLM.from_pretrained(
+        MODEL, 
+        device_map="auto", 
+        dtype=dtype,
+        trust_remote_code=True
+    )
+
+def adapter_path(kind, default):
+    """Verified path of the active pinned adapter, else the default directory; None if neither exists"""
+    if model_registry:
+        path = model_registry.adapter_path(kind)
+        if path is not None:
+            return path
+    return default if os.path.exists(default) else None
+
+def adapter_name(kind):
+    """PEFT adapter name: the pinned version, so swaps can load the next one alongside it"""
+    return (model_registry and model_registry.active_version(kind)) or "default"
+
+def swap_adapter(kind, version):
+    """Hot-swap the 'reviews' or 'attributes' model to another pinned adapter version
+
+    Verifies the new version, loads it next to the current adapter, waits for
+    in-flight generation to finish, activates it and frees the old one.
+    Returns the previous version.
+    """
+    if not model_registry:
+        raise RuntimeError(f"No model registry ({MODEL_REGISTRY}) - nothing to swap to")
+    if kind not in ('reviews', 'attributes'):
+        raise ValueError(f"Unknown adapter kind: {kind}")
+    path = model_registry.adapter_path(kind, version)
+    if path is None:
+        raise KeyError(f"No {kind} adapter pinned in the registry")
+    manager = reviews_manager if kind == 'reviews' else attributes_manager
+    _, current = manager.load()
+    previous = model_registry.active_version(kind)
+
+    adapter_lock.acquire_write()
+    try:
+        if isinstance(current, PeftModel):
+            old_name = current.active_adapter
+            if version != old_name:
+                current.load_adapter(path, adapter_name=version)
+                current.set_adapter(version)
+                current.delete_adapter(old_name)
+        else:
+            # Base model only so far: wrap it in place of the loaded model
+            current = PeftModel.from_pretrained(current, path, adapter_name=version)
+            manager.set_model(current)
+            batchers.pop(kind, None)
+        current.eval()
+        model_registry.set_active(kind, version)
+    finally:
+        adapter_lock.release_write()
+    print(f"[INFO] Swapped {kind} adapter {previous} -> {version} ({path})")
+    return previous
+
+def build_model():
+    """Tokenizer and attributes model (base model + attributes adapter)"""
+    try:
+        print("Loading tokenizer and model...")
+        tok = load_tokenizer()
+
+        adapter = adapter_path('attributes', ADAPTER)
+        if adapter is None:
+            print(f"WARNING: Adapter {ADAPTER} not found. Using base model only.")
+            loaded = load_base_model()
+        else:
+            # Load base model and wrap with PEFT adapter
+            loaded = PeftModel.from_pretrained(load_base_model(), adapter,
+                                               adapter_name=adapter_name('attributes'))
+
+        print("Model loaded successfully!")
+        return tok, loaded
+
+    except Exception as e:
+        print(f"Error loading model: {e}")
+        raise e
+
+def build_reviews_model():
+    """Tokenizer and reviews/ratings model (base model + reviews adapter)"""
+    try:
+        print("Loading reviews/ratings tokenizer and model...")
+        tok = load_tokenizer()
+
+        adapter = adapter_path('reviews', ADAPTER_REVIEWS)
+        if adapter is None:
+            print(f"WARNING: Reviews adapter {ADAPTER_REVIEWS} not found. Using base model only.")
+            loaded = load_base_model()
+        else:
+            # Load base model and wrap with PEFT adapter
+            loaded = PeftModel.from_pretrained(load_base_model(), adapter,
+                                               adapter_name=adapter_name('reviews'))
+
+        print("Reviews/Ratings model loaded successfully!")
+        return tok, loaded
+
+    except Exception as e:
+        print(f"Error loading reviews model: {e}")
+        raise e
+
+# Each model is loaded once, however many threads ask for it at the same time,
+# and generation on it goes through a bounded number of slots (model_manager.py).
+# With continuous batching concurrent calls share one decode loop, so by
+# default as many calls run as it batches.
+if CONTINUOUS_BATCHING and "INFERENCE_CONCURRENCY" not in os.environ:
+    INFERENCE_CONCURRENCY = CB_MAX_BATCH_SIZE
+attributes_manager = ModelManager('attributes', build_model, INFERENCE_CONCURRENCY)
+reviews_manager = ModelManager('reviews', build_reviews_model, INFERENCE_CONCURRENCY)
+
+def load_model():
+    """Load the model and tokenizer only once; returns (tokenizer, model)"""
+    return attributes_manager.load()
 
 def load_reviews_model():
-    """Load the reviews and ratings model and tokenizer"""
-    global reviews_tokenizer, reviews_model, reviews_model_loaded
-    
-    if not reviews_model_loaded:
+    """Load the reviews and ratings model and tokenizer only once; returns (tokenizer, model)"""
+    return reviews_manager.load()
+
+def encode_prompts(tok, instr, texts, device=None):
+    """prompts.encode_prompts, counting prefix cache hits in inference_stats"""
+    return prompts.encode_prompts(tok, instr, texts, device, stats=inference_stats)
+
+def parse_json_output(decoded):
+    """Pull the first JSON object out of a decoded completion (the generated tokens only, not the prompt)"""
+    start = decoded.find('{')
+    if start >= 0:
         try:
-            print("Loading reviews/ratings tokenizer and model...")
-            reviews_tokenizer = AutoTokenizer.from_pretrained(MODEL, use_fast=False)
-            reviews_tokenizer.pad_token = reviews_tokenizer.eos_token
-
-            # Check if reviews adapter exists
-            if not os.path.exists(ADAPTER_REVIEWS):
-                print(f"WARNING: Reviews adapter {ADAPTER_REVIEWS} not found. Using base model only.")
-                reviews_model = AutoModelForCausalLM.from_pretrained(
-                    MODEL, 
-                    device_map="auto", 
-                    dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
-                    trust_remote_code=True
-                )
-            else:
-                # Load base model and wrap with PEFT adapter
-                base = AutoModelForCausalLM.from_pretrained(
-                    MODEL, 
-                    device_map="auto", 
-                    dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
-                    trust_remote_code=True
-                )
-                reviews_model = PeftModel.from_pretrained(base, ADAPTER_REVIEWS)
-            
-            reviews_model_loaded = True
-            print("Reviews/Ratings model loaded successfully!")
-            
-        except Exception as e:
-            print(f"Error loading reviews model: {e}")
-            reviews_model_loaded = False
-            raise e
+            # A valid object ends where the balanced-brace scan would; raw_decode gets there in C
+            return {"json": json_decoder.raw_decode(decoded, start)[0]}
+        except json.JSONDecodeError:
+            pass
+    scanner = JsonObjectScanner()
+    json_str = scanner.feed(decoded) or scanner.partial
+    if json_str is None:
+        return {"error": "no json found", "raw": decoded}
+    
+    try:
+        parsed = json.loads(json_str)
+        return {"json": parsed}
+    except json.JSONDecodeError as e:
+        return {"error": "json parse error", "raw": json_str, "decoded": decoded, "exception": str(e)}
 
-def build_prompt(text):
-    instr = "Extract product attributes as JSON with keys exactly: Brand_Name, Models, Colors, Sizes/Ounce, Designs, Pattern, Costumes, Team_Names, Styles, Sets, Flavors, Pack, Albums, Movies, Formats, Edition, Platform, Digital_Copy, Refurbished, Remanufactured, Pre-Owned. Focus especially on extracting detailed design features, visual elements, materials, and construction details for the Designs field. Respond ONLY with a JSON object. Use null for missing fields."
-    prompt = f"### Instruction:\n{instr}\n\n### Input:\n{text}\n\n### Output:\n"
-    return prompt
+def decode_continuation(tokenizer, generation_output, inputs):
+    """Decoded generated tokens of each row, without the (left-padded) prompt"""
+    prompt_length = int(inputs['input_ids'].shape[1])
+    return tokenizer.batch_decode(generation_output[:, prompt_length:], skip_special_tokens=True)
 
-def build_reviews_prompt(text):
-    instr = "Extract product reviews and ratings as JSON with keys exactly: Rating, Rating_Count, Review_Count. Respond ONLY with a JSON object. Use null for missing fields."
-    prompt = f"### Instruction:\n{instr}\n\n### Input:\n{text}\n\n### Output:\n"
-    return prompt
+def count_new_tokens(generation_output, prompt_length, eos_token_id):
+    """Generated tokens per batch, up to and including each row's first EOS (the rest is padding)"""
+    new_tokens = generation_output[:, prompt_length:]
+    total = 0
+    for row in new_tokens:
+        eos = (row == eos_token_id).nonzero()
+        total += int(eos[0]) + 1 if len(eos) else len(row)
+    return total
 
-def generate_json(text, max_new_tokens=256, temperature=0.0):
-    """Generate JSON extraction from product text"""
-    try:
-        load_model()
-        
-        prompt = build_prompt(text)
-        inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
-        
+def timed_generate(model, tokenizer, inputs, max_new_tokens, kind, drafter=None):
+    """Greedy generate() that records token counts and prefill/decode time in inference_stats
+
+    With a drafter, decodes speculatively (same output, fewer forward passes).
+    """
+    timer = inference_stats.start(model.device)
+    if drafter is not None:
+        generation_output = speculative_generate(model, inputs['input_ids'], drafter, max_new_tokens,
+                                                 tokenizer.eos_token_id, timer=timer, stats=inference_stats)
+    else:
         with torch.no_grad():
             generation_output = model.generate(
                 **inputs, 
                 max_new_tokens=max_new_tokens, 
                 do_sample=False,
-                pad_token_id=tokenizer.eos_token_id
+                pad_token_id=tokenizer.eos_token_id,
+                stopping_criteria=StoppingCriteriaList([timer])
             )
+    prompt_length = int(inputs['input_ids'].shape[1])
+    prompt_tokens = int(inputs['attention_mask'].sum()) if 'attention_mask' in inputs else prompt_length * len(inputs['input_ids'])
+    inference_stats.finish(timer, kind, prompt_tokens,
+                           count_new_tokens(generation_output, prompt_length, tokenizer.eos_token_id),
+                           batch_size=len(inputs['input_ids']))
+    return generation_output
+
+def get_batcher(kind, model, tokenizer):
+    """The continuous-batching decode loop for one loaded model, created on first use"""
+    with batchers_lock:
+        if kind not in batchers:
+            batchers[kind] = ContinuousBatcher(model, tokenizer, stats=inference_stats)
+        return batchers[kind]
+
+def generate_json(text, max_new_tokens=256, temperature=0.0):
+    """Generate JSON extraction from product text"""
+    try:
+        inference_stats.cache_event('model_load', attributes_manager.loaded)
+        load_model()
+        with attributes_manager.slot(), adapter_lock.reading():
+            tokenizer, model = attributes_manager.tokenizer, attributes_manager.model
+            prompt = build_prompt(text)
+            if CONTINUOUS_BATCHING:
+                decoded = get_batcher('attributes', model, tokenizer).submit(prompt, max_new_tokens, 'attributes')
+                return parse_json_output(decoded)
         
-        decoded = tokenizer.decode(generation_output[0], skip_special_tokens=True)
+            inputs = encode_prompts(tokenizer, ATTRIBUTES_INSTRUCTION, [text], model.device)
         
-        # Extract JSON from response
-        m = re.search(r'(\{.*\})', decoded, re.S)
-        if not m:
-            # fallback: try from last newline
-            try:
-                candidate = decoded.split("### Output:")[-1].strip()
-                m = re.search(r'(\{.*\})', candidate, re.S)
-            except Exception:
-                m = None
+            # Attribute values are copied from the input, so prompt n-grams make good drafts
+            drafter = NgramDrafter([inputs['input_ids'][0].tolist()]) if SPECULATIVE_DECODING else None
+            generation_output = timed_generate(model, tokenizer, inputs, max_new_tokens, 'attributes', drafter)
         
-        if not m:
-            return {"error": "no json found", "raw": decoded}
+            decoded = decode_continuation(tokenizer, generation_output, inputs)[0]
         
-        json_str = m.group(1)
-        try:
-            parsed = json.loads(json_str)
-            return {"json": parsed}
-        except json.JSONDecodeError as e:
-            return {"error": "json parse error", "raw": json_str, "decoded": decoded, "exception": str(e)}
+            return parse_json_output(decoded)
     
+    except ModelBusy:
+        raise
     except Exception as e:
         return {"error": f"Model inference error: {str(e)}"}
 
 def generate_reviews_json(text, max_new_tokens=128, temperature=0.0):
     """Generate JSON extraction for reviews and ratings"""
+    if REVIEWS_BACKEND in ('student', 'onnx'):
+        return generate_reviews_json_batch([text], max_new_tokens)[0]
     try:
+        inference_stats.cache_event('reviews_model_load', reviews_manager.loaded)
         load_reviews_model()
+        with reviews_manager.slot(), adapter_lock.reading():
+            reviews_tokenizer, reviews_model = reviews_manager.tokenizer, reviews_manager.model
+            prompt = build_reviews_prompt(text)
+            if CONTINUOUS_BATCHING:
+                decoded = get_batcher('reviews', reviews_model, reviews_tokenizer).submit(prompt, max_new_tokens, 'reviews')
+                return parse_json_output(decoded)
         
-        prompt = build_reviews_prompt(text)
-        inputs = reviews_tokenizer(prompt, return_tensors="pt").to(reviews_model.device)
+            inputs = encode_prompts(reviews_tokenizer, REVIEWS_INSTRUCTION, [text], reviews_model.device)
         
-        with torch.no_grad():
-            generation_output = reviews_model.generate(
-                **inputs, 
-                max_new_tokens=max_new_tokens, 
-                do_sample=False,
-                pad_token_id=reviews_tokenizer.eos_token_id
-            )
+            drafter = None
+            if SPECULATIVE_DECODING or REGEX_VERIFY:
+                prompt_ids = inputs['input_ids'][0].tolist()
+                candidate = candidate_token_ids(reviews_tokenizer, prompt, prompt_ids, render_reviews_candidate(text))
+                candidate.append(reviews_tokenizer.eos_token_id)
+            
+                if REGEX_VERIFY:
+                    timer = inference_stats.start(reviews_model.device)
+                    accepted, _ = verify_candidate(reviews_model, inputs['input_ids'], candidate)
+                    timer(inputs['input_ids'], None)
+                    inference_stats.finish(timer, 'reviews_verify', len(prompt_ids) + len(candidate), 0)
+                    inference_stats.cache_event('regex_verify', accepted)
+                    if accepted:
+                        return parse_json_output(reviews_tokenizer.decode(candidate, skip_special_tokens=True))
+            
+                if SPECULATIVE_DECODING:
+                    drafter = NgramDrafter([candidate, prompt_ids])
+            generation_output = timed_generate(reviews_model, reviews_tokenizer, inputs, max_new_tokens, 'reviews', drafter)
         
-        decoded = reviews_tokenizer.decode(generation_output[0], skip_special_tokens=True)
+            decoded = decode_continuation(reviews_tokenizer, generation_output, inputs)[0]
         
-        # Extract JSON from response
-        m = re.search(r'(\{.*\})', decoded, re.S)
-        if not m:
-            # fallback: try from last newline
-            try:
-                candidate = decoded.split("### Output:")[-1].strip()
-                m = re.search(r'(\{.*\})', candidate, re.S)
-            except Exception:
-                m = None
+            return parse_json_output(decoded)
+    
+    except ModelBusy:
+        raise
+    except Exception as e:
+        return {"error": f"Reviews model inference error: {str(e)}"}
+
+def generate_reviews_json_batch(texts, max_new_tokens=128):
+    """generate_reviews_json for several texts in one padded generate() call
+
+    Returns one result dict per text, in order.
+    """
+    if REVIEWS_BACKEND == 'student':
+        try:
+            from student_model import generate_student_json_batch
+            with reviews_manager.slot():
+                return generate_student_json_batch(texts, max_new_tokens, stats=inference_stats)
+        except ModelBusy:
+            raise
+        except Exception as e:
+            return [{"error": f"Student model inference error: {str(e)}"} for _ in texts]
+    if REVIEWS_BACKEND == 'onnx':
+        try:
+            from onnx_backend import generate_onnx_json_batch
+            with reviews_manager.slot():
+                return generate_onnx_json_batch(texts, max_new_tokens, stats=inference_stats)
+        except ModelBusy:
+            raise
+        except Exception as e:
+            return [{"error": f"ONNX model inference error: {str(e)}"} for _ in texts]
+    try:
+        inference_stats.cache_event('reviews_model_load', reviews_manager.loaded)
+        load_reviews_model()
+        with reviews_manager.slot(), adapter_lock.reading():
+            reviews_tokenizer, reviews_model = reviews_manager.tokenizer, reviews_manager.model
+            inputs = encode_prompts(reviews_tokenizer, REVIEWS_INSTRUCTION, texts, reviews_model.device)
         
-        if not m:
-            return {"error": "no json found", "raw": decoded}
+            generation_output = timed_generate(reviews_model, reviews_tokenizer, inputs, max_new_tokens, 'reviews')
         
-        json_str = m.group(1)
-        try:
-            parsed = json.loads(json_str)
-            return {"json": parsed}
-        except json.JSONDecodeError as e:
-            return {"error": "json parse error", "raw": json_str, "decoded": decoded, "exception": str(e)}
+            decoded = decode_continuation(reviews_tokenizer, generation_output, inputs)
+            return [parse_json_output(d) for d in decoded]
     
+    except ModelBusy:
+        raise
     except Exception as e:
-        return {"error": f"Reviews model inference error: {str(e)}"}
+        return [{"error": f"Reviews model inference error: {str(e)}"} for _ in texts]
 
 def extract_reviews_ratings(product_data):
     """Extract reviews and ratings using the trained model"""
@@ -368,4 +560,5 @@ if __name__ == "__main__":
     # Example
     text = "Title: \"Acme UltraSneak 3000 - Men's Running Shoes - Blue/White - Size 10\" Description: \"Lightweight, breathable mesh, EVA sole. Price: $89.99\""
     out = generate_json(text)
-    print(json.dumps(out, indent=2, ensure_ascii=False))
\ No newline at end of file
+    print(json.dumps(out, indent=2, ensure_ascii=False))
+    print(json.dumps(inference_stats.summary(), indent=2))
\ No newline at end of file
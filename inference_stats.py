@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Inference instrumentation for inference.py
+Records prompt/generated token counts, prefill and decode time, cache hits
+and peak memory for every generate call, and aggregates them for capacity
+planning.
+
+Usage:
+    from inference import inference_stats
+    inference_stats.summary()   # tokens/s, prompt-length percentiles, cache hit rates, memory
+    inference_stats.recent(10)  # last 10 per-call records
+    inference_stats.reset()
+
+Set INFERENCE_STATS_LOG=path.jsonl to append one JSON line per call.
+"""
+
+import os
+import json
+import time
+import threading
+from collections import deque
+
+import torch
+from transformers import StoppingCriteria
+
+from perf_utils import percentile, peak_rss_mb
+
+INFERENCE_STATS_LOG = os.environ.get("INFERENCE_STATS_LOG")
+MAX_RECORDS = 10000  # per-call records kept for percentiles
+
+
+class FirstTokenTimer(StoppingCriteria):
+    """Stopping criterion that never stops, only notes when the first new token exists
+
+    generate() checks stopping criteria after every decoding step, so the
+    first call marks the end of prefill (prompt forward pass + first token).
+    """
+
+    def __init__(self):
+        self.first_token_time = None
+
+    def __call__(self, input_ids, scores, **kwargs):
+        if self.first_token_time is None:
+            self.first_token_time = time.perf_counter()
+        return torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+
+
+def peak_memory_mb(device):
+    """Peak allocator memory on CUDA (since the last reset), else the process's lifetime peak RSS"""
+    if device is not None and getattr(device, 'type', None) == 'cuda':
+        return round(torch.cuda.max_memory_allocated(device) / (1024 * 1024), 1)
+    return peak_rss_mb()
+
+
+def peak_memory_scope(device):
+    """What peak_memory_mb covers: 'call' (CUDA peak since start(); exact only with INFERENCE_CONCURRENCY=1,
+    overlapping calls reset each other's peak) or 'process' (lifetime peak RSS, not attributable to a call)"""
+    return 'call' if device is not None and getattr(device, 'type', None) == 'cuda' else 'process'
+
+
+class InferenceStats:
+    """Per-call inference records plus running totals"""
+
+    def __init__(self, log_path=INFERENCE_STATS_LOG, max_records=MAX_RECORDS):
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        self._records = deque(maxlen=max_records)
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._records.clear()
+            self.calls = 0
+            self.prompt_tokens = 0
+            self.generated_tokens = 0
+            self.decode_tokens = 0
+            self.prefill_s = 0.0
+            self.decode_s = 0.0
+            self.cache_hits = {}  # name -> [hits, lookups]
+            self.peak_memory_mb = None
+            self.peak_memory_scope = None
+
+    def cache_event(self, name, hit):
+        """Count a lookup in a named cache (model load, tokenized prefix, ...)"""
+        with self._lock:
+            counts = self.cache_hits.setdefault(name, [0, 0])
+            counts[0] += int(bool(hit))
+            counts[1] += 1
+
+    def start(self, device=None):
+        """Call before generate(); returns the timer to pass as a stopping criterion"""
+        if device is not None and getattr(device, 'type', None) == 'cuda':
+            torch.cuda.reset_peak_memory_stats(device)
+        timer = FirstTokenTimer()
+        timer.start_time = time.perf_counter()
+        timer.device = device
+        return timer
+
+    def finish(self, timer, kind, prompt_tokens, generated_tokens, batch_size=1):
+        """Call after generate(); records and returns the per-call stats"""
+        end = time.perf_counter()
+        first = timer.first_token_time or end
+        prefill_s = first - timer.start_time
+        decode_s = end - first
+        # The first token comes out of the prefill step
+        decode_tokens = max(generated_tokens - batch_size, 0)
+        record = {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'kind': kind,
+            'batch_size': batch_size,
+            'prompt_tokens': prompt_tokens,
+            'generated_tokens': generated_tokens,
+            'prefill_ms': round(prefill_s * 1000, 2),
+            'decode_ms': round(decode_s * 1000, 2),
+            'total_ms': round((end - timer.start_time) * 1000, 2),
+            'prefill_tokens_per_s': round(prompt_tokens / prefill_s, 1) if prefill_s else None,
+            'decode_tokens_per_s': round(decode_tokens / decode_s, 1) if decode_s else None,
+            'peak_memory_mb': peak_memory_mb(timer.device),
+            'peak_memory_scope': peak_memory_scope(timer.device),
+        }
+
+        with self._lock:
+            self._records.append(record)
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.generated_tokens += generated_tokens
+            self.decode_tokens += decode_tokens
+            self.prefill_s += prefill_s
+            self.decode_s += decode_s
+            if record['peak_memory_mb'] is not None:
+                self.peak_memory_mb = max(self.peak_memory_mb or 0, record['peak_memory_mb'])
+                self.peak_memory_scope = record['peak_memory_scope']
+
+        if self.log_path:
+            try:
+                with open(self.log_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record) + '\n')
+            except OSError as e:
+                print(f"[WARNING] Could not write inference stats log: {e}")
+        return record
+
+    def recent(self, n=None):
+        with self._lock:
+            records = list(self._records)
+        return records[-n:] if n else records
+
+    def summary(self):
+        """Aggregates over all calls since the last reset"""
+        with self._lock:
+            records = list(self._records)
+            prompt_lengths = sorted(r['prompt_tokens'] for r in records)
+            latencies = sorted(r['total_ms'] for r in records)
+            return {
+                'calls': self.calls,
+                'prompt_tokens': self.prompt_tokens,
+                'generated_tokens': self.generated_tokens,
+                'prefill_tokens_per_s': round(self.prompt_tokens / self.prefill_s, 1) if self.prefill_s else None,
+                'decode_tokens_per_s': round(self.decode_tokens / self.decode_s, 1) if self.decode_s else None,
+                'prompt_tokens_p50': percentile(prompt_lengths, 50),
+                'prompt_tokens_p95': percentile(prompt_lengths, 95),
+                'prompt_tokens_max': prompt_lengths[-1] if prompt_lengths else None,
+                'latency_ms_p50': round(percentile(latencies, 50), 2) if latencies else None,
+                'latency_ms_p95': round(percentile(latencies, 95), 2) if latencies else None,
+                'cache_hit_rate': {name: round(hits / lookups, 4) for name, (hits, lookups) in self.cache_hits.items()},
+                'peak_memory_mb': self.peak_memory_mb,
+                'peak_memory_scope': self.peak_memory_scope,
+            }
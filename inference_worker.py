@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local inference worker: one process per host owns the models
+Web workers (several Flask/gunicorn processes) would each import inference
+and load their own model copy. With INFERENCE_WORKER=1 they send requests
+to this process instead, over a Unix socket (a named pipe on Windows)
+using multiprocessing.connection, so the host holds one model however many
+web workers it runs.
+
+Only small control messages go through the socket. Request and result
+payloads (JSON) are written to shared memory blocks: each connection has one
+block per direction, owned by the writing side, reused for every message
+and replaced by a larger one when a payload does not fit. A side never
+writes its block again before the other side has answered, so no copy is
+needed for isolation.
+
+Concurrency and backpressure come from inference.py's ModelManager: each
+connection is served by its own thread, and a full queue comes back to the
+caller as ModelBusy (503 in app_model_ratings.py).
+
+Usage:
+    python inference_worker.py --preload reviews        # start it once per host
+    INFERENCE_WORKER=1 python app_model_ratings.py      # web workers use it
+
+    from inference_worker import client
+    client.generate_reviews_json_batch([text1, text2])
+"""
+
+import os
+import sys
+import json
+import time
+import secrets
+import argparse
+import threading
+from multiprocessing import shared_memory, resource_tracker
+from multiprocessing.connection import Listener, Client
+
+from model_manager import ModelBusy
+
+INFERENCE_WORKER = os.environ.get("INFERENCE_WORKER", "0") == "1"
+INFERENCE_WORKER_SOCKET = os.environ.get(
+    "INFERENCE_WORKER_SOCKET", r"\\.\pipe\inference-worker" if sys.platform == 'win32' else "/tmp/inference-worker.sock")
+INFERENCE_WORKER_AUTHKEY = os.environ.get("INFERENCE_WORKER_AUTHKEY", "").encode() or None
+INFERENCE_WORKER_TIMEOUT = float(os.environ.get("INFERENCE_WORKER_TIMEOUT", "300"))  # seconds for a reply
+MIN_BLOCK_SIZE = 64 * 1024
+BLOCK_PREFIX = "infw-"  # shared memory block names: infw-<owner pid>-<random>
+
+
+def attach(name):
+    """Map a block another process owns without adopting it (its owner unlinks it)"""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    if os.name == 'posix':
+        # Before 3.13 attaching registers the block for unlinking when this process exits
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+class SharedBuffer:
+    """Shared memory block this side writes messages into, grown when a payload does not fit"""
+
+    def __init__(self):
+        self.shm = None
+
+    def write(self, data):
+        """Store data, return the (block name, size) to send to the reader"""
+        if self.shm is None or self.shm.size < len(data):
+            self.release()
+            size = MIN_BLOCK_SIZE
+            while size < len(data):
+                size *= 2
+            name = f"{BLOCK_PREFIX}{os.getpid()}-{secrets.token_hex(6)}"
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.shm.buf[:len(data)] = data
+        return self.shm.name, len(data)
+
+    def release(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+
+class SharedView:
+    """The reading side of the other process's SharedBuffer"""
+
+    def __init__(self):
+        self.shm = None
+
+    def read(self, name, size):
+        if self.shm is None or self.shm.name != name:
+            self.close()
+            self.shm = attach(name)
+        return bytes(self.shm.buf[:size])
+
+    def close(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm = None
+
+
+class Channel:
+    """One connection with its two shared memory blocks; used by one thread at a time"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.out = SharedBuffer()
+        self.view = SharedView()
+
+    def send(self, message, payload=None):
+        if payload is not None:
+            message['payload'] = self.out.write(json.dumps(payload, ensure_ascii=False).encode('utf-8'))
+        self.conn.send(message)
+
+    def recv(self, timeout=None):
+        if timeout is not None and not self.conn.poll(timeout):
+            raise TimeoutError(f"No reply from the inference worker after {timeout:g}s")
+        message = self.conn.recv()
+        payload = json.loads(self.view.read(*message['payload'])) if 'payload' in message else None
+        return message, payload
+
+    def close(self):
+        try:
+            self.conn.close()
+        finally:
+            self.view.close()
+            self.out.release()
+
+
+# ---- worker side ----
+
+def run_op(op, payload, kwargs):
+    import inference
+    if op == 'reviews':
+        return inference.generate_reviews_json(payload, **kwargs)
+    if op == 'reviews_batch':
+        return inference.generate_reviews_json_batch(payload, **kwargs)
+    if op == 'attributes':
+        return inference.generate_json(payload, **kwargs)
+    if op == 'swap_adapter':
+        return inference.swap_adapter(**kwargs)
+    if op == 'status':
+        return {'pid': os.getpid(),
+                'reviews': inference.reviews_manager.status(),
+                'attributes': inference.attributes_manager.status(),
+                'stats': inference.inference_stats.summary()}
+    if op == 'ping':
+        return payload
+    raise ValueError(f"Unknown op: {op}")
+
+
+def serve_connection(conn):
+    channel = Channel(conn)
+    try:
+        while True:
+            try:
+                message, payload = channel.recv()
+            except EOFError:
+                break
+            try:
+                result = run_op(message['op'], payload, message.get('kwargs') or {})
+                channel.send({'ok': True}, result)
+            except ModelBusy as e:
+                channel.send({'busy': str(e)})
+            except Exception as e:
+                channel.send({'error': f"{type(e).__name__}: {e}"})
+    except (EOFError, OSError) as e:
+        print(f"[WARNING] Inference worker connection dropped: {e}")
+    finally:
+        channel.close()
+
+
+def serve(address=INFERENCE_WORKER_SOCKET, preload=()):
+    """Accept web worker connections until interrupted, one thread per connection"""
+    if os.name == 'posix' and os.path.exists(address):
+        try:
+            Client(address, authkey=INFERENCE_WORKER_AUTHKEY).close()
+            print(f"[ERROR] An inference worker is already listening on {address}")
+            return 1
+        except OSError:
+            os.unlink(address)  # left over from a worker that did not shut down
+
+    import inference
+    for kind in preload:
+        (inference.load_reviews_model if kind == 'reviews' else inference.load_model)()
+
+    listener = Listener(address, authkey=INFERENCE_WORKER_AUTHKEY)
+    if os.name == 'posix':
+        os.chmod(address, 0o600)  # only this user's web workers
+    print(f"[INFO] Inference worker {os.getpid()} listening on {address}")
+    try:
+        while True:
+            try:
+                conn = listener.accept()
+            except (OSError, EOFError) as e:  # e.g. a client that failed authentication
+                print(f"[WARNING] Rejected connection: {e}")
+                continue
+            threading.Thread(target=serve_connection, args=(conn,), name="inference-conn", daemon=True).start()
+    except KeyboardInterrupt:
+        print("[INFO] Inference worker stopping")
+    finally:
+        listener.close()
+    return 0
+
+
+# ---- web worker side ----
+
+class InferenceClient:
+    """Calls the inference worker; safe to share between threads (each call borrows a pooled connection)"""
+
+    def __init__(self, address=INFERENCE_WORKER_SOCKET, timeout=INFERENCE_WORKER_TIMEOUT):
+        self.address = address
+        self.timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def call(self, op, payload=None, **kwargs):
+        for attempt in range(2):
+            with self._lock:
+                channel = self._idle.pop() if self._idle else None
+            reused = channel is not None
+            if channel is None:
+                channel = Channel(Client(self.address, authkey=INFERENCE_WORKER_AUTHKEY))
+            try:
+                channel.send({'op': op, 'kwargs': kwargs}, payload)
+                reply, result = channel.recv(self.timeout)
+            except TimeoutError:
+                channel.close()  # the reply may still arrive on it
+                raise
+            except (EOFError, OSError) as e:
+                channel.close()
+                if reused and attempt == 0:
+                    continue  # the worker restarted since this connection was pooled
+                raise ConnectionError(f"Inference worker unavailable at {self.address}: {e}")
+            except BaseException:
+                channel.close()
+                raise
+            with self._lock:
+                self._idle.append(channel)
+            break
+
+        if 'busy' in reply:
+            raise ModelBusy(reply['busy'])
+        if 'error' in reply:
+            raise RuntimeError(f"Inference worker: {reply['error']}")
+        return result
+
+    def generate_reviews_json(self, text, max_new_tokens=128):
+        return self.call('reviews', text, max_new_tokens=max_new_tokens)
+
+    def generate_reviews_json_batch(self, texts, max_new_tokens=128):
+        return self.call('reviews_batch', list(texts), max_new_tokens=max_new_tokens)
+
+    def generate_json(self, text, max_new_tokens=256):
+        return self.call('attributes', text, max_new_tokens=max_new_tokens)
+
+    def swap_adapter(self, kind, version):
+        return self.call('swap_adapter', kind=kind, version=version)
+
+    def status(self):
+        return self.call('status')
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for channel in idle:
+            channel.close()
+
+
+client = InferenceClient()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve inference.py to the web workers on this host")
+    parser.add_argument('--socket', default=INFERENCE_WORKER_SOCKET,
+                        help=f"Unix socket path or Windows pipe name (default: {INFERENCE_WORKER_SOCKET})")
+    parser.add_argument('--preload', default='', help="comma-separated models to load at startup: reviews,attributes")
+    parser.add_argument('--status', action='store_true', help="print a running worker's status and exit")
+    args = parser.parse_args(argv)
+
+    if args.status:
+        start = time.perf_counter()
+        status = InferenceClient(args.socket).status()
+        status['round_trip_ms'] = round((time.perf_counter() - start) * 1000, 2)
+        print(json.dumps(status, indent=2))
+        return 0
+    preload = [kind.strip() for kind in args.preload.split(',') if kind.strip()]
+    for kind in preload:
+        if kind not in ('reviews', 'attributes'):
+            parser.error(f"Unknown model to preload: {kind}")
+    return serve(args.socket, preload)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Balanced-brace scanner for the JSON object at the start of a model completion
+inference.py used to search the whole decoded prompt + completion with a
+greedy regex (\\{.*\\}), then search again from the "### Output:" marker.
+The regex runs from the first "{" to the last "}" in the string, so a brace
+in the product text or after the answer breaks the match.
+
+JsonObjectScanner only looks at the generated tokens. It tracks the nesting
+depth and JSON strings, so braces inside "..." are ignored. It returns as
+soon as the first top-level object closes and ignores anything after it.
+Text can be fed in pieces (e.g. token by token while decoding); only
+structural characters ({ } " \\) are visited, found with one compiled regex.
+
+Usage:
+    find_json_object('{"Rating": 4.2} trailing {junk')   # '{"Rating": 4.2}'
+
+    scanner = JsonObjectScanner()
+    for piece in pieces:
+        obj = scanner.feed(piece)
+        if obj is not None:
+            break
+"""
+
+import re
+
+_SPECIAL = re.compile(r'[{}"\\]')
+
+
+class JsonObjectScanner:
+    """Finds the first complete top-level {...} in text fed piece by piece"""
+
+    def __init__(self):
+        self.text = ''
+        self.start = None  # index of the opening brace
+        self.pos = 0       # next index to scan
+        self.depth = 0
+        self.in_string = False
+        self.result = None
+
+    @property
+    def partial(self):
+        """Text from the opening brace when the object has not closed yet (e.g. max_new_tokens hit)"""
+        if self.start is None or self.result is not None:
+            return None
+        return self.text[self.start:]
+
+    def feed(self, chunk):
+        """Add text; returns the object string once it is complete, else None"""
+        if self.result is not None:
+            return self.result
+        self.text += chunk
+        text = self.text
+        if self.start is None:
+            start = text.find('{', self.pos)
+            if start < 0:
+                self.pos = len(text)
+                return None
+            self.start = start
+            self.depth = 1
+            self.pos = start + 1
+
+        search = _SPECIAL.search
+        pos = self.pos
+        while True:
+            m = search(text, pos)
+            if m is None:
+                self.pos = max(pos, len(text))  # past an escaped character still to come
+                return None
+            char = m.group()
+            pos = m.end()
+            if self.in_string:
+                if char == '"':
+                    self.in_string = False
+                elif char == '\\':
+                    pos += 1  # skip the escaped character (it may not have arrived yet)
+            elif char == '"':
+                self.in_string = True
+            elif char == '{':
+                self.depth += 1
+            elif char == '}':
+                self.depth -= 1
+                if self.depth == 0:
+                    self.pos = pos
+                    self.result = text[self.start:pos]
+                    return self.result
+
+
+def find_json_object(text):
+    """The first complete top-level JSON object in text, or None"""
+    return JsonObjectScanner().feed(text)
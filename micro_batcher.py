@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dynamic micro-batching for model requests
+Concurrent callers submit one item each; a single worker thread collects
+whatever arrives within MAX_WAIT_MS (up to MAX_BATCH_SIZE items) and runs
+them through one batched function call, then hands each caller its result.
+
+Only the worker thread touches the model, so request threads never share it.
+At most BATCH_MAX_QUEUE items wait; submit() raises ModelBusy beyond that.
+
+Usage:
+    from inference import generate_reviews_json_batch
+    batcher = MicroBatcher(generate_reviews_json_batch)
+    result = batcher.submit(text)   # blocks until the batch containing text is done
+"""
+
+import os
+import time
+import queue
+import threading
+
+from model_manager import ModelBusy
+
+MAX_BATCH_SIZE = int(os.environ.get("BATCH_MAX_SIZE", "8"))
+MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", "10"))
+MAX_QUEUE = int(os.environ.get("BATCH_MAX_QUEUE", "64"))  # 0: unbounded
+
+
+class _Pending:
+    """One submitted item waiting for its result"""
+
+    def __init__(self, item):
+        self.item = item
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """Runs batch_fn(list_of_items) -> list_of_results over concurrently submitted items"""
+
+    def __init__(self, batch_fn, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS, max_queue=MAX_QUEUE):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue(maxsize=max(0, max_queue))
+        self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, item, timeout=None):
+        """Queue one item and block until its result is ready"""
+        pending = _Pending(item)
+        try:
+            self._queue.put_nowait(pending)
+        except queue.Full:
+            raise ModelBusy(f"Batch queue full ({self._queue.maxsize} waiting)")
+        if not pending.done.wait(timeout):
+            raise TimeoutError("Timed out waiting for the model")
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _collect(self):
+        """Block for the first item, then take more until the batch is full or max_wait passes"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                results = self.batch_fn([p.item for p in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"Batch function returned {len(results)} results for {len(batch)} items")
+                for pending, result in zip(batch, results):
+                    pending.result = result
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+            finally:
+                for pending in batch:
+                    pending.done.set()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Thread-safe model ownership and admission control for inference.py
+A ModelManager loads its model once, however many request threads ask for
+it at the same time (a second concurrent 7B load would run out of memory),
+and bounds inference on it:
+
+- at most INFERENCE_CONCURRENCY calls generate at once (1: calls never
+  interleave on the model)
+- at most INFERENCE_QUEUE_SIZE more wait for a slot; the next caller gets
+  ModelBusy straight away instead of queueing behind them
+- a waiting caller gives up with ModelBusy after INFERENCE_TIMEOUT seconds
+
+init_app() turns ModelBusy into 503 Service Unavailable with a Retry-After
+header, so clients back off instead of piling up requests.
+
+Usage:
+    manager = ModelManager('reviews', load_fn)     # load_fn() -> (tokenizer, model)
+    tokenizer, model = manager.load()
+    with manager.slot():
+        model.generate(...)
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+
+INFERENCE_CONCURRENCY = int(os.environ.get("INFERENCE_CONCURRENCY", "1"))
+INFERENCE_QUEUE_SIZE = int(os.environ.get("INFERENCE_QUEUE_SIZE", "16"))
+INFERENCE_TIMEOUT = float(os.environ.get("INFERENCE_TIMEOUT", "60"))  # seconds waiting for a slot, 0: no limit
+RETRY_AFTER = 1  # seconds, sent with 503 responses
+
+
+class ModelBusy(RuntimeError):
+    """The inference queue is full, or no slot freed up within the timeout"""
+
+
+class ModelManager:
+    """One model and its tokenizer: loaded once, used by a bounded number of threads at a time"""
+
+    def __init__(self, name, loader, concurrency=INFERENCE_CONCURRENCY, queue_size=INFERENCE_QUEUE_SIZE,
+                 timeout=INFERENCE_TIMEOUT):
+        self.name = name
+        self.loader = loader
+        self.concurrency = max(1, concurrency)
+        self.queue_size = max(0, queue_size)
+        self.timeout = timeout
+        self.tokenizer = None
+        self.model = None
+        self._load_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._state_lock = threading.Lock()
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    @property
+    def loaded(self):
+        return self.model is not None
+
+    def load(self):
+        """(tokenizer, model), calling the loader only the first time; a failed load is retried next call"""
+        if self.model is None:
+            with self._load_lock:
+                if self.model is None:
+                    tokenizer, model = self.loader()
+                    self.tokenizer = tokenizer
+                    self.model = model
+        return self.tokenizer, self.model
+
+    def set_model(self, model):
+        """Replace the loaded model (e.g. after wrapping it in an adapter)"""
+        with self._load_lock:
+            self.model = model
+
+    @contextmanager
+    def slot(self, timeout=None):
+        """Hold one of the inference slots; raises ModelBusy when the queue is full or the wait times out"""
+        timeout = self.timeout if timeout is None else timeout
+        with self._state_lock:
+            if self.waiting >= self.queue_size and self.active >= self.concurrency:
+                self.rejected += 1
+                raise ModelBusy(f"{self.name} model busy: {self.active} running, {self.waiting} queued")
+            self.waiting += 1
+        acquired = False
+        try:
+            acquired = self._slots.acquire(timeout=timeout if timeout and timeout > 0 else None)
+        finally:
+            with self._state_lock:
+                self.waiting -= 1
+                if not acquired:
+                    self.timeouts += 1
+        if not acquired:
+            raise ModelBusy(f"{self.name} model busy: no slot free after {timeout:g}s")
+
+        with self._state_lock:
+            self.active += 1
+        try:
+            yield
+        finally:
+            with self._state_lock:
+                self.active -= 1
+            self._slots.release()
+
+    def status(self):
+        with self._state_lock:
+            return {'loaded': self.loaded, 'concurrency': self.concurrency, 'queue_size': self.queue_size,
+                    'active': self.active, 'waiting': self.waiting, 'rejected': self.rejected,
+                    'timeouts': self.timeouts}
+
+
+def busy_response(error):
+    """Flask response for ModelBusy: 503 with Retry-After"""
+    from flask import jsonify
+    response = jsonify({'success': False, 'error': str(error), 'retry_after': RETRY_AFTER})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(RETRY_AFTER)
+    return response
+
+
+def init_app(app):
+    """Answer ModelBusy raised by a route with 503 Service Unavailable"""
+    app.register_error_handler(ModelBusy, busy_response)
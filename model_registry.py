@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local model/adapter registry for offline (air-gapped) nodes
+Pins the base model and each adapter version to a local directory and the
+SHA-256 of every file in it. inference.py loads from the pinned paths with
+local_files_only (no HF hub lookups) and safetensors weights, which are
+memory-mapped instead of read and copied.
+
+registry.json:
+    {
+      "base": {"path": "models/Llama-2-7b-chat-hf",
+               "files": {"model-00001-of-00002.safetensors": "<sha256>", ...},
+               "stamps": {"model-00001-of-00002.safetensors": [<size>, <mtime_ns>], ...}},
+      "adapters": {
+        "reviews": {"active": "v2", "versions": {"v1": {"path": ..., "files": {...}}, "v2": {...}}},
+        "attributes": {...}
+      }
+    }
+
+Usage:
+    python model_registry.py pin-base models/Llama-2-7b-chat-hf
+    python model_registry.py pin-adapter reviews v2 output-llama-lora-reviews-ratings-v2
+    python model_registry.py verify
+    python model_registry.py list
+
+    POST /admin/adapter {"kind": "reviews", "version": "v2"}   # hot-swap in a running app
+        (header X-Admin-Token: $ADMIN_TOKEN; without ADMIN_TOKEN only from localhost)
+"""
+
+import os
+import sys
+import json
+import hmac
+import hashlib
+import argparse
+import threading
+from contextlib import contextmanager
+
+MODEL_REGISTRY = os.environ.get("MODEL_REGISTRY", "registry.json")
+# Set MODEL_REGISTRY_VERIFY=full to re-hash pinned files on every load, not
+# only the ones whose size/mtime changed since they were pinned
+MODEL_REGISTRY_VERIFY = os.environ.get("MODEL_REGISTRY_VERIFY", "stamp")
+HASH_CHUNK = 8 * 1024 * 1024
+# Shared secret for POST /admin/adapter (X-Admin-Token header); unset: loopback callers only
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+LOOPBACK_ADDRS = ('127.0.0.1', '::1', '::ffff:127.0.0.1')
+
+# Files that make up a checkpoint; anything else in the directory (logs, optimizer state) is ignored
+CHECKPOINT_SUFFIXES = ('.safetensors', '.json', '.model', '.txt', '.bin', '.tiktoken')
+SKIP_FILES = ('trainer_state.json', 'training_args.bin', 'optimizer.pt', 'scheduler.pt')
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_stamp(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def checkpoint_files(directory):
+    """Relative paths of the checkpoint files in a directory, sorted"""
+    files = []
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if name.endswith(CHECKPOINT_SUFFIXES) and name not in SKIP_FILES:
+                files.append(os.path.relpath(os.path.join(root, name), directory).replace('\\', '/'))
+    return sorted(files)
+
+
+class ReadWriteLock:
+    """Many readers (generation calls) or one writer (adapter swap)"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+
+    def acquire_read(self):
+        with self._cond:
+            while self._writer:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    @contextmanager
+    def reading(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    def acquire_write(self):
+        with self._cond:
+            while self._writer:
+                self._cond.wait()
+            self._writer = True
+            while self._readers:
+                self._cond.wait()
+
+    def release_write(self):
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+
+class ModelRegistry:
+    """Pinned base/adapter checkpoints stored in a JSON file"""
+
+    def __init__(self, path=MODEL_REGISTRY, data=None):
+        self.path = path
+        self.data = data or {'base': None, 'adapters': {}}
+
+    @classmethod
+    def load(cls, path=MODEL_REGISTRY):
+        """The registry at path, or None if there is none (hub/relative-path mode)"""
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(path, json.load(f))
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    # -- pinning --
+
+    def _entry(self, directory):
+        if not os.path.isdir(directory):
+            raise FileNotFoundError(f"Checkpoint directory not found: {directory}")
+        files = checkpoint_files(directory)
+        if any(f.endswith('.bin') for f in files) and not any(f.endswith('.safetensors') for f in files):
+            print(f"[WARNING] {directory} has only .bin weights - convert to safetensors for mmap loading")
+        return {'path': directory,
+                'files': {f: file_sha256(os.path.join(directory, f)) for f in files},
+                'stamps': {f: file_stamp(os.path.join(directory, f)) for f in files}}
+
+    def pin_base(self, directory):
+        self.data['base'] = self._entry(directory)
+
+    def pin_adapter(self, kind, version, directory, activate=True):
+        adapter = self.data['adapters'].setdefault(kind, {'active': None, 'versions': {}})
+        adapter['versions'][version] = self._entry(directory)
+        if activate or adapter['active'] is None:
+            adapter['active'] = version
+
+    # -- resolving --
+
+    def verify(self, entry, full=MODEL_REGISTRY_VERIFY == 'full'):
+        """Check the pinned files' hashes and return the checkpoint path
+
+        Files whose size and mtime still match the pin are trusted unless full=True,
+        so a warm start does not re-read gigabytes of weights.
+        """
+        stamps = entry.get('stamps', {})
+        for name, expected in entry['files'].items():
+            path = os.path.join(entry['path'], name)
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Pinned file missing: {path}")
+            stamp = file_stamp(path)
+            if not full and stamps.get(name) == stamp:
+                continue
+            actual = file_sha256(path)
+            if actual != expected:
+                raise ValueError(f"Hash mismatch for {path}: pinned {expected[:12]}, found {actual[:12]}")
+            stamps[name] = stamp
+        entry['stamps'] = stamps
+        return entry['path']
+
+    def base_path(self):
+        if not self.data.get('base'):
+            raise KeyError("No base model pinned in the registry")
+        return self.verify(self.data['base'])
+
+    def adapter_path(self, kind, version=None):
+        """Verified path of an adapter version (default: the active one), None if the kind is not pinned"""
+        adapter = self.data['adapters'].get(kind)
+        if not adapter:
+            return None
+        version = version or adapter['active']
+        if version not in adapter['versions']:
+            raise KeyError(f"Adapter {kind} has no version {version}")
+        return self.verify(adapter['versions'][version])
+
+    def active_version(self, kind):
+        adapter = self.data['adapters'].get(kind)
+        return adapter['active'] if adapter else None
+
+    def set_active(self, kind, version):
+        self.data['adapters'][kind]['active'] = version
+        self.save()
+
+
+def init_app(app, swap_adapter=None):
+    """Add POST /admin/adapter to a Flask app: swap the active adapter version without restarting
+
+    swap_adapter defaults to inference.swap_adapter (the model in this process).
+    Callers must send X-Admin-Token matching ADMIN_TOKEN, or, when it is not
+    set, connect from localhost - the apps listen on 0.0.0.0.
+    """
+    from flask import request, jsonify
+
+    def authorized():
+        if ADMIN_TOKEN:
+            return hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN)
+        return request.remote_addr in LOOPBACK_ADDRS
+
+    def swap():
+        if not authorized():
+            print(f"[WARNING] Rejected adapter swap from {request.remote_addr}")
+            return jsonify({'success': False, 'error': 'forbidden'}), 403
+        data = request.json or {}
+        try:
+            swap_fn = swap_adapter
+            if swap_fn is None:
+                import inference
+                swap_fn = inference.swap_adapter
+            previous = swap_fn(data.get('kind', 'reviews'), data['version'])
+            return jsonify({'success': True, 'kind': data.get('kind', 'reviews'),
+                            'version': data['version'], 'previous': previous})
+        except Exception as e:
+            print(f"[ERROR] Adapter swap failed: {e}")
+            return jsonify({'success': False, 'error': str(e)}), 400
+
+    app.add_url_rule('/admin/adapter', 'swap_adapter', swap, methods=['POST'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pin and verify local model/adapter checkpoints")
+    parser.add_argument('--registry', default=MODEL_REGISTRY, help=f"registry file (default: {MODEL_REGISTRY})")
+    sub = parser.add_subparsers(dest='command', required=True)
+    base = sub.add_parser('pin-base', help="pin the base model directory")
+    base.add_argument('directory')
+    adapter = sub.add_parser('pin-adapter', help="pin an adapter version")
+    adapter.add_argument('kind', help="reviews or attributes")
+    adapter.add_argument('version')
+    adapter.add_argument('directory')
+    adapter.add_argument('--no-activate', action='store_true', help="pin without making it the active version")
+    sub.add_parser('verify', help="re-hash every pinned file")
+    sub.add_parser('list', help="show pinned checkpoints")
+    args = parser.parse_args(argv)
+
+    registry = ModelRegistry.load(args.registry) or ModelRegistry(args.registry)
+    if args.command == 'pin-base':
+        registry.pin_base(args.directory)
+        registry.save()
+        print(f"[INFO] Pinned base model {args.directory} ({len(registry.data['base']['files'])} files)")
+    elif args.command == 'pin-adapter':
+        registry.pin_adapter(args.kind, args.version, args.directory, activate=not args.no_activate)
+        registry.save()
+        print(f"[INFO] Pinned {args.kind} adapter {args.version}: {args.directory}")
+    elif args.command == 'verify':
+        entries = [('base', registry.data['base'])] if registry.data.get('base') else []
+        for kind, adapter in registry.data['adapters'].items():
+            entries += [(f"{kind} {version}", entry) for version, entry in adapter['versions'].items()]
+        failed = 0
+        for label, entry in entries:
+            try:
+                registry.verify(entry, full=True)
+                print(f"[OK] {label}: {entry['path']}")
+            except (FileNotFoundError, ValueError) as e:
+                failed += 1
+                print(f"[ERROR] {label}: {e}")
+        registry.save()  # refreshed stamps
+        return 1 if failed else 0
+    else:
+        print(json.dumps(registry.data, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
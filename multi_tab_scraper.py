@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Multi-tab scraper: one Chrome instance drives several tabs in parallel
+Used for batch URL lists instead of starting one browser per URL
+"""
+
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import undetected_chromedriver as uc
+from selenium.webdriver.common.by import By
+
+from rating_dom import extract_rating_text, TARGETED_EXTRACTION
+
+# Parallelism settings (override with environment variables)
+TABS_PER_BROWSER = int(os.environ.get("TABS_PER_BROWSER", "4"))
+BROWSERS_PER_HOST = int(os.environ.get("BROWSERS_PER_HOST", "1"))
+PAGE_TIMEOUT = int(os.environ.get("TAB_PAGE_TIMEOUT", "60"))  # seconds per page
+# Upper bounds for request-supplied settings: every browser is a Chrome process
+MAX_TABS_PER_BROWSER = int(os.environ.get("MAX_TABS_PER_BROWSER", "8"))
+MAX_BROWSERS_PER_HOST = int(os.environ.get("MAX_BROWSERS_PER_HOST", "4"))
+MAX_BATCH_URLS = int(os.environ.get("MAX_BATCH_URLS", "50"))
+POLL_INTERVAL = 0.5  # seconds between sweeps over the open tabs
+MIN_TEXT_LENGTH = 100  # same "got some content" threshold as app_final
+
+# uc.Chrome patches the chromedriver binary on start; starting several at once
+# races on that file (WinError 183), so driver creation is serialized
+_driver_init_lock = threading.Lock()
+
+
+def create_driver():
+    """Create a Chrome driver with the same options the apps use"""
+    options = uc.ChromeOptions()
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+
+    with _driver_init_lock:
+        driver = uc.Chrome(options=options, use_subprocess=True)
+    driver.set_page_load_timeout(PAGE_TIMEOUT)
+    return driver
+
+
+def _open_tab(driver, url):
+    """Open url in a new tab without waiting for it to load, return the tab handle"""
+    before = set(driver.window_handles)
+    driver.execute_script("window.open(arguments[0], '_blank');", url)
+    new_handles = [h for h in driver.window_handles if h not in before]
+    if not new_handles:
+        raise Exception(f"Could not open a new tab for {url}")
+    return new_handles[0]
+
+
+def _read_tab(driver, handle, min_text_length, targeted):
+    """Return the rating node text (targeted) or body.text of the tab if it is ready, otherwise None"""
+    driver.switch_to.window(handle)
+    if driver.execute_script("return document.readyState") != 'complete':
+        return None
+    if targeted:
+        rating_text, _ = extract_rating_text(driver)
+        if rating_text:
+            return rating_text
+    page_text = driver.find_element(By.TAG_NAME, 'body').text
+    if len(page_text) < min_text_length:
+        return None
+    return page_text
+
+
+def scrape_with_tabs(driver, urls, tabs=TABS_PER_BROWSER, page_timeout=PAGE_TIMEOUT,
+                     min_text_length=MIN_TEXT_LENGTH, targeted=TARGETED_EXTRACTION):
+    """Load urls in up to `tabs` parallel tabs of one driver and harvest body.text
+
+    With targeted=True only the text of the rating/review nodes is returned
+    when the page has them (see rating_dom.py), falling back to body.text.
+
+    Returns a dict url -> {'page_text': str or None, 'error': str or None}.
+    Pages are harvested as soon as they are ready; a freed tab slot is
+    immediately reused for the next pending URL.
+    """
+    tabs = min(max(1, tabs), MAX_TABS_PER_BROWSER)  # with 0 no tab would ever open and the loop below would spin
+    results = {}
+    pending = list(urls)
+    open_tabs = {}  # handle -> (url, started_at)
+    home_handle = driver.current_window_handle  # kept open so the session survives
+
+    try:
+        while pending or open_tabs:
+            # Fill free tab slots
+            while pending and len(open_tabs) < tabs:
+                url = pending.pop(0)
+                try:
+                    handle = _open_tab(driver, url)
+                    open_tabs[handle] = (url, time.time())
+                    print(f"[INFO] Opened tab for: {url}")
+                except Exception as open_error:
+                    results[url] = {'page_text': None, 'error': str(open_error)}
+
+            # Sweep open tabs and harvest the ones that are ready
+            for handle, (url, started_at) in list(open_tabs.items()):
+                page_text = None
+                error = None
+                try:
+                    page_text = _read_tab(driver, handle, min_text_length, targeted)
+                except Exception as read_error:
+                    error = str(read_error)
+
+                timed_out = time.time() - started_at > page_timeout
+                if page_text is None and error is None and not timed_out:
+                    continue
+
+                if page_text is None and error is None:
+                    # Timed out - keep whatever text the page has
+                    try:
+                        page_text = driver.find_element(By.TAG_NAME, 'body').text or None
+                    except Exception:
+                        pass
+                    if not page_text:
+                        error = f"Page did not load within {page_timeout} seconds"
+
+                results[url] = {'page_text': page_text, 'error': error}
+                print(f"[INFO] Harvested tab ({len(page_text or '')} chars): {url}")
+
+                try:
+                    driver.switch_to.window(handle)
+                    driver.close()
+                except Exception as close_error:
+                    print(f"[WARNING] Could not close tab: {close_error}")
+                del open_tabs[handle]
+
+            if open_tabs:
+                time.sleep(POLL_INTERVAL)
+    finally:
+        try:
+            driver.switch_to.window(home_handle)
+        except Exception:
+            pass
+
+    return results
+
+
+def _scrape_in_browser(urls, tabs, page_timeout):
+    """Start one browser, scrape urls through its tabs, then quit it"""
+    driver = None
+    try:
+        driver = create_driver()
+        return scrape_with_tabs(driver, urls, tabs=tabs, page_timeout=page_timeout)
+    except Exception as e:
+        print(f"[ERROR] Browser failed: {e}")
+        return {url: {'page_text': None, 'error': str(e)} for url in urls}
+    finally:
+        if driver:
+            try:
+                driver.quit()
+            except Exception as quit_error:
+                print(f"[WARNING] Error closing driver: {quit_error}")
+
+
+def scrape_urls(urls, tabs_per_browser=TABS_PER_BROWSER, browsers_per_host=BROWSERS_PER_HOST,
+                page_timeout=PAGE_TIMEOUT):
+    """Scrape a batch of URLs using a few browsers with several tabs each
+
+    URLs are grouped by host; each host gets at most `browsers_per_host`
+    browsers and each browser keeps at most `tabs_per_browser` tabs loading.
+    Returns a dict url -> {'page_text': str or None, 'error': str or None}.
+    """
+    by_host = {}
+    for url in urls:
+        by_host.setdefault(urlparse(url).netloc, []).append(url)
+
+    # Split each host's URLs round-robin across its browsers
+    tabs_per_browser = min(max(1, tabs_per_browser), MAX_TABS_PER_BROWSER)
+    browsers_per_host = min(browsers_per_host, MAX_BROWSERS_PER_HOST)
+    jobs = []
+    for host_urls in by_host.values():
+        n_browsers = max(1, min(browsers_per_host, -(-len(host_urls) // tabs_per_browser)))
+        for i in range(n_browsers):
+            jobs.append(host_urls[i::n_browsers])
+
+    print(f"[INFO] Scraping {len(urls)} URL(s) with {len(jobs)} browser(s), {tabs_per_browser} tab(s) each")
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, len(jobs))) as executor:
+        futures = [executor.submit(_scrape_in_browser, job, tabs_per_browser, page_timeout) for job in jobs]
+        for future in futures:
+            results.update(future.result())
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+    import json
+
+    urls = sys.argv[1:] or [
+        "https://www.meesho.com/casual-polyester-blend-ribbed-collar-v-neck-regular-long-sleeves-stylish-coffee-top-20inches/p/71ldyd",
+    ]
+    output = scrape_urls(urls)
+    print(json.dumps({url: {'length': len(r['page_text'] or ''), 'error': r['error']} for url, r in output.items()}, indent=2))
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ONNX Runtime backend for the reviews/ratings extractor (export_onnx.py)
+Greedy decoding over the exported graph on CPU: each step's present
+key/values are fed back as the next step's past, so only the new token goes
+through the model. ONNX Runtime applies its graph optimizations (operator
+fusion, constant folding) when the session is created and runs each op
+multithreaded.
+
+Serves either export: the merged reviews LoRA model (decoder-only, prompted
+like inference.py) or the distilled student (encoder + decoder, input text
+only; the cross-attention keys/values are computed once per batch). Results have the same shape as generate_reviews_json.
+
+Used by inference.py when REVIEWS_BACKEND=onnx.
+Set ONNX_THREADS to pin the intra-op thread count (default: physical cores).
+"""
+
+import os
+import json
+import time
+import threading
+
+import numpy as np
+
+try:
+    import onnxruntime as ort
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    ONNXRUNTIME_AVAILABLE = False
+
+ONNX_DIR = os.environ.get("ONNX_DIR", "output-onnx-reviews-ratings")
+ONNX_THREADS = os.environ.get("ONNX_THREADS")
+ONNX_CONFIG = "onnx_config.json"  # written by export_onnx.py next to the graphs
+
+onnx_generator = None
+onnx_lock = threading.Lock()
+
+
+def kv_names(prefix, num_layers):
+    """Graph input/output names of the key/value cache, two per layer"""
+    return [f"{prefix}_{kv}_{i}" for i in range(num_layers) for kv in ('key', 'value')]
+
+
+def create_session(path, threads=None):
+    """CPU inference session with all graph optimizations enabled"""
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if threads:
+        options.intra_op_num_threads = int(threads)
+    return ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+
+
+class OnnxGenerator:
+    """Greedy generation with the KV cache over an export_onnx.py directory"""
+
+    def __init__(self, export_dir, threads=None):
+        if not ONNXRUNTIME_AVAILABLE:
+            raise ImportError("onnxruntime is not installed (pip install onnxruntime)")
+        with open(os.path.join(export_dir, ONNX_CONFIG), 'r', encoding='utf-8') as f:
+            self.config = json.load(f)
+        self.seq2seq = self.config['architecture'] == 'seq2seq'
+        self.past_names = kv_names('past', self.config['num_layers'])
+        self.cross_names = kv_names('cross', self.config['num_layers'])
+        if self.seq2seq:
+            self.encoder = create_session(os.path.join(export_dir, 'encoder.onnx'), threads)
+            self.decoder = create_session(os.path.join(export_dir, 'decoder.onnx'), threads)
+        else:
+            self.decoder = create_session(os.path.join(export_dir, 'model.onnx'), threads)
+
+    def empty_past(self, batch_size):
+        shape = (batch_size, self.config['num_kv_heads'], 0, self.config['head_dim'])
+        return {name: np.zeros(shape, dtype=np.float32) for name in self.past_names}
+
+    def prefill(self, input_ids, attention_mask):
+        """(first step outputs, decoder feeds without the cache) for a batch of prompts"""
+        if self.seq2seq:
+            # encoder.onnx runs the first decoder step and returns the cross-attention keys/values after the cache
+            outputs = self.encoder.run(None, {'input_ids': input_ids, 'attention_mask': attention_mask})
+            cross = outputs[1 + len(self.past_names):]
+            return outputs, {'encoder_attention_mask': attention_mask, **dict(zip(self.cross_names, cross))}
+
+        # Same positions as generate(): padding does not count
+        position_ids = np.cumsum(attention_mask, axis=1) - 1
+        position_ids[attention_mask == 0] = 1
+        feeds = {'input_ids': input_ids, 'attention_mask': attention_mask, 'position_ids': position_ids}
+        return self.decoder.run(None, {**feeds, **self.empty_past(input_ids.shape[0])}), feeds
+
+    def generate(self, input_ids, attention_mask, max_new_tokens, timer=None):
+        """New token ids (batch, steps) for left-padded int64 inputs; rows that finished are padded
+
+        timer: an InferenceStats timer, marked when the first token exists.
+        """
+        batch_size = input_ids.shape[0]
+        eos, pad = self.config['eos_token_id'], self.config['pad_token_id']
+        outputs, feeds = self.prefill(input_ids, attention_mask)
+        if timer is not None:
+            timer.first_token_time = time.perf_counter()
+
+        generated = []
+        finished = np.zeros(batch_size, dtype=bool)
+        while True:
+            next_tokens = np.where(finished, pad, outputs[0][:, -1].argmax(axis=-1)).astype(np.int64)
+            generated.append(next_tokens)
+            finished |= next_tokens == eos
+            if finished.all() or len(generated) >= max_new_tokens:
+                break
+
+            if self.seq2seq:
+                feeds['decoder_input_ids'] = next_tokens[:, None]
+            else:
+                feeds['input_ids'] = next_tokens[:, None]
+                feeds['attention_mask'] = np.concatenate(
+                    [feeds['attention_mask'], np.ones((batch_size, 1), np.int64)], axis=1)
+                feeds['position_ids'] = feeds['position_ids'][:, -1:] + 1
+            outputs = self.decoder.run(None, {**feeds, **dict(zip(self.past_names, outputs[1:]))})
+        return np.stack(generated, axis=1)
+
+
+def load_onnx():
+    """Load the exported graphs and their tokenizer once"""
+    global onnx_generator
+    with onnx_lock:
+        if onnx_generator is None:
+            from transformers import AutoTokenizer
+            print(f"Loading ONNX model from {ONNX_DIR}...")
+            generator = OnnxGenerator(ONNX_DIR, ONNX_THREADS)
+            generator.tokenizer = AutoTokenizer.from_pretrained(ONNX_DIR)
+            if not generator.seq2seq:
+                generator.tokenizer.pad_token = generator.tokenizer.eos_token
+                generator.tokenizer.padding_side = "left"
+            onnx_generator = generator
+            print(f"ONNX model loaded successfully! ({onnx_generator.config['architecture']})")
+    return onnx_generator
+
+
+def generate_onnx_json_batch(texts, max_new_tokens=128, stats=None):
+    """Greedy-decode the reviews JSON for each text with ONNX Runtime, one result dict per text"""
+    import torch
+    from prompts import REVIEWS_INSTRUCTION, encode_prompts
+    from inference import parse_json_output, count_new_tokens
+
+    generator = load_onnx()
+    tokenizer = generator.tokenizer
+    if generator.seq2seq:
+        inputs = tokenizer(texts, return_tensors="np", padding=True, truncation=True,
+                           max_length=generator.config.get('max_input_length'))
+        max_new_tokens = min(max_new_tokens, generator.config.get('max_output_length') or max_new_tokens)
+    else:
+        inputs = {k: v.numpy() for k, v in encode_prompts(tokenizer, REVIEWS_INSTRUCTION, texts, stats=stats).items()}
+    input_ids = inputs['input_ids'].astype(np.int64)
+    attention_mask = inputs['attention_mask'].astype(np.int64)
+
+    timer = stats.start() if stats else None
+    generated = generator.generate(input_ids, attention_mask, max_new_tokens, timer)
+    if stats:
+        stats.finish(timer, 'reviews_onnx', int(attention_mask.sum()),
+                     count_new_tokens(torch.from_numpy(generated), 0, tokenizer.eos_token_id), batch_size=len(texts))
+    return [parse_json_output(d) for d in tokenizer.batch_decode(generated, skip_special_tokens=True)]
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sequence packing for causal-LM fine-tuning
+Several short tokenized examples are concatenated into one MAX_LENGTH window.
+position_ids restart at 0 for every example and no attention_mask is passed,
+so transformers builds a block-diagonal causal mask: a token only attends to
+earlier tokens of its own example. The first label of each example is masked
+so no loss is computed across example boundaries.
+
+The mask comes from transformers' masking_utils, which detects packed
+position_ids for every attention implementation since 4.56. Older versions
+do not for eager/sdpa and examples would silently attend to each other, so
+PACKED_MASK_AVAILABLE is False there and training does not pack.
+"""
+
+import torch
+
+try:
+    from transformers.masking_utils import find_packed_sequence_indices  # noqa: F401
+    PACKED_MASK_AVAILABLE = True
+except ImportError:
+    PACKED_MASK_AVAILABLE = False
+
+IGNORE_INDEX = -100
+
+
+def pack_examples(examples, max_length):
+    """Best-fit-decreasing packing of tokenized examples into windows
+
+    examples: dicts with input_ids and labels (each at most max_length long)
+    Returns one dict per window with input_ids, labels and position_ids.
+    """
+    bins = []  # example indices per window
+    by_free = [[] for _ in range(max_length + 1)]  # free space -> windows with exactly that much room
+    order = sorted(range(len(examples)), key=lambda i: len(examples[i]['input_ids']), reverse=True)
+    for i in order:
+        length = len(examples[i]['input_ids'])
+        for free in range(length, max_length + 1):
+            if by_free[free]:
+                b = by_free[free].pop()
+                break
+        else:
+            b, free = len(bins), max_length
+            bins.append([])
+        bins[b].append(i)
+        by_free[free - length].append(b)
+
+    windows = []
+    for members in bins:
+        input_ids, labels, position_ids = [], [], []
+        for i in sorted(members):  # keep dataset order inside a window
+            ex = examples[i]
+            input_ids += ex['input_ids']
+            labels += [IGNORE_INDEX] + list(ex['labels'][1:])
+            position_ids += range(len(ex['input_ids']))
+        windows.append({'input_ids': input_ids, 'labels': labels, 'position_ids': position_ids})
+    return windows
+
+
+class PackedCollator:
+    """Pads packed windows to the longest in the batch
+
+    Padding is its own segment (positions from 0, labels ignored) and no
+    attention_mask is returned, so the model derives the packed mask from position_ids.
+    """
+
+    def __init__(self, pad_token_id):
+        self.pad_token_id = pad_token_id
+
+    def __call__(self, features):
+        width = max(len(f['input_ids']) for f in features)
+        batch = {'input_ids': [], 'labels': [], 'position_ids': []}
+        for f in features:
+            pad = width - len(f['input_ids'])
+            batch['input_ids'].append(list(f['input_ids']) + [self.pad_token_id] * pad)
+            batch['labels'].append(list(f['labels']) + [IGNORE_INDEX] * pad)
+            batch['position_ids'].append(list(f['position_ids']) + list(range(pad)))
+        return {k: torch.tensor(v, dtype=torch.long) for k, v in batch.items()}
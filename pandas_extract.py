@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Vectorized ratings/reviews extraction over pandas DataFrames
+Same patterns and rules as extract_rating_reviews (extract_simple.py), applied
+column-wise with Series.str.extract instead of calling it per row via .apply.
+
+With pyarrow installed the patterns run in Arrow's RE2 engine. RE2 and Python's
+re differ on \\d, \\s and case-insensitive matching of non-ASCII characters
+(e.g. Python matches "ı" for "i" and "\\xa0" for \\s), so each pattern is
+rewritten with explicit character classes built from Python's own rules and
+the results stay identical to the scalar function.
+
+Usage:
+    from pandas_extract import extract_rating_reviews_df
+    df = extract_rating_reviews_df(df, text_column='text')
+
+Benchmark (1M rows): python pandas_extract.py --rows 1000000
+"""
+
+import re
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# Same order as extract_simple.extract_rating_reviews - the first pattern that
+# gives an acceptable value wins
+RATING_PATTERNS = [
+    r'(\d+\.\d+)\s*\*+',  # 4.2***
+    r'(\d+\.\d+)\s*★+',   # 4.2★
+    r'rating[:\s]+(\d+\.\d+)',  # rating: 4.2
+    r'(\d+\.\d+)',  # Just the number
+]
+
+RATINGS_PATTERNS = [
+    r'([\d,]+)\s*ratings?',
+    r'rating[:\s]+([\d,]+)',
+    r'(\d+[,\.]?\d*)\s*ratings?',
+]
+
+REVIEWS_PATTERNS = [
+    r'([\d,]+)\s*reviews?',
+    r'review[:\s]+([\d,]+)',
+    r'(\d+[,\.]?\d*)\s*reviews?',
+]
+
+_class_cache = {}
+
+
+def _class_char(cp):
+    # Both engines read \xHH; other characters are written literally because
+    # pandas compiles the pattern with Python's re (no \x{...}) before RE2 runs it
+    if cp < 0x80 and not chr(cp).isalnum():
+        return f'\\x{cp:02x}'
+    return chr(cp)
+
+
+def _class_body(codepoints):
+    """Character class body (without brackets) for a sorted list of code points"""
+    parts = []
+    start = prev = codepoints[0]
+    for cp in codepoints[1:] + [None]:
+        if cp is not None and cp == prev + 1:
+            prev = cp
+            continue
+        parts.append(_class_char(start) if start == prev else f'{_class_char(start)}-{_class_char(prev)}')
+        if cp is not None:
+            start = prev = cp
+    return ''.join(parts)
+
+
+def _python_class(kind):
+    """Class body matching exactly what Python's re matches for \\d, \\s or a letter with IGNORECASE"""
+    if kind not in _class_cache:
+        if kind == 'd':
+            codepoints = [cp for cp in range(0x110000) if chr(cp).isdecimal()]
+        elif kind == 's':
+            codepoints = [cp for cp in range(0x110000) if chr(cp).isspace()]
+        else:
+            # Candidates from case mappings (catches "ı", "İ", "ſ", "K"), confirmed with re itself
+            lower, upper = kind.lower(), kind.upper()
+            codepoints = [cp for cp in range(0x10000)
+                          if (chr(cp).lower() == lower or chr(cp).upper() == upper or lower in chr(cp).lower())
+                          and re.fullmatch(kind, chr(cp), re.IGNORECASE)]
+        _class_cache[kind] = _class_body(codepoints)
+    return _class_cache[kind]
+
+
+def _to_re2(pattern):
+    """Rewrite one of the patterns above for RE2 with Python's \\d, \\s and IGNORECASE semantics"""
+    out = []
+    in_class = False
+    i = 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == '\\' and pattern[i + 1] in 'ds':
+            body = _python_class(pattern[i + 1])
+            out.append(body if in_class else f'[{body}]')
+            i += 2
+            continue
+        if ch == '\\':
+            out.append(pattern[i:i + 2])
+            i += 2
+            continue
+        if ch == '[':
+            in_class = True
+        elif ch == ']':
+            in_class = False
+        elif ch.isascii() and ch.isalpha():
+            body = _python_class(ch)
+            out.append(body if in_class else f'[{body}]')
+            i += 1
+            continue
+        out.append(ch)
+        i += 1
+    # pyarrow's extract needs a named group
+    return ''.join(out).replace('(', '(?P<value>', 1)
+
+
+class _Pattern:
+    """A pattern compiled for whichever engine Series.str.extract will use"""
+
+    def __init__(self, pattern):
+        self.python = re.compile(pattern, re.IGNORECASE)
+        self.re2 = _to_re2(pattern) if PYARROW_AVAILABLE else None
+
+    def extract(self, texts):
+        if self.re2 is not None:
+            return texts.str.extract(self.re2, expand=False)
+        return texts.str.extract(self.python, expand=False)
+
+
+_compiled = {}
+
+
+def _patterns(name, patterns):
+    if name not in _compiled:
+        _compiled[name] = [_Pattern(p) for p in patterns]
+    return _compiled[name]
+
+
+def _first_match(texts, patterns, accept=None):
+    """Value of the first pattern whose first match is accepted, per row
+
+    Each pattern only runs over the rows that are still unresolved, so later
+    fallback patterns touch a shrinking subset of the column.
+    """
+    found = pd.Series(None, index=texts.index, dtype=texts.dtype)
+    remaining = texts
+    for pattern in patterns:
+        if remaining.empty:
+            break
+        matched = pattern.extract(remaining)
+        hit = matched.notna().to_numpy().copy()
+        if accept is not None:
+            hit[hit] = accept(matched[hit].astype(object))
+        found.loc[remaining.index[hit]] = matched[hit].to_numpy()
+        remaining = remaining[~hit]
+    return found
+
+
+def _valid_rating(values):
+    # float() rather than astype(float) - Python accepts non-ASCII digits like "४.२"
+    ratings = values.map(float).to_numpy()
+    return (ratings >= 0) & (ratings <= 5)
+
+
+def _count_strings(values, label):
+    return values.str.replace(',', '', regex=False).str.replace('.', '', regex=False) + f' {label}'
+
+
+def extract_rating_reviews_series(texts):
+    """Extract rating, rating_count and review_count for every text in a Series
+
+    Returns a DataFrame with the same index and object columns holding the
+    same strings extract_rating_reviews returns ("4.2★", "20596 Ratings",
+    "9777 Reviews") or None. Missing texts are treated as empty strings.
+    """
+    index = texts.index
+    texts = texts.fillna('').astype(pd.ArrowDtype(pa.string()) if PYARROW_AVAILABLE else object)
+    texts = texts.reset_index(drop=True)
+
+    rating = _first_match(texts, _patterns('rating', RATING_PATTERNS), accept=_valid_rating)
+    rating_count = _first_match(texts, _patterns('ratings', RATINGS_PATTERNS))
+    review_count = _first_match(texts, _patterns('reviews', REVIEWS_PATTERNS))
+
+    result = pd.DataFrame({
+        'rating': rating + '★',
+        'rating_count': _count_strings(rating_count, 'Ratings'),
+        'review_count': _count_strings(review_count, 'Reviews'),
+    }).astype(object)
+    result = result.where(result.notna(), None)
+    result.index = index
+    return result
+
+
+def extract_rating_reviews_df(df, text_column='text'):
+    """Add rating, rating_count and review_count columns to a DataFrame"""
+    extracted = extract_rating_reviews_series(df[text_column])
+    return df.assign(**{column: extracted[column] for column in extracted.columns})
+
+
+if __name__ == "__main__":
+    import time
+    import random
+    import argparse
+    from extract_simple import extract_rating_reviews
+
+    parser = argparse.ArgumentParser(description="Benchmark vectorized vs per-row extraction")
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--apply-rows', type=int, default=100000, help="rows timed with .apply (extrapolated)")
+    args = parser.parse_args()
+
+    random.seed(42)
+    templates = [
+        "Rating: {r}★ Rating Count: {c:,} Ratings Review Count: {v} Reviews #{i}",
+        "₹{p}.50 Free Delivery {r}★ {c:,} Ratings, {v:,} Reviews Sizes S M L #{i}",
+        "Product has {r} star rating with {c} ratings and {v} reviews #{i}",
+        "Length : 20.5 inches ₹{p} {r}\xa0{c} Ratings #{i}",
+        "No ratings yet ₹{p} #{i}",
+        "{p}.0 cm {r}*** {c:,} ratings #{i}",
+    ]
+    texts = pd.Series([random.choice(templates).format(r=round(random.uniform(1, 5), 1), c=random.randint(1, 200000),
+                                                       v=random.randint(1, 90000), p=random.randint(99, 2999), i=i)
+                       for i in range(args.rows)])
+
+    print("=" * 80)
+    print(f"Rows: {args.rows:,} (engine: {'pyarrow RE2' if PYARROW_AVAILABLE else 'python re'})")
+
+    extract_rating_reviews_series(texts.iloc[:10])  # build the character classes outside the timing
+    start = time.perf_counter()
+    vectorized = extract_rating_reviews_series(texts)
+    vectorized_s = time.perf_counter() - start
+    print(f"Vectorized:  {vectorized_s:.2f}s ({args.rows / vectorized_s:,.0f} rows/s)")
+
+    sample = texts.iloc[:args.apply_rows]
+    start = time.perf_counter()
+    scalar = sample.apply(lambda t: extract_rating_reviews(t, verbose=False))
+    apply_s = (time.perf_counter() - start) * args.rows / len(sample)
+    print(f".apply:      {apply_s:.2f}s (extrapolated from {len(sample):,} rows)")
+    print(f"Speedup:     {apply_s / vectorized_s:.1f}x")
+
+    expected = [(r['rating'], r['rating_count'], r['review_count']) for r in scalar]
+    actual = list(vectorized.loc[sample.index].itertuples(index=False, name=None))
+    print(f"Mismatches vs scalar on {len(sample):,} rows: {sum(e != a for e, a in zip(expected, actual))}")
+    print("=" * 80)
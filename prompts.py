@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Prompt format shared by serving (inference.py), training and the data scripts
+Instructions, prompt builders and batched prompt tokenization with a cached
+instruction prefix. Importing this module loads no model libraries (torch is
+imported when encode_prompts is first called), so data generators and their
+worker processes can use the instructions without pulling in inference.py.
+"""
+
+ATTRIBUTES_INSTRUCTION = "Extract product attributes as JSON with keys exactly: Brand_Name, Models, Colors, Sizes/Ounce, Designs, Pattern, Costumes, Team_Names, Styles, Sets, Flavors, Pack, Albums, Movies, Formats, Edition, Platform, Digital_Copy, Refurbished, Remanufactured, Pre-Owned. Focus especially on extracting detailed design features, visual elements, materials, and construction details for the Designs field. Respond ONLY with a JSON object. Use null for missing fields."
+REVIEWS_INSTRUCTION = "Extract product reviews and ratings as JSON with keys exactly: Rating, Rating_Count, Review_Count. Respond ONLY with a JSON object. Use null for missing fields."
+OUTPUT_MARKER = "\n\n### Output:\n"
+
+
+def prompt_prefix(instr):
+    """Fixed part of the prompt before the input text"""
+    return f"### Instruction:\n{instr}\n\n### Input:\n"
+
+
+def format_prompt(instr, text):
+    """The full prompt for an instruction and input text, as in training"""
+    return prompt_prefix(instr) + text + OUTPUT_MARKER
+
+
+def build_prompt(text):
+    return format_prompt(ATTRIBUTES_INSTRUCTION, text)
+
+
+def build_reviews_prompt(text):
+    return format_prompt(REVIEWS_INSTRUCTION, text)
+
+
+# Token ids of each instruction prefix, tokenized once. The input text is
+# tokenized behind PREFIX_ANCHOR (the prefix's last character) and the
+# anchor's ids are dropped, which reproduces how the text tokenizes after the
+# prefix. Checked against full tokenization of PREFIX_PROBES when first built;
+# None if the tokenizer does not split cleanly there.
+PREFIX_ANCHOR = "\n"
+PREFIX_PROBES = ['', 'Rating: "4.2★" Rating Count: "20596 Ratings" Review Count: "9777 Reviews"',
+                 ' leading space', 'Product ₹499 4.1 ★ 1,234 ratings\n\n567 reviews ', 'ÄÖÜ 日本語 😀']
+prefix_cache = {}
+
+
+def cached_prefix_ids(tok, instr):
+    """(prefix ids, anchor ids) for an instruction, or None if the prefix cannot be reused"""
+    key = (id(tok), instr)
+    if key not in prefix_cache:
+        prefix = prompt_prefix(instr)
+        prefix_ids = tok(prefix)['input_ids']
+        anchor_ids = tok(PREFIX_ANCHOR, add_special_tokens=False)['input_ids']
+        probes = tok([PREFIX_ANCHOR + p + OUTPUT_MARKER for p in PREFIX_PROBES], add_special_tokens=False)['input_ids']
+        matches = all(prefix_ids + ids[len(anchor_ids):] == tok(prefix + p + OUTPUT_MARKER)['input_ids']
+                      for p, ids in zip(PREFIX_PROBES, probes))
+        prefix_cache[key] = (prefix_ids, anchor_ids) if matches else None
+        if not matches:
+            print("[WARNING] Tokenizer does not split cleanly after the prompt prefix - prefix cache disabled")
+    return prefix_cache[key]
+
+
+def encode_prompts(tok, instr, texts, device=None, stats=None):
+    """Batch-tokenize prompts for texts into left-padded input_ids/attention_mask tensors
+
+    Same ids as tok(prompt) for each full prompt; the fixed instruction
+    prefix comes from prefix_cache instead of being tokenized every call.
+    """
+    import torch
+    import numpy as np
+
+    cached = cached_prefix_ids(tok, instr)
+    if stats is not None:
+        stats.cache_event('prompt_prefix', cached is not None)
+    if cached:
+        prefix_ids, anchor_ids = cached
+        suffixes = tok([PREFIX_ANCHOR + text + OUTPUT_MARKER for text in texts], add_special_tokens=False)['input_ids']
+        ids = []
+        for text, suffix in zip(texts, suffixes):
+            if suffix[:len(anchor_ids)] == anchor_ids:
+                ids.append(prefix_ids + suffix[len(anchor_ids):])
+            else:
+                # Text merged with the anchor (e.g. starts with a newline) - tokenize it whole
+                ids.append(tok(prompt_prefix(instr) + text + OUTPUT_MARKER)['input_ids'])
+    else:
+        ids = tok([prompt_prefix(instr) + text + OUTPUT_MARKER for text in texts])['input_ids']
+
+    longest = max(len(i) for i in ids)
+    input_ids = torch.full((len(ids), longest), tok.pad_token_id, dtype=torch.long)
+    attention_mask = torch.zeros((len(ids), longest), dtype=torch.long)
+    for row, i in enumerate(ids):
+        input_ids[row, longest - len(i):] = torch.from_numpy(np.asarray(i, dtype=np.int64))
+        attention_mask[row, longest - len(i):] = 1
+    return {'input_ids': input_ids.to(device), 'attention_mask': attention_mask.to(device)}
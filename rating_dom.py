@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Targeted rating extraction from the live DOM
+Runs one in-page script that returns only the text of rating/review nodes,
+instead of serializing the whole page with body.text or page_source
+"""
+
+import os
+import re
+
+# Set TARGETED_EXTRACTION=0 to always use the full body.text
+TARGETED_EXTRACTION = os.environ.get("TARGETED_EXTRACTION", "1") != "0"
+
+# Selector fallback chain - the first selector whose nodes contain rating data wins
+RATING_SELECTORS = [
+    '[itemprop="aggregateRating"]',
+    '[itemprop="ratingValue"], [itemprop="ratingCount"], [itemprop="reviewCount"]',
+    '[data-testid*="rating" i], [data-testid*="review" i]',
+    '[class*="rating" i]',
+    '[class*="review" i]',
+]
+
+MAX_NODES = 20  # nodes returned per selector
+MAX_NODE_TEXT = 300  # characters kept per node
+
+# Text of a node is built from its text nodes joined with spaces so that
+# adjacent spans ("4.2" "20596 Ratings") do not run together.
+# A selector only wins when its text has a rating (0-5 decimal) or a
+# "N ratings" / "N reviews" count - review bodies and the "5 4 3 2 1" star
+# filter match [class*="review"] / [class*="rating"] but have neither.
+# If no selector matches, falls back to the containers of text nodes that
+# look like "20596 Ratings" / "9777 Reviews".
+RATING_NODE_SCRIPT = r"""
+const selectors = arguments[0];
+const maxNodes = arguments[1];
+const maxText = arguments[2];
+
+function nodeText(el) {
+    const parts = [];
+    const walker = document.createTreeWalker(el, NodeFilter.SHOW_TEXT);
+    let n;
+    while ((n = walker.nextNode())) {
+        const t = n.nodeValue.trim();
+        if (t) parts.push(t);
+    }
+    return parts.join(' ').slice(0, maxText);
+}
+
+function hasRatingData(t) {
+    if (/\d[\d,]*\s*(ratings?|reviews?)/i.test(t) || /(rating|review)\s+count[:\s]+\d/i.test(t)) return true;
+    return (t.match(/\d+\.\d+/g) || []).some(v => parseFloat(v) <= 5);
+}
+
+function collect(elements) {
+    const seen = new Set();
+    const texts = [];
+    for (const el of elements) {
+        if (texts.length >= maxNodes) break;
+        const t = nodeText(el);
+        if (t && /\d/.test(t) && !seen.has(t)) {
+            seen.add(t);
+            texts.push(t);
+        }
+    }
+    return texts;
+}
+
+for (const selector of selectors) {
+    let elements;
+    try {
+        elements = document.querySelectorAll(selector);
+    } catch (e) {
+        continue;
+    }
+    const text = collect(elements).join('\n');
+    if (hasRatingData(text)) return {selector: selector, text: text};
+}
+
+const countPattern = /\d[\d,]*\s*(ratings?|reviews?)/i;
+const containers = [];
+const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_TEXT);
+let n;
+while ((n = walker.nextNode()) && containers.length < maxNodes) {
+    if (countPattern.test(n.nodeValue)) {
+        const parent = n.parentElement;
+        containers.push(parent && parent.parentElement ? parent.parentElement : parent);
+    }
+}
+const text = collect(containers.filter(Boolean)).join('\n');
+if (hasRatingData(text)) return {selector: 'text-match', text: text};
+return null;
+"""
+
+
+RATING_VALUE_PATTERN = re.compile(r'\d+\.\d+')
+COUNT_PATTERN = re.compile(r'\d[\d,]*\s*(ratings?|reviews?)|(rating|review)\s+count[:\s]+\d', re.IGNORECASE)
+
+
+def has_rating_data(text):
+    """True if text has something the regex extractors can use: a 0-5 decimal rating or a ratings/reviews count"""
+    if not text:
+        return False
+    if COUNT_PATTERN.search(text):
+        return True
+    return any(float(value) <= 5 for value in RATING_VALUE_PATTERN.findall(text))
+
+
+def extract_rating_text(driver, selectors=None):
+    """Return (text, selector) of candidate rating/review nodes, or (None, None)
+
+    (None, None) also when the matched text has no rating or count in it, so
+    callers fall back to body.text.
+    """
+    try:
+        found = driver.execute_script(RATING_NODE_SCRIPT, selectors or RATING_SELECTORS, MAX_NODES, MAX_NODE_TEXT)
+    except Exception as e:
+        print(f"[WARNING] Targeted extraction script failed: {e}")
+        return None, None
+
+    if not found or not found.get('text'):
+        return None, None
+    if not has_rating_data(found['text']):
+        print(f"[INFO] Targeted extraction matched '{found['selector']}' but found no rating data, using body.text")
+        return None, None
+
+    print(f"[INFO] Targeted extraction matched '{found['selector']}' ({len(found['text'])} chars)")
+    return found['text'], found['selector']
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Speculative decoding for the short JSON outputs of inference.py
+A drafter proposes the next few tokens, the model checks all of them in one
+forward pass and keeps the longest prefix that matches its own greedy
+choice, plus its own next token. The output is exactly what greedy
+generate() produces; only the number of forward passes changes.
+
+The drafter needs no second model:
+- the JSON answer rendered from the regex extractor (extract_simple.py),
+  which is usually right for reviews prompts
+- n-gram lookup in the prompt, since extracted values are copied from the input
+
+The regex answer can also be checked on its own (verify_candidate): one
+forward pass over prompt + answer scores every answer token, and if each is
+likely enough the answer is used without generating at all.
+
+Usage:
+    drafter = NgramDrafter([candidate_ids, prompt_ids])
+    output_ids = speculative_generate(model, input_ids, drafter, max_new_tokens, eos_token_id)
+    accepted, probs = verify_candidate(model, input_ids, candidate_ids + [eos_token_id])
+"""
+
+import os
+import json
+
+import torch
+
+from extract_simple import extract_rating_reviews
+
+DRAFT_TOKENS = int(os.environ.get("SPEC_DRAFT_TOKENS", "16"))  # tokens proposed per verify pass
+MAX_NGRAM = 4  # longest suffix looked up in the references
+# Lowest probability any answer token may have for verify_candidate to accept it.
+# Above 0.5 every token is also the greedy choice, so the answer is what generate() would give.
+VERIFY_MIN_TOKEN_PROB = float(os.environ.get("VERIFY_MIN_TOKEN_PROB", "0.5"))
+
+
+def render_reviews_candidate(text):
+    """The reviews JSON the regex extractor gives for text, formatted like the training outputs"""
+    found = extract_rating_reviews(text, verbose=False)
+    return json.dumps({
+        'Rating': found['rating'],
+        'Rating_Count': found['rating_count'],
+        'Review_Count': found['review_count'],
+    }, ensure_ascii=False)
+
+
+def candidate_token_ids(tokenizer, prompt, prompt_ids, candidate):
+    """Token ids of candidate as they would follow the prompt"""
+    full = tokenizer(prompt + candidate)['input_ids']
+    if full[:len(prompt_ids)] == prompt_ids:
+        return full[len(prompt_ids):]
+    # The prompt's last token merged with the candidate - tokenize it alone
+    return tokenizer(candidate, add_special_tokens=False)['input_ids']
+
+
+class NgramDrafter:
+    """Proposes tokens by continuing the generated text along reference token lists
+
+    references are tried in order. While the generated tokens are still a
+    prefix of the first reference (the regex candidate) it is followed
+    directly; otherwise the longest generated suffix (up to MAX_NGRAM tokens)
+    found in a reference is continued.
+    """
+
+    def __init__(self, references, max_ngram=MAX_NGRAM):
+        self.references = [list(r) for r in references if r]
+        self.max_ngram = max_ngram
+
+    def propose(self, generated, k):
+        if not self.references or k <= 0:
+            return []
+        first = self.references[0]
+        if generated == first[:len(generated)]:
+            return first[len(generated):len(generated) + k]
+        for n in range(min(self.max_ngram, len(generated)), 0, -1):
+            suffix = generated[-n:]
+            for reference in self.references:
+                for start in range(len(reference) - n):
+                    if reference[start:start + n] == suffix:
+                        return reference[start + n:start + n + k]
+        return []
+
+
+def _crop(cache, length):
+    if hasattr(cache, 'crop'):
+        # Negative: number of tokens to drop from the end
+        cache.crop(length - cache.get_seq_length())
+        return cache
+    return tuple((k[:, :, :length], v[:, :, :length]) for k, v in cache)
+
+
+def speculative_generate(model, input_ids, drafter, max_new_tokens, eos_token_id, draft_tokens=DRAFT_TOKENS,
+                         timer=None, stats=None):
+    """Greedy decoding with drafted tokens verified in batches; returns prompt + generated ids like generate()
+
+    input_ids is a [1, prompt_length] tensor. timer (inference_stats.start())
+    gets the first-token time; stats gets a 'draft_tokens' cache event per
+    drafted token (hit = accepted).
+    """
+    prompt_length = input_ids.shape[1]
+    with torch.no_grad():
+        out = model(input_ids=input_ids, use_cache=True)
+        cache = out.past_key_values
+        generated = [int(out.logits[0, -1].argmax())]
+        if timer is not None:
+            timer(input_ids, None)
+
+        while len(generated) < max_new_tokens and generated[-1] != eos_token_id:
+            draft = drafter.propose(generated, min(draft_tokens, max_new_tokens - len(generated)))
+            step = torch.tensor([[generated[-1]] + draft], device=input_ids.device)
+            out = model(input_ids=step, past_key_values=cache, use_cache=True)
+            predicted = out.logits[0].argmax(dim=-1).tolist()
+
+            accepted = 0
+            while accepted < len(draft) and draft[accepted] == predicted[accepted]:
+                accepted += 1
+            if stats is not None:
+                for i in range(len(draft)):
+                    stats.cache_event('draft_tokens', i < accepted)
+
+            # Keep the cache for the fed-in token and the accepted drafts only
+            cache = _crop(out.past_key_values, prompt_length + len(generated) + accepted)
+            for token in draft[:accepted] + [predicted[accepted]]:
+                generated.append(token)
+                if token == eos_token_id or len(generated) >= max_new_tokens:
+                    break
+
+    return torch.cat([input_ids, torch.tensor([generated], device=input_ids.device)], dim=1)
+
+
+def score_candidate(model, input_ids, candidate_ids):
+    """Probability the model gives each candidate token after the prompt, from one forward pass"""
+    prompt_length = input_ids.shape[1]
+    candidate = torch.tensor([candidate_ids], device=input_ids.device)
+    with torch.no_grad():
+        logits = model(input_ids=torch.cat([input_ids, candidate], dim=1), use_cache=False).logits
+    # Logits at position i predict token i + 1
+    probs = torch.softmax(logits[0, prompt_length - 1:-1].float(), dim=-1)
+    return probs.gather(1, candidate[0].unsqueeze(1)).squeeze(1).tolist()
+
+
+def verify_candidate(model, input_ids, candidate_ids, min_token_prob=VERIFY_MIN_TOKEN_PROB):
+    """(accepted, token probabilities) for a complete candidate answer (end with EOS)"""
+    probs = score_candidate(model, input_ids, candidate_ids)
+    return min(probs) >= min_token_prob, probs
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Structured rating extractor
+Reads rating, ratingCount and reviewCount from the JSON embedded in the page
+source (schema.org JSON-LD aggregateRating, __NEXT_DATA__ / window state)
+instead of guessing them from visible text with loose regex patterns.
+"""
+
+import os
+import re
+import json
+
+# Set STRUCTURED_PREFETCH=0 to skip the plain HTTP fetch before starting Chrome
+STRUCTURED_PREFETCH = os.environ.get("STRUCTURED_PREFETCH", "1") != "0"
+FETCH_TIMEOUT = 10  # seconds
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+SCRIPT_RE = re.compile(r'<script\b([^>]*)>(.*?)</script\s*>', re.S | re.I)
+STATE_ASSIGN_RE = re.compile(r'window\.(__INITIAL_STATE__|__PRELOADED_STATE__|__APOLLO_STATE__)\s*=\s*')
+
+# Key names used for the same value by JSON-LD and app-state payloads
+RATING_KEYS = ('ratingValue', 'average_rating', 'averageRating', 'avg_rating', 'rating')
+RATING_COUNT_KEYS = ('ratingCount', 'rating_count', 'ratingsCount', 'ratings_count', 'total_ratings')
+REVIEW_COUNT_KEYS = ('reviewCount', 'review_count', 'reviewsCount', 'reviews_count', 'total_reviews')
+
+
+def _first_key(d, keys):
+    for key in keys:
+        if d.get(key) not in (None, ''):
+            return d[key]
+    return None
+
+
+def _format_rating(value):
+    """4.2 / "4.2" -> "4.2★", None if it is not a 0-5 rating"""
+    try:
+        number = float(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+    if not 0 <= number <= 5:
+        return None
+    text = str(value).strip() if isinstance(value, str) else f"{number:g}"
+    if '.' not in text:
+        text += '.0'
+    return f"{text}★"
+
+
+def _format_count(value, label):
+    """20596 / "20,596" -> "20596 Ratings" """
+    try:
+        number = int(float(str(value).replace(',', '').strip()))
+    except (TypeError, ValueError):
+        return None
+    return f"{number} {label}"
+
+
+def _walk(node):
+    """Yield every dict in a JSON document, depth first in document order"""
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, dict):
+            yield current
+            stack.extend(reversed(list(current.values())))
+        elif isinstance(current, list):
+            stack.extend(reversed(current))
+
+
+def _from_rating_dict(d):
+    """Build a result from a dict holding a rating plus at least one count"""
+    rating = _format_rating(_first_key(d, RATING_KEYS))
+    rating_count = _format_count(_first_key(d, RATING_COUNT_KEYS), 'Ratings')
+    review_count = _format_count(_first_key(d, REVIEW_COUNT_KEYS), 'Reviews')
+    if rating and (rating_count or review_count):
+        return {'rating': rating, 'rating_count': rating_count, 'review_count': review_count}
+    return None
+
+
+def _from_json_ld(data):
+    for d in _walk(data):
+        aggregate = d.get('aggregateRating')
+        if isinstance(aggregate, dict):
+            found = _from_rating_dict(aggregate)
+            if found:
+                return found
+    return None
+
+
+def _from_app_state(data):
+    # The product's own summary comes before seller and similar-product ratings
+    for d in _walk(data):
+        found = _from_rating_dict(d)
+        if found:
+            return found
+    return None
+
+
+def _load_json(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return None
+
+
+def extract_structured_ratings(page_source):
+    """Extract rating/rating_count/review_count from JSON embedded in the page
+
+    Returns a dict in the same format as extract_rating_reviews plus
+    'source' ('json-ld' or 'embedded-state'), or None if nothing was found.
+    """
+    if not page_source or '<script' not in page_source:
+        return None
+
+    state_scripts = []
+    for attrs, body in SCRIPT_RE.findall(page_source):
+        attrs = attrs.lower()
+        if 'application/ld+json' in attrs:
+            found = _from_json_ld(_load_json(body))
+            if found:
+                found['source'] = 'json-ld'
+                return found
+        elif '__next_data__' in attrs or 'application/json' in attrs:
+            state_scripts.append(body)
+        elif STATE_ASSIGN_RE.search(body):
+            state_scripts.append(body)
+
+    # JSON-LD was not found, try the app state
+    for body in state_scripts:
+        match = STATE_ASSIGN_RE.search(body)
+        if match:
+            try:
+                data, _ = json.JSONDecoder().raw_decode(body, match.end())
+            except ValueError:
+                continue
+        else:
+            data = _load_json(body)
+        found = _from_app_state(data)
+        if found:
+            found['source'] = 'embedded-state'
+            return found
+
+    return None
+
+
+def fetch_page_source(url, timeout=FETCH_TIMEOUT):
+    """Fetch raw HTML over plain HTTP (no browser), None on failure or block"""
+    import requests
+    try:
+        response = requests.get(url, headers={'User-Agent': USER_AGENT, 'Accept-Language': 'en-IN,en;q=0.9'}, timeout=timeout)
+        if response.status_code != 200:
+            print(f"[INFO] Raw fetch returned HTTP {response.status_code}")
+            return None
+        return response.text
+    except Exception as e:
+        print(f"[INFO] Raw fetch failed: {e}")
+        return None
+
+
+if __name__ == "__main__":
+    import sys
+    for path in sys.argv[1:] or ["data/pages/meesho_coffee_top.html"]:
+        with open(path, 'r', encoding='utf-8') as f:
+            print(path, json.dumps(extract_structured_ratings(f.read()), ensure_ascii=False))
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Distilled reviews/ratings student (distill.py) for CPU serving
+A small seq2seq model that maps the input text straight to the reviews JSON.
+Results have the same shape as generate_reviews_json: {"json": {...}} or
+{"error": ..., "raw": ...}.
+
+Used by inference.py when REVIEWS_BACKEND=student.
+Set STUDENT_THREADS to pin the number of CPU threads torch uses.
+"""
+
+import os
+import threading
+
+import torch
+from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, StoppingCriteriaList
+
+STUDENT_DIR = os.environ.get("STUDENT_DIR", "output-student-reviews-ratings")
+STUDENT_THREADS = os.environ.get("STUDENT_THREADS")
+STUDENT_MAX_INPUT = 256   # input tokens; rating-node snippets are far shorter
+STUDENT_MAX_OUTPUT = 64   # the JSON with three fields
+
+student_tokenizer = None
+student_model = None
+student_lock = threading.Lock()
+
+
+def load_student():
+    """Load the student model and tokenizer once"""
+    global student_tokenizer, student_model
+    with student_lock:
+        if student_model is None:
+            print(f"Loading student model from {STUDENT_DIR}...")
+            if STUDENT_THREADS:
+                torch.set_num_threads(int(STUDENT_THREADS))
+            student_tokenizer = AutoTokenizer.from_pretrained(STUDENT_DIR)
+            student_model = AutoModelForSeq2SeqLM.from_pretrained(STUDENT_DIR).eval()
+            print("Student model loaded successfully!")
+    return student_tokenizer, student_model
+
+
+def generate_student_json_batch(texts, max_new_tokens=STUDENT_MAX_OUTPUT, stats=None):
+    """Greedy-decode the reviews JSON for each text, one result dict per text
+
+    max_new_tokens is capped at STUDENT_MAX_OUTPUT, the longest output the student was trained on.
+    """
+    from inference import parse_json_output, count_new_tokens
+
+    max_new_tokens = min(max_new_tokens, STUDENT_MAX_OUTPUT)
+
+    tokenizer, model = load_student()
+    inputs = tokenizer(texts, return_tensors="pt", padding=True, truncation=True, max_length=STUDENT_MAX_INPUT)
+    timer = stats.start(model.device) if stats else None
+    with torch.inference_mode():
+        output = model.generate(
+            **inputs,
+            max_new_tokens=max_new_tokens,
+            do_sample=False,
+            num_beams=1,
+            stopping_criteria=StoppingCriteriaList([timer]) if timer else None
+        )
+    if stats:
+        # Decoder output starts with one decoder_start token
+        stats.finish(timer, 'reviews_student', int(inputs['attention_mask'].sum()),
+                     count_new_tokens(output, 1, tokenizer.eos_token_id), batch_size=len(texts))
+    return [parse_json_output(d) for d in tokenizer.batch_decode(output, skip_special_tokens=True)]
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test that continuous batching (continuous_batching.py) decodes exactly like
+greedy generate(), also when a small block pool forces preemption, and that
+a sequence larger than the whole pool raises instead of returning partial
+tokens. Also checks the working cache is only rebuilt from the blocks when
+the batch changes, and the pool sizing from the model config
+
+Usage: python test_continuous_batching.py   (builds a tiny random Llama, no download)
+"""
+
+import types
+
+import torch
+from transformers import LlamaConfig, LlamaForCausalLM
+
+from continuous_batching import ContinuousBatcher, kv_block_bytes
+
+VOCAB_SIZE = 256
+EOS_TOKEN_ID = 2
+MAX_NEW_TOKENS = 24
+
+
+def tiny_model():
+    torch.manual_seed(0)
+    config = LlamaConfig(vocab_size=VOCAB_SIZE, hidden_size=64, intermediate_size=128, num_hidden_layers=2,
+                         num_attention_heads=4, num_key_value_heads=2, max_position_embeddings=256,
+                         eos_token_id=EOS_TOKEN_ID, pad_token_id=0)
+    return LlamaForCausalLM(config).eval()
+
+
+def prompts(n, seed=1):
+    generator = torch.Generator().manual_seed(seed)
+    lengths = torch.randint(3, 30, (n,), generator=generator).tolist()
+    return [torch.randint(3, VOCAB_SIZE, (length,), generator=generator).tolist() for length in lengths]
+
+
+def greedy_reference(model, prompt_ids, max_new_tokens):
+    with torch.no_grad():
+        output = model.generate(torch.tensor([prompt_ids]), max_new_tokens=max_new_tokens, do_sample=False,
+                                pad_token_id=0, eos_token_id=EOS_TOKEN_ID)
+    return output[0, len(prompt_ids):].tolist()
+
+
+def check_matches_generate(model, num_blocks, block_size, max_batch_size):
+    batcher = ContinuousBatcher(model, types.SimpleNamespace(eos_token_id=EOS_TOKEN_ID),
+                                max_batch_size=max_batch_size, num_blocks=num_blocks, block_size=block_size)
+    prompt_ids = prompts(10)
+    generated = batcher.generate_all(prompt_ids, MAX_NEW_TOKENS)
+
+    mismatches = 0
+    for ids, got in zip(prompt_ids, generated):
+        want = greedy_reference(model, ids, MAX_NEW_TOKENS)
+        if got != want:
+            mismatches += 1
+            print(f"  ❌ prompt of {len(ids)} tokens: generate {want[:8]}..., batched {got[:8]}...")
+    print(f"{num_blocks} blocks of {block_size}, batch <= {max_batch_size}: "
+          f"{len(prompt_ids) - mismatches}/{len(prompt_ids)} match generate(), {batcher.preemptions} preemption(s), "
+          f"working cache rebuilt {batcher.gathers}x in {batcher.decode_steps} decode steps")
+    assert mismatches == 0
+    assert batcher.gathers < batcher.decode_steps / 2, "working cache must be reused while the batch is unchanged"
+    assert batcher.kv.allocator.free_blocks == num_blocks, "blocks leaked"
+    return batcher.preemptions
+
+
+def test_matches_generate():
+    model = tiny_model()
+    assert check_matches_generate(model, num_blocks=256, block_size=16, max_batch_size=4) == 0
+
+
+def test_matches_generate_with_preemption():
+    """A pool of 24 blocks of 4 tokens cannot hold 6 growing sequences at once"""
+    model = tiny_model()
+    assert check_matches_generate(model, num_blocks=24, block_size=4, max_batch_size=6) > 0
+
+
+def test_sequence_larger_than_pool():
+    model = tiny_model()
+    batcher = ContinuousBatcher(model, types.SimpleNamespace(eos_token_id=EOS_TOKEN_ID),
+                                max_batch_size=2, num_blocks=4, block_size=4)
+    try:
+        batcher.generate_all([list(range(3, 10)), list(range(3, 40))], MAX_NEW_TOKENS)
+        assert False, "a 37-token prompt cannot fit in 16 cached tokens"
+    except MemoryError as e:
+        print(f"Sequence larger than the pool: MemoryError({e})")
+
+    # Fits at first, outgrows the pool while decoding (after preempting itself)
+    try:
+        batcher.generate_all([list(range(3, 10))], 64)
+        assert False, "64 new tokens cannot fit in 16 cached tokens"
+    except MemoryError as e:
+        print(f"Sequence outgrowing the pool: MemoryError({e})")
+    assert batcher.kv.allocator.free_blocks == 4
+
+
+def test_pool_sizing():
+    model = tiny_model()
+    # 2 (keys, values) x 2 layers x 2 kv heads x 16 tokens x 16 head dim x 4 bytes
+    assert kv_block_bytes(model.config, torch.float32, 16) == 2 * 2 * 2 * 16 * 16 * 4
+    assert kv_block_bytes(model.config, torch.float16, 16) == 2 * 2 * 2 * 16 * 16 * 2
+    batcher = ContinuousBatcher(model, types.SimpleNamespace(eos_token_id=EOS_TOKEN_ID))
+    assert batcher.kv.allocator.num_blocks > 0
+    print(f"Block of 16 tokens: {kv_block_bytes(model.config, torch.float32, 16)} bytes, "
+          f"default pool on CPU: {batcher.kv.allocator.num_blocks} blocks")
+
+
+if __name__ == "__main__":
+    test_matches_generate()
+    test_matches_generate_with_preemption()
+    test_sequence_larger_than_pool()
+    test_pool_sizing()
+    print("\n✅ Continuous batching matches greedy generate(), with and without preemption")
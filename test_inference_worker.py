@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test the inference worker transport: several client processes (and threads
+within one) talk to one worker process, payloads from a few bytes to
+megabytes round-trip intact through shared memory, every client sees the
+same worker (one model per host) and no shared memory block is left behind
+
+Usage: python test_inference_worker.py   (no model needed: ping/status only)
+"""
+
+import os
+import sys
+import time
+import tempfile
+import threading
+import subprocess
+import multiprocessing
+
+from inference_worker import InferenceClient, BLOCK_PREFIX
+
+SIZES = [0, 10, 70 * 1024, 3 * 1024 * 1024, 100]  # the 64 KB block grows, then is reused
+
+
+def shm_blocks(pids):
+    """Shared memory blocks owned by the given processes (names are infw-<pid>-...)"""
+    if not os.path.isdir('/dev/shm'):
+        return set()
+    prefixes = tuple(f"{BLOCK_PREFIX}{pid}-" for pid in pids)
+    return {name for name in os.listdir('/dev/shm') if name.startswith(prefixes)}
+
+
+def wait_for_worker(address, process, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Inference worker exited during startup")
+        try:
+            return InferenceClient(address).status()
+        except (ConnectionError, OSError):
+            time.sleep(0.2)
+    raise RuntimeError("Inference worker did not start")
+
+
+def client_process(address, seed, results):
+    client = InferenceClient(address)
+    pids = set()
+    for size in SIZES:
+        payload = {'texts': [f"{seed}:{'★' * (size // 3)}"], 'n': size}
+        assert client.call('ping', payload) == payload, f"payload of {size} bytes corrupted"
+        pids.add(client.status()['pid'])
+    client.close()
+    results.put((seed, pids))
+
+
+def worker_address(directory):
+    return os.path.join(directory, 'worker.sock') if os.name == 'posix' else rf'\\.\pipe\inference-worker-test-{os.getpid()}'
+
+
+def check_worker(address):
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'inference_worker.py')
+    process = subprocess.Popen([sys.executable, script, '--socket', address])
+    pids = {os.getpid(), process.pid}
+    try:
+        worker_pid = wait_for_worker(address, process)['pid']
+        print(f"Worker pid {worker_pid} on {address}")
+
+        # Several web worker processes
+        results = multiprocessing.Queue()
+        clients = [multiprocessing.Process(target=client_process, args=(address, i, results)) for i in range(4)]
+        start = time.perf_counter()
+        for p in clients:
+            p.start()
+            pids.add(p.pid)
+        seen = [results.get(timeout=120) for _ in clients]
+        for p in clients:
+            p.join()
+        print(f"4 processes x {len(SIZES)} round trips (up to {max(SIZES) // 1024} KB): "
+              f"{time.perf_counter() - start:.2f}s")
+        assert all(p.exitcode == 0 for p in clients)
+        assert all(pids == {worker_pid} for _, pids in seen), seen
+
+        # Threads of one web worker share a client
+        client = InferenceClient(address)
+        errors = []
+
+        def thread_calls(i):
+            try:
+                for j in range(20):
+                    text = f"thread {i} call {j} " * (j * 50)
+                    assert client.call('ping', [text]) == [text]
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=thread_calls, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert not errors, errors
+        print(f"8 threads x 20 calls over {len(client._idle)} pooled connections")
+
+        timings = []
+        for _ in range(200):
+            t0 = time.perf_counter()
+            client.call('ping', ['Rating: 4.2 ★ 20,596 Ratings & 9,777 Reviews'])
+            timings.append((time.perf_counter() - t0) * 1000)
+        timings.sort()
+        print(f"Round trip p50 {timings[100]:.3f} ms, p95 {timings[190]:.3f} ms")
+
+        try:
+            client.call('no_such_op')
+            assert False, "unknown op should fail"
+        except RuntimeError as e:
+            print(f"Unknown op: {e}")
+        client.close()
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+    leaked = shm_blocks(pids)
+    print(f"Shared memory blocks left behind: {len(leaked)}")
+    assert not leaked, leaked
+
+
+def test_worker(tmp_path):
+    check_worker(worker_address(str(tmp_path)))
+
+
+if __name__ == "__main__":
+    check_worker(worker_address(tempfile.mkdtemp()))
+    print("\n✅ One worker serves every client process through shared memory")
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test the balanced-brace JSON scanner (json_scan.py) and parse_json_output on
+adversarial completions: braces inside strings, escaped quotes, text and
+more objects after the answer, truncated output, and the same text fed
+one character at a time
+
+Usage: python test_json_scan.py   (no model needed)
+"""
+
+import json
+
+from json_scan import JsonObjectScanner, find_json_object
+
+ANSWER = '{"Rating": 4.2, "Rating Count": 20596, "Review Count": 9777}'
+
+CASES = [
+    # (completion, expected object string or None)
+    (ANSWER, ANSWER),
+    ('\n ' + ANSWER + '\n', ANSWER),
+    ('Here is the JSON: ' + ANSWER, ANSWER),
+    (ANSWER + ' } trailing } braces {', ANSWER),
+    (ANSWER + '\n\n### Input:\n{"Rating": 1.0}', ANSWER),
+    (ANSWER + ANSWER, ANSWER),
+    ('{"title": "Set {of} 3 }}}", "n": 1}', '{"title": "Set {of} 3 }}}", "n": 1}'),
+    ('{"q": "say \\"{hi}\\"", "n": 2} {', '{"q": "say \\"{hi}\\"", "n": 2}'),
+    ('{"path": "C:\\\\"}', '{"path": "C:\\\\"}'),
+    ('{"path": "C:\\\\", "x": "}"} tail', '{"path": "C:\\\\", "x": "}"}'),
+    ('{"a": {"b": {"c": [1, {"d": null}]}}}}', '{"a": {"b": {"c": [1, {"d": null}]}}}'),
+    ('{"emoji": "4.2★ 😀 日本語"}', '{"emoji": "4.2★ 😀 日本語"}'),
+    ('{}', '{}'),
+    ('no json here', None),
+    ('} only closing }', None),
+    ('"{quoted}" then {"ok": true}', '{quoted}'),  # quotes before the object are prose, not JSON
+    ('{"Rating": 4.2, "Rating Count": 205', None),  # max_new_tokens hit
+    ('', None),
+]
+
+
+def test_cases():
+    for text, expected in CASES:
+        got = find_json_object(text)
+        assert got == expected, f"{text!r}: expected {expected!r}, got {got!r}"
+    print(f"{len(CASES)} adversarial completions: first complete object found")
+
+
+def test_streaming():
+    """Feeding one character at a time gives the same object, returned at its closing brace"""
+    for text, expected in CASES:
+        scanner = JsonObjectScanner()
+        got, fed = None, 0
+        for char in text:
+            fed += 1
+            got = scanner.feed(char)
+            if got is not None:
+                break
+        assert got == expected, f"{text!r} fed per character: expected {expected!r}, got {got!r}"
+        if expected is not None:
+            assert text[:fed].endswith(expected), "scanner must stop at the closing brace"
+    # an escaped quote split across pieces
+    scanner = JsonObjectScanner()
+    for piece in ('{"q": "a\\', '"', '}', '"}'):
+        got = scanner.feed(piece)
+    assert got == '{"q": "a\\"}"}' and json.loads(got) == {'q': 'a"}'}
+    print("Per-character feeding matches, escapes split across pieces handled")
+
+
+def test_parse_json_output():
+    from inference import parse_json_output
+
+    assert parse_json_output(ANSWER + ' {junk') == {'json': json.loads(ANSWER)}
+    assert parse_json_output('{"t": "a { b"} {"t": 2}') == {'json': {'t': 'a { b'}}
+
+    result = parse_json_output('nothing')
+    assert result['error'] == 'no json found' and result['raw'] == 'nothing'
+
+    truncated = '{"Rating": 4.2, "Rating Count": 205'
+    result = parse_json_output(truncated)
+    assert result['error'] == 'json parse error' and result['raw'] == truncated
+
+    result = parse_json_output("{'Rating': 4.2}")
+    assert result['error'] == 'json parse error' and result['raw'] == "{'Rating': 4.2}"
+    print("parse_json_output keeps its result shape: json / no json found / json parse error")
+
+
+def test_long_inputs():
+    """Unbalanced or deeply nested text stays linear and never raises"""
+    assert find_json_object('{' * 100000) is None
+    assert find_json_object('{"a": "' + '\\' * 100001) is None
+    deep = '{"a": ' * 5000 + '1' + '}' * 5000
+    assert find_json_object(deep + '}}}') == deep
+    print("100k-character unbalanced inputs and 5000-deep nesting handled")
+
+
+if __name__ == "__main__":
+    test_cases()
+    test_streaming()
+    test_parse_json_output()
+    test_long_inputs()
+    print("\n✅ JSON scanner returns the first complete object of the completion")
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test ModelManager under concurrent callers: one load however many threads
+race for it, never more than `concurrency` calls inside a slot, ModelBusy
+(503 from a Flask app) when the queue is full or the wait times out
+
+Usage: python test_model_manager.py   (no model needed)
+"""
+
+import time
+import threading
+
+from model_manager import ModelManager, ModelBusy, init_app
+
+
+def test_load_once():
+    """16 threads asking for an unloaded model trigger exactly one load"""
+    calls = []
+
+    def loader():
+        calls.append(threading.get_ident())
+        time.sleep(0.2)  # long enough for every thread to arrive while loading
+        return 'tokenizer', object()
+
+    manager = ModelManager('test', loader)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(manager.load())) for _ in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    print(f"Loader calls: {len(calls)}, distinct models handed out: {len({id(m) for _, m in results})}")
+    assert len(calls) == 1
+    assert len({id(m) for _, m in results}) == 1
+
+
+def test_failed_load_is_retried():
+    attempts = []
+
+    def loader():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise OSError("disk hiccup")
+        return 'tokenizer', 'model'
+
+    manager = ModelManager('test', loader)
+    try:
+        manager.load()
+        assert False, "first load should fail"
+    except OSError:
+        pass
+    assert not manager.loaded
+    assert manager.load() == ('tokenizer', 'model')
+    assert manager.loaded and len(attempts) == 2
+
+
+def test_concurrency_bound():
+    """Never more than `concurrency` callers inside a slot at once"""
+    manager = ModelManager('test', None, concurrency=2, queue_size=32, timeout=10)
+    inside, peak = [0], [0]
+    lock = threading.Lock()
+
+    def call():
+        with manager.slot():
+            with lock:
+                inside[0] += 1
+                peak[0] = max(peak[0], inside[0])
+            time.sleep(0.02)
+            with lock:
+                inside[0] -= 1
+
+    threads = [threading.Thread(target=call) for _ in range(12)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    print(f"Peak concurrent calls: {peak[0]} (limit 2)")
+    assert peak[0] == 2
+    assert manager.status()['active'] == 0 and manager.status()['waiting'] == 0
+
+
+def test_queue_full_and_timeout():
+    """With the slot held and the queue full the next caller is refused at once; a waiter times out"""
+    manager = ModelManager('test', None, concurrency=1, queue_size=1, timeout=0.3)
+    release = threading.Event()
+    holding = threading.Event()
+
+    def hold():
+        with manager.slot():
+            holding.set()
+            release.wait()
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    holding.wait()
+
+    waiter_error = []
+
+    def wait():
+        try:
+            with manager.slot():
+                pass
+        except ModelBusy as e:
+            waiter_error.append(e)
+
+    waiter = threading.Thread(target=wait)
+    waiter.start()
+    while manager.status()['waiting'] < 1:
+        time.sleep(0.001)
+
+    start = time.perf_counter()
+    try:
+        with manager.slot():
+            assert False, "queue is full"
+    except ModelBusy as e:
+        print(f"Refused in {(time.perf_counter() - start) * 1000:.1f} ms: {e}")
+    assert time.perf_counter() - start < 0.1
+
+    waiter.join()
+    print(f"Waiter: {waiter_error[0]}")
+    assert len(waiter_error) == 1 and 'after' in str(waiter_error[0])
+    release.set()
+    holder.join()
+
+    status = manager.status()
+    assert status['rejected'] == 1 and status['timeouts'] == 1
+    with manager.slot():  # free again
+        pass
+
+
+def test_flask_503():
+    from flask import Flask
+    app = Flask(__name__)
+    init_app(app)
+
+    @app.route('/busy')
+    def busy():
+        raise ModelBusy("reviews model busy")
+
+    response = app.test_client().get('/busy')
+    print(f"Flask: {response.status_code} Retry-After={response.headers.get('Retry-After')} {response.get_json()}")
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert response.get_json()['success'] is False
+
+
+if __name__ == "__main__":
+    test_load_once()
+    test_failed_load_is_retried()
+    test_concurrency_bound()
+    test_queue_full_and_timeout()
+    test_flask_503()
+    print("\n✅ ModelManager loads once, bounds concurrency and refuses when busy")
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test that packed training windows give the same logits and loss as training
+on each example separately (attention stays inside example boundaries)
+
+Usage: python test_packing.py [model_path] [max_length]   (default: $MODEL or the training MODEL, 512)
+"""
+
+import os
+import sys
+import json
+
+import torch
+from transformers import AutoTokenizer, AutoModelForCausalLM
+
+from packing import pack_examples, PackedCollator, IGNORE_INDEX
+
+MAX_LENGTH = 512
+
+
+def load_examples(tokenizer, max_length):
+    examples = []
+    for path in ("data/reviews_ratings_train.jsonl", "data/reviews_ratings_val.jsonl"):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                ex = json.loads(line)
+                prompt = f"### Instruction:\n{ex['instruction']}\n\n### Input:\n{ex['input']}\n\n### Output:\n{ex['output']}"
+                ids = tokenizer(prompt, truncation=True, max_length=max_length)['input_ids']
+                examples.append({'input_ids': ids, 'labels': list(ids)})
+    return examples
+
+
+def test_packing(model_path=None, max_length=MAX_LENGTH):
+    """Per-token loss of every example is identical packed and unpacked"""
+    model_path = model_path or os.environ.get("MODEL", "meta-llama/Llama-2-7b-chat-hf")
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    model = AutoModelForCausalLM.from_pretrained(model_path, dtype=torch.float32).eval()
+    model.config.use_cache = False
+    examples = load_examples(tokenizer, max_length)
+    windows = pack_examples(examples, max_length)
+
+    print("=" * 80)
+    print(f"PACKING TEST ({len(examples)} examples -> {len(windows)} windows of <= {max_length} tokens)")
+    print("=" * 80)
+
+    packed_tokens = sum(len(w['input_ids']) for w in windows)
+    assert packed_tokens == sum(len(ex['input_ids']) for ex in examples)
+    assert all(len(w['input_ids']) <= max_length for w in windows)
+
+    batch = PackedCollator(tokenizer.pad_token_id or tokenizer.eos_token_id)(windows)
+    with torch.no_grad():
+        packed_logits = model(input_ids=batch['input_ids'], position_ids=batch['position_ids']).logits
+
+    failures = 0
+    for row, window in enumerate(windows):
+        start = 0
+        for pos in [i for i, p in enumerate(window['position_ids']) if p == 0][1:] + [len(window['input_ids'])]:
+            ids = window['input_ids'][start:pos]
+            with torch.no_grad():
+                alone = model(input_ids=torch.tensor([ids])).logits[0]
+            diff = (packed_logits[row, start:pos] - alone).abs().max().item()
+            if diff > 1e-4:
+                failures += 1
+                print(f"  ❌ window {row}, tokens {start}-{pos}: max logit diff {diff:.2e}")
+            assert window['labels'][start] == IGNORE_INDEX
+            start = pos
+
+    # Loss over the packed batch == token-weighted loss over the examples one by one
+    with torch.no_grad():
+        packed_loss = model(**batch).loss.item()
+        total, count = 0.0, 0
+        for ex in examples:
+            n = len(ex['input_ids']) - 1
+            total += model(input_ids=torch.tensor([ex['input_ids']]), labels=torch.tensor([ex['labels']])).loss.item() * n
+            count += n
+    print(f"Loss packed: {packed_loss:.6f}  unpacked: {total / count:.6f}")
+    assert abs(packed_loss - total / count) < 1e-4
+
+    if failures:
+        print(f"\n❌ {failures} example(s) attended across boundaries")
+    else:
+        print("\n✅ Packed windows match per-example forward passes")
+    assert failures == 0
+
+
+if __name__ == "__main__":
+    test_packing(sys.argv[1] if len(sys.argv) > 1 else None,
+                 int(sys.argv[2]) if len(sys.argv) > 2 else MAX_LENGTH)
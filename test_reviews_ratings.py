@@ -4,7 +4,8 @@ Test script for reviews and ratings extraction
 """
 
 import json
-from inference import generate_reviews_json, extract_reviews_ratings
+from inference import extract_reviews_ratings
+from evaluate_extractors import evaluate
 
 def test_reviews_ratings():
     """Test reviews and ratings extraction"""
@@ -53,11 +54,10 @@ def test_reviews_ratings():
     print("TESTING GENERATE_REVIEWS_JSON")
     print("=" * 80)
     
-    for i, test_case in enumerate(test_cases, 1):
-        print(f"\nTest Case {i}: {test_case['name']}")
-        print("-" * 80)
-        
-        # Build input text
+    # Build gold records in the training-data format and run them through the
+    # evaluation harness (evaluate_extractors.py) as one batch
+    records = []
+    for test_case in test_cases:
         input_text = ""
         if test_case.get('rating'):
             input_text += f"Rating: \"{test_case['rating']}\" "
@@ -66,31 +66,14 @@ def test_reviews_ratings():
         if test_case.get('rating_count_raw'):
             # Note: rating_count_raw is actually Review_Count
             input_text += f"Review Count: \"{test_case['rating_count_raw']}\""
-        
-        print(f"Input: {input_text}")
-        print(f"Expected Output: {json.dumps(test_case['expected'], indent=2)}")
-        
-        # Test extraction
-        result = generate_reviews_json(input_text)
-        
-        print(f"Actual Result: {json.dumps(result, indent=2)}")
-        
-        if 'json' in result:
-            extracted = result['json']
-            print("\n✅ Extraction successful!")
-            
-            # Validate against expected
-            for key, expected_value in test_case['expected'].items():
-                actual_value = extracted.get(key)
-                if actual_value == expected_value:
-                    print(f"  ✅ {key}: {actual_value}")
-                else:
-                    print(f"  ❌ {key}: Expected '{expected_value}', got '{actual_value}'")
-        else:
-            print("\n❌ Extraction failed!")
-            print(f"Error: {result.get('error', 'Unknown error')}")
-        
-        print("-" * 80)
+        records.append((input_text, test_case['expected']))
+    
+    for name in ('llm', 'regex'):
+        result = evaluate(name, records, batch_size=len(records), warmup=0)
+        print(f"\n{name}: all fields {result['all_fields']:.0%}, failed {result['failed']}, "
+              f"{result['records_per_s']:.1f} records/s")
+        for field, accuracy in result['exact_match'].items():
+            print(f"  {'✅' if accuracy == 1 else '❌'} {field}: {accuracy:.0%}")
     
     print("\n" + "=" * 80)
     print("TESTING EXTRACT_REVIEWS_RATINGS")
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test that encode_prompts (shared fast tokenizer + cached instruction prefix)
+gives exactly the token ids of tokenizing each full prompt, and the ids the
+slow (use_fast=False) tokenizer gave training examples - adapters trained
+before train_reviews_ratings.py switched to the fast tokenizer saw those
+
+Usage: python test_tokenization.py [tokenizer_path]   (default: inference.MODEL; needs tokenizer.model for the slow one)
+"""
+
+import sys
+import glob
+
+from transformers import AutoTokenizer
+
+import inference
+from inference import (encode_prompts, build_prompt, build_reviews_prompt,
+                       ATTRIBUTES_INSTRUCTION, REVIEWS_INSTRUCTION)
+
+TEXTS = [
+    '',
+    'Rating: "4.2★" Rating Count: "20596 Ratings" Review Count: "9777 Reviews"',
+    '4.1 ★ 1,234 ratings and 567 reviews',
+    '  two leading spaces',
+    '\nstarts with a newline',
+    '\n\nstarts with two newlines',
+    'ends with a newline\n',
+    'Title: "Acme UltraSneak 3000 - Men\'s Running Shoes - Blue/White - Size 10" Price: "$89.99"',
+    '₹197 Free Delivery 3.9★ 1,01,234 Ratings',
+    'ÄÖÜ ß 日本語 😀 tabs\tand\r\nCRLF',
+    '### Output:\n{"Rating": null}',
+]
+
+
+def load_texts():
+    texts = list(TEXTS)
+    for path in sorted(glob.glob("data/pages/*.txt")):
+        with open(path, 'r', encoding='utf-8') as f:
+            texts.append(f.read()[:4000])
+    return texts
+
+
+def test_prompt_token_ids(tokenizer_path=None):
+    """encode_prompts ids == tokenizer(full prompt) ids, one by one and batched"""
+    tok = AutoTokenizer.from_pretrained(tokenizer_path or inference.MODEL, use_fast=True)
+    tok.pad_token = tok.eos_token
+    texts = load_texts()
+
+    print("=" * 80)
+    print(f"PROMPT TOKENIZATION TEST ({type(tok).__name__}, {len(texts)} texts)")
+    print("=" * 80)
+
+    failures = 0
+    for instr, build in ((REVIEWS_INSTRUCTION, build_reviews_prompt), (ATTRIBUTES_INSTRUCTION, build_prompt)):
+        expected = [tok(build(text))['input_ids'] for text in texts]
+
+        batch = encode_prompts(tok, instr, texts)
+        for text, want, ids, mask in zip(texts, expected, batch['input_ids'].tolist(), batch['attention_mask'].tolist()):
+            got = [i for i, m in zip(ids, mask) if m]
+            single = encode_prompts(tok, instr, [text])['input_ids'][0].tolist()
+            if got != want or single != want:
+                failures += 1
+                print(f"  ❌ {text[:40]!r}: expected {want[-12:]}, batched {got[-12:]}, single {single[-12:]}")
+
+    cached = all(inference.prefix_cache.get((id(tok), instr)) for instr in (REVIEWS_INSTRUCTION, ATTRIBUTES_INSTRUCTION))
+    print(f"Prefix cache in use: {cached}")
+    if failures:
+        print(f"\n❌ {failures} prompt(s) tokenized differently")
+    else:
+        print("\n✅ All prompts tokenized identically")
+    assert failures == 0
+
+
+def test_training_token_ids(tokenizer_path=None):
+    """encode_prompts ids == slow tokenizer ids of the prompt in the training format (prompt + output + EOS)"""
+    tok = AutoTokenizer.from_pretrained(tokenizer_path or inference.MODEL, use_fast=True)
+    tok.pad_token = tok.eos_token
+    slow = AutoTokenizer.from_pretrained(tokenizer_path or inference.MODEL, use_fast=False)
+    texts = load_texts()
+    output = '{"Rating": "4.2", "Rating_Count": "20596", "Review_Count": "9777"}'
+
+    print("=" * 80)
+    print(f"TRAINING TOKENIZATION TEST (fast {type(tok).__name__} vs slow {type(slow).__name__}, {len(texts)} texts)")
+    print("=" * 80)
+
+    failures = 0
+    for instr, build in ((REVIEWS_INSTRUCTION, build_reviews_prompt), (ATTRIBUTES_INSTRUCTION, build_prompt)):
+        batch = encode_prompts(tok, instr, texts)
+        for text, ids, mask in zip(texts, batch['input_ids'].tolist(), batch['attention_mask'].tolist()):
+            got = [i for i, m in zip(ids, mask) if m]
+            # train_reviews_ratings.format_example: prompt ids and the full example they prefix
+            want = slow(build(text))['input_ids']
+            full = slow(build(text) + output + slow.eos_token)['input_ids']
+            if got != want or full[:len(want)] != want:
+                failures += 1
+                print(f"  ❌ {text[:40]!r}: slow {want[-12:]}, served {got[-12:]}")
+
+    if failures:
+        print(f"\n❌ {failures} prompt(s) served with different ids than in training")
+    else:
+        print("\n✅ Served prompt ids match the slow tokenizer's training ids")
+    assert failures == 0
+
+
+if __name__ == "__main__":
+    test_prompt_token_ids(sys.argv[1] if len(sys.argv) > 1 else None)
+    test_training_token_ids(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Request-level latency tracing for the Flask apps
+Times the stages of a request (driver init, navigation, page load, parsing,
+inference...) as spans. Every response gets a Server-Timing header with its
+spans, a [TRACE] JSON line is logged per request, and /metrics serves
+Prometheus-format histograms per stage.
+
+Usage:
+    from tracing import init_app, span
+    init_app(app, 'final')
+
+    with span('driver_init'):
+        driver = uc.Chrome(...)
+
+    stage = span('page_load')   # for long blocks: start now, end() later
+    ...
+    stage.end()
+"""
+
+import os
+import json
+import time
+import threading
+
+from flask import g, has_request_context, request, Response
+
+# Set TRACE_LOG=0 to stop logging a [TRACE] line per request
+TRACE_LOG = os.environ.get("TRACE_LOG", "1") != "0"
+
+# Histogram bucket upper bounds in seconds - regex parsing is sub-millisecond,
+# page loads and model inference take tens of seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+_service = None
+_lock = threading.Lock()
+_histograms = {}  # (metric, labels) -> [bucket counts..., count, sum]
+
+
+def _observe(metric, labels, seconds):
+    key = (metric, tuple(sorted(labels.items())))
+    with _lock:
+        entry = _histograms.get(key)
+        if entry is None:
+            entry = _histograms[key] = [0] * (len(BUCKETS) + 2)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                entry[i] += 1
+        entry[-2] += 1
+        entry[-1] += seconds
+
+
+class span:
+    """Time one stage of the current request
+
+    Works as a context manager or started on creation and closed with end().
+    Outside a request (scripts, tests) only the histogram is updated.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.start = time.perf_counter()
+        self.duration = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end(error=exc_type is not None)
+        return False
+
+    def end(self, error=False):
+        if self.duration is not None:
+            return self.duration
+        self.duration = time.perf_counter() - self.start
+        _observe('extract_stage_duration_seconds', {'app': _service or 'none', 'stage': self.name}, self.duration)
+        if has_request_context() and hasattr(g, 'trace_spans'):
+            record = {'stage': self.name, 'ms': round(self.duration * 1000, 2)}
+            if error:
+                record['error'] = True
+            g.trace_spans.append(record)
+        return self.duration
+
+
+def _before_request():
+    g.trace_start = time.perf_counter()
+    g.trace_spans = []
+
+
+def _after_request(response):
+    if not hasattr(g, 'trace_start'):
+        return response
+    total = time.perf_counter() - g.trace_start
+    # Route pattern, not the raw path, so unknown URLs do not add label values
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    _observe('extract_request_duration_seconds',
+             {'app': _service, 'route': route, 'status': str(response.status_code)}, total)
+
+    if request.path != '/metrics':
+        timings = [f"{s['stage']};dur={s['ms']}" for s in g.trace_spans]
+        timings.append(f"total;dur={total * 1000:.2f}")
+        response.headers['Server-Timing'] = ', '.join(timings)
+        if TRACE_LOG:
+            print("[TRACE] " + json.dumps({
+                'app': _service,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'total_ms': round(total * 1000, 2),
+                'spans': g.trace_spans,
+            }))
+    return response
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + ([extra] if extra else [])
+    return '{' + ','.join(f'{k}="{v}"' for k, v in items) + '}'
+
+
+def render_metrics():
+    """All histograms in the Prometheus text exposition format"""
+    with _lock:
+        snapshot = {key: list(entry) for key, entry in _histograms.items()}
+
+    lines = []
+    for metric, help_text in (
+        ('extract_stage_duration_seconds', 'Time spent in each request stage'),
+        ('extract_request_duration_seconds', 'Total request time'),
+    ):
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} histogram")
+        for (name, labels), entry in sorted(snapshot.items()):
+            if name != metric:
+                continue
+            for bound, count in zip(BUCKETS, entry):
+                lines.append(f"{metric}_bucket{_format_labels(labels, ('le', bound))} {count}")
+            lines.append(f"{metric}_bucket{_format_labels(labels, ('le', '+Inf'))} {entry[-2]}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {entry[-2]}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {entry[-1]:.6f}")
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app, service):
+    """Attach per-request tracing and a /metrics endpoint to a Flask app"""
+    global _service
+    _service = service
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.add_url_rule('/metrics', 'metrics',
+                     lambda: Response(render_metrics(), mimetype='text/plain; version=0.0.4'))
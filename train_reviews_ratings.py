@@ -6,20 +6,61 @@ Extracts: Rating, Rating_Count, Review_Count
 
 import os
 import json
-from datasets import load_dataset
-from transformers import AutoTokenizer, AutoModelForCausalLM, DataCollatorForLanguageModeling, Trainer, TrainingArguments
+import glob
+import hashlib
+from datasets import load_dataset, load_from_disk, Dataset
+from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig, DataCollatorForSeq2Seq, Trainer, TrainingArguments, EarlyStoppingCallback
 from peft import LoraConfig, get_peft_model, prepare_model_for_kbit_training
 import torch
+from packing import pack_examples, PackedCollator, IGNORE_INDEX, PACKED_MASK_AVAILABLE
+from training_report import TrainingReport
+from prompts import format_prompt
+
+try:
+    import bitsandbytes  # noqa: F401 - needed by BitsAndBytesConfig and paged_adamw_32bit
+    BNB_AVAILABLE = True
+except ImportError:
+    BNB_AVAILABLE = False
 
 # Configuration
 MODEL = os.environ.get("MODEL", "meta-llama/Llama-2-7b-chat-hf")
-OUTPUT_DIR = "output-llama-lora-reviews-ratings"
-TRAIN_FILE = "data/reviews_ratings_train.jsonl"
-VAL_FILE = "data/reviews_ratings_val.jsonl"
+OUTPUT_DIR = os.environ.get("OUTPUT_DIR", "output-llama-lora-reviews-ratings")
+# Single files or glob patterns, e.g. the shards from generate_training_data.py
+TRAIN_FILE = os.environ.get("TRAIN_FILE", "data/reviews_ratings_train.jsonl")
+VAL_FILE = os.environ.get("VAL_FILE", "data/reviews_ratings_val.jsonl")
 BATCH_SIZE = 1
-EPOCHS = 30
+EPOCHS = int(os.environ.get("EPOCHS", "10"))  # loss is on the output only, so far fewer epochs are needed
+EARLY_STOPPING_PATIENCE = int(os.environ.get("EARLY_STOPPING_PATIENCE", "3"))  # evals without eval_loss improvement
 LR = 2e-5
 MAX_LENGTH = 512
+GRADIENT_ACCUMULATION_STEPS = 32  # examples per optimizer step when unpacked
+# Set PACKING=0 to train one padded example per row instead of packing
+# several examples into each MAX_LENGTH window (packing.py)
+PACKING = os.environ.get("PACKING", "1") == "1"
+if PACKING and not PACKED_MASK_AVAILABLE:
+    print("WARNING: this transformers version does not build block-diagonal masks from packed position_ids. Falling back to PACKING=0.")
+    PACKING = False
+# Tokenized datasets are cached here, keyed by tokenizer + data + format
+TOKENIZED_CACHE_DIR = os.environ.get("TOKENIZED_CACHE_DIR", ".cache/tokenized")
+FORMAT_VERSION = 3  # bump when format_example changes
+# QUANTIZATION=4bit (QLoRA): NF4 base weights with double quantization, LoRA
+# adapters trained in the compute dtype. QUANTIZATION=none: the previous
+# full-precision setup (fp16 load, upcast to fp32 for training).
+QUANTIZATION = os.environ.get("QUANTIZATION", "4bit")
+MAX_STEPS = int(os.environ.get("MAX_STEPS", "-1"))  # > 0 stops early, e.g. for a memory/step-time comparison
+OPTIM = "paged_adamw_32bit" if BNB_AVAILABLE else "adamw_torch"
+
+if QUANTIZATION == "4bit" and not (BNB_AVAILABLE and torch.cuda.is_available()):
+    print("WARNING: 4-bit training needs bitsandbytes and a CUDA GPU. Falling back to QUANTIZATION=none.")
+    QUANTIZATION = "none"
+# Recompute activations in the backward pass instead of storing them, and bf16
+# compute where supported (same range as fp32, so no loss scaling). Both are on
+# by default for 4bit only: none reproduces the previous run (fp16 mixed
+# precision, no checkpointing) as the baseline. Set either to 1/0 to override.
+GRADIENT_CHECKPOINTING = os.environ.get("GRADIENT_CHECKPOINTING", "1" if QUANTIZATION == "4bit" else "0") == "1"
+BF16 = (os.environ.get("BF16", "1" if QUANTIZATION == "4bit" else "0") == "1"
+        and torch.cuda.is_available() and torch.cuda.is_bf16_supported())
+COMPUTE_DTYPE = torch.bfloat16 if BF16 else torch.float16
 
 print("=" * 80)
 print("REVIEWS AND RATINGS EXTRACTION TRAINING")
@@ -32,20 +73,28 @@ print(f"Validation File: {VAL_FILE}")
 print(f"Epochs: {EPOCHS}")
 print(f"Batch Size: {BATCH_SIZE}")
 print(f"Learning Rate: {LR}")
+print(f"Packing: {PACKING}")
+print(f"Quantization: {QUANTIZATION}")
+print(f"Gradient Checkpointing: {GRADIENT_CHECKPOINTING}")
+print(f"Mixed Precision: {'bf16' if BF16 else 'fp16' if torch.cuda.is_available() else 'none (CPU)'}")
+print(f"Optimizer: {OPTIM}")
 print("=" * 80)
 
 # Check if training files exist
-if not os.path.exists(TRAIN_FILE):
+train_files = sorted(glob.glob(TRAIN_FILE))
+val_files = sorted(glob.glob(VAL_FILE))
+
+if not train_files:
     print(f"ERROR: Training file {TRAIN_FILE} not found!")
     exit(1)
 
-if not os.path.exists(VAL_FILE):
+if not val_files:
     print(f"ERROR: Validation file {VAL_FILE} not found!")
     exit(1)
 
 print("Loading dataset...")
 try:
-    dataset = load_dataset("json", data_files={"train": TRAIN_FILE, "validation": VAL_FILE})
+    dataset = load_dataset("json", data_files={"train": train_files, "validation": val_files})
     print(f"Training samples: {len(dataset['train'])}")
     print(f"Validation samples: {len(dataset['validation'])}")
     
@@ -63,16 +112,31 @@ except Exception as e:
 
 print("Loading tokenizer and model...")
 try:
-    tokenizer = AutoTokenizer.from_pretrained(MODEL, use_fast=False)
+    # The same fast tokenizer inference.py serves with, so prompt ids match at inference time
+    tokenizer = AutoTokenizer.from_pretrained(MODEL, use_fast=True)
     tokenizer.pad_token = tokenizer.eos_token
     
     # Load model with appropriate settings
-    model = AutoModelForCausalLM.from_pretrained(
-        MODEL, 
-        trust_remote_code=True, 
-        device_map="auto", 
-        torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32
-    )
+    if QUANTIZATION == "4bit":
+        model = AutoModelForCausalLM.from_pretrained(
+            MODEL,
+            trust_remote_code=True,
+            device_map="auto",
+            quantization_config=BitsAndBytesConfig(
+                load_in_4bit=True,
+                bnb_4bit_quant_type="nf4",
+                bnb_4bit_use_double_quant=True,
+                bnb_4bit_compute_dtype=COMPUTE_DTYPE
+            ),
+            dtype=COMPUTE_DTYPE
+        )
+    else:
+        model = AutoModelForCausalLM.from_pretrained(
+            MODEL, 
+            trust_remote_code=True, 
+            device_map="auto", 
+            dtype=torch.float16 if torch.cuda.is_available() else torch.float32
+        )
     print("Model loaded successfully!")
 except Exception as e:
     print(f"ERROR loading model: {e}")
@@ -83,21 +147,83 @@ def format_example(ex):
     instr = ex.get("instruction", "")
     inp = ex.get("input", "")
     out = ex.get("output", "")
-    prompt = f"### Instruction:\n{instr}\n\n### Input:\n{inp}\n\n### Output:\n{out}"
-    tokenized = tokenizer(prompt, truncation=True, max_length=MAX_LENGTH, padding=False)
-    tokenized["labels"] = tokenized["input_ids"].copy()
+    # Shorten the input, not the end of the text: cutting from the right can
+    # drop the whole output and EOS, leaving no labels at all
+    while True:
+        prompt = format_prompt(instr, inp)
+        text = prompt + out + tokenizer.eos_token
+        tokenized = tokenizer(text, padding=False)
+        overflow = len(tokenized["input_ids"]) - MAX_LENGTH
+        if overflow <= 0 or not inp:
+            break
+        chars_per_token = max(1.0, len(text) / len(tokenized["input_ids"]))
+        inp = inp[:max(0, len(inp) - max(1, int(overflow * chars_per_token)))]
+    if overflow > 0:
+        # The output alone does not fit: no labels left, dropped after map()
+        tokenized = tokenizer(text, truncation=True, max_length=MAX_LENGTH, padding=False)
+        tokenized["labels"] = [IGNORE_INDEX] * len(tokenized["input_ids"])
+        return tokenized
+    # Loss only on the output (and EOS, so the model learns to stop): the
+    # instruction is identical in every example and the input is given
+    prompt_ids = tokenizer(prompt)["input_ids"]
+    input_ids = tokenized["input_ids"]
+    n_prompt = 0
+    while n_prompt < min(len(prompt_ids), len(input_ids)) and prompt_ids[n_prompt] == input_ids[n_prompt]:
+        n_prompt += 1
+    tokenized["labels"] = [IGNORE_INDEX] * n_prompt + input_ids[n_prompt:]
     return tokenized
 
-print("Tokenizing dataset...")
-try:
-    tokenized_train = dataset["train"].map(format_example, remove_columns=dataset["train"].column_names)
-    tokenized_val = dataset["validation"].map(format_example, remove_columns=dataset["validation"].column_names)
-    print("Dataset tokenized successfully!")
-except Exception as e:
-    print(f"ERROR tokenizing dataset: {e}")
-    exit(1)
+def tokenized_cache_key():
+    """Hash of the tokenizer, the data files and the formatting settings"""
+    digest = hashlib.sha256()
+    if getattr(tokenizer, "backend_tokenizer", None) is not None:
+        digest.update(tokenizer.backend_tokenizer.to_str().encode("utf-8"))
+    else:
+        digest.update(json.dumps(sorted(tokenizer.get_vocab().items())).encode("utf-8"))
+    digest.update(f"{tokenizer.eos_token}|{MAX_LENGTH}|{FORMAT_VERSION}".encode("utf-8"))
+    for split, files in (("train", train_files), ("validation", val_files)):
+        digest.update(split.encode("utf-8"))
+        for path in files:
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+cache_path = os.path.join(TOKENIZED_CACHE_DIR, tokenized_cache_key())
+if os.path.exists(cache_path):
+    print(f"Loading tokenized dataset from cache {cache_path}...")
+    tokenized = load_from_disk(cache_path)
+    tokenized_train, tokenized_val = tokenized["train"], tokenized["validation"]
+else:
+    print("Tokenizing dataset...")
+    try:
+        tokenized = dataset.map(format_example, remove_columns=dataset["train"].column_names)
+        n_before = {split: len(tokenized[split]) for split in tokenized}
+        tokenized = tokenized.filter(lambda ex: any(label != IGNORE_INDEX for label in ex["labels"]))
+        for split in tokenized:
+            if len(tokenized[split]) < n_before[split]:
+                print(f"WARNING: Dropped {n_before[split] - len(tokenized[split])} {split} example(s) whose "
+                      f"output does not fit in MAX_LENGTH={MAX_LENGTH} tokens")
+        tokenized_train, tokenized_val = tokenized["train"], tokenized["validation"]
+        tokenized.save_to_disk(cache_path)
+        print(f"Dataset tokenized successfully! (cached to {cache_path})")
+    except Exception as e:
+        print(f"ERROR tokenizing dataset: {e}")
+        exit(1)
 
-data_collator = DataCollatorForLanguageModeling(tokenizer, mlm=False)
+gradient_accumulation_steps = GRADIENT_ACCUMULATION_STEPS
+if PACKING:
+    n_examples = len(tokenized_train)
+    tokenized_train = Dataset.from_list(pack_examples(list(tokenized_train), MAX_LENGTH))
+    tokenized_val = Dataset.from_list(pack_examples(list(tokenized_val), MAX_LENGTH))
+    # Keep about the same number of examples per optimizer step as unpacked training
+    gradient_accumulation_steps = max(1, round(GRADIENT_ACCUMULATION_STEPS * len(tokenized_train) / n_examples))
+    print(f"Packed {n_examples} examples into {len(tokenized_train)} windows of <= {MAX_LENGTH} tokens "
+          f"(gradient accumulation {gradient_accumulation_steps})")
+    data_collator = PackedCollator(tokenizer.pad_token_id)
+else:
+    # Pads labels with -100 and keeps the prompt masking (the LM collator would overwrite labels)
+    data_collator = DataCollatorForSeq2Seq(tokenizer, label_pad_token_id=IGNORE_INDEX)
 
 # PEFT LoRA config for reviews and ratings extraction
 peft_config = LoraConfig(
@@ -111,8 +237,16 @@ peft_config = LoraConfig(
 
 print("Applying PEFT/LoRA...")
 try:
-    model = prepare_model_for_kbit_training(model)
+    # Freezes the base and upcasts non-quantized weights to fp32; on a 4-bit
+    # model it also enables gradient checkpointing with input grads
+    model = prepare_model_for_kbit_training(model, use_gradient_checkpointing=GRADIENT_CHECKPOINTING,
+                                            gradient_checkpointing_kwargs={"use_reentrant": False})
+    if QUANTIZATION != "4bit" and GRADIENT_CHECKPOINTING:
+        model.gradient_checkpointing_enable(gradient_checkpointing_kwargs={"use_reentrant": False})
+        model.enable_input_require_grads()  # the frozen embeddings would otherwise cut the graph
     model = get_peft_model(model, peft_config)
+    # Packed windows rely on position_ids for the attention mask, which only applies without a KV cache
+    model.config.use_cache = False
     print("PEFT/LoRA applied successfully!")
 except Exception as e:
     print(f"ERROR applying PEFT: {e}")
@@ -123,7 +257,7 @@ training_args = TrainingArguments(
     output_dir=OUTPUT_DIR,
     per_device_train_batch_size=BATCH_SIZE,
     per_device_eval_batch_size=BATCH_SIZE,
-    gradient_accumulation_steps=32,
+    gradient_accumulation_steps=gradient_accumulation_steps,
     eval_strategy="steps",
     eval_steps=5,
     logging_steps=2,
@@ -131,8 +265,10 @@ training_args = TrainingArguments(
     save_steps=10,
     num_train_epochs=EPOCHS,
     learning_rate=LR,
-    fp16=True,
-    optim="paged_adamw_32bit",
+    fp16=torch.cuda.is_available() and not BF16,
+    bf16=BF16,
+    optim=OPTIM,
+    max_steps=MAX_STEPS,
     warmup_ratio=0.1,
     save_total_limit=5,
     remove_unused_columns=False,
@@ -153,7 +289,20 @@ trainer = Trainer(
     args=training_args,
     train_dataset=tokenized_train,
     eval_dataset=tokenized_val,
-    data_collator=data_collator
+    data_collator=data_collator,
+    callbacks=[
+        EarlyStoppingCallback(early_stopping_patience=EARLY_STOPPING_PATIENCE),
+        TrainingReport({
+            "model": MODEL,
+            "quantization": QUANTIZATION,
+            "gradient_checkpointing": GRADIENT_CHECKPOINTING,
+            "bf16": BF16,
+            "packing": PACKING,
+            "optim": OPTIM,
+            "gradient_accumulation_steps": gradient_accumulation_steps,
+            "max_length": MAX_LENGTH,
+        })
+    ]
 )
 
 print("=" * 80)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Memory and step-time report for train_reviews_ratings.py
+TrainingReport is a Trainer callback that times every optimizer step and
+records peak GPU memory (allocated and reserved) or the process's peak RSS on CPU, then
+writes <output_dir>/training_report.json with the run's configuration.
+
+Compare runs (e.g. QUANTIZATION=4bit vs QUANTIZATION=none):
+    python training_report.py output-4bit/training_report.json output-fp16/training_report.json
+"""
+
+import os
+import sys
+import json
+import time
+
+import torch
+from transformers import TrainerCallback
+
+from perf_utils import percentile
+from inference_stats import peak_memory_mb, peak_memory_scope
+
+REPORT_FILE = "training_report.json"
+
+
+class TrainingReport(TrainerCallback):
+    """Collects step times and peak memory during trainer.train()"""
+
+    def __init__(self, config=None):
+        self.config = config or {}
+        self.step_times = []
+        self._step_start = None
+        self._train_start = None
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        if torch.cuda.is_available():
+            torch.cuda.reset_peak_memory_stats()
+        self._train_start = time.perf_counter()
+
+    def on_step_begin(self, args, state, control, **kwargs):
+        self._step_start = time.perf_counter()
+
+    def on_step_end(self, args, state, control, **kwargs):
+        if self._step_start is not None:
+            self.step_times.append(time.perf_counter() - self._step_start)
+            self._step_start = None
+
+    def on_train_end(self, args, state, control, **kwargs):
+        report = self.report(state)
+        path = os.path.join(args.output_dir, REPORT_FILE)
+        os.makedirs(args.output_dir, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"[INFO] Training report written to {path}")
+        print(f"[INFO] Peak memory {report['peak_memory_mb']} MB, "
+              f"step time p50 {report['step_time_s']['p50']} s")
+
+    def report(self, state=None):
+        # The first steps include CUDA warmup and allocator growth
+        steady = sorted(self.step_times[2:] if len(self.step_times) > 4 else self.step_times)
+        device = torch.device('cuda') if torch.cuda.is_available() else None
+        return {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'config': self.config,
+            'steps': len(self.step_times),
+            'train_s': round(time.perf_counter() - self._train_start, 2) if self._train_start else None,
+            'step_time_s': {
+                'mean': round(sum(steady) / len(steady), 4) if steady else None,
+                'p50': round(percentile(steady, 50), 4) if steady else None,
+                'p95': round(percentile(steady, 95), 4) if steady else None,
+            },
+            'peak_memory_mb': peak_memory_mb(device),
+            'peak_memory_scope': 'run' if device else peak_memory_scope(device),  # CUDA peak is reset at train begin
+            'peak_reserved_mb': round(torch.cuda.max_memory_reserved() / (1024 * 1024), 1) if device else None,
+            'final_loss': next((log['loss'] for log in reversed(state.log_history) if 'loss' in log), None)
+                          if state else None,
+        }
+
+
+def compare(reports):
+    """Side-by-side table of run reports, ratios against the first"""
+    base = reports[0][1]
+    rows = [('peak memory (MB)', lambda r: r['peak_memory_mb']),
+            ('peak reserved (MB)', lambda r: r['peak_reserved_mb']),
+            ('step time p50 (s)', lambda r: r['step_time_s']['p50']),
+            ('step time p95 (s)', lambda r: r['step_time_s']['p95']),
+            ('final loss', lambda r: r['final_loss'])]
+    print(f"{'':<22}" + ''.join(f"{name[-28:]:>30}" for name, _ in reports))
+    for key in ('quantization', 'gradient_checkpointing', 'bf16', 'packing', 'optim'):
+        print(f"{key:<22}" + ''.join(f"{str(r['config'].get(key)):>30}" for _, r in reports))
+    for label, get in rows:
+        cells = []
+        for _, r in reports:
+            value, first = get(r), get(base)
+            ratio = f" ({value / first:.2f}x)" if value is not None and first else ''
+            cells.append(f"{str(value) + ratio:>30}")
+        print(f"{label:<22}" + ''.join(cells))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python training_report.py report_a.json report_b.json [...]")
+        sys.exit(1)
+    loaded = []
+    for path in sys.argv[1:]:
+        with open(path, 'r', encoding='utf-8') as f:
+            loaded.append((os.path.dirname(path) or path, json.load(f)))
+    compare(loaded)